@@ -0,0 +1,73 @@
+# Compare the line by line and bulk .fab parsers on synthetic files
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+from pyfracman.fab import parse_fab_file
+
+HEADER = """BEGIN FORMAT
+    Format = Ascii
+    XAxis = East
+    Scale = 1.0
+    No_Fractures = {n}
+    No_TessFractures = 0
+    No_Nodes = 0
+    No_Properties = 3
+END FORMAT
+
+BEGIN PROPERTIES
+    Prop1 = (Real*4) "Transmissivity"
+    Prop2 = (Real*4) "Aperture"
+    Prop3 = (Real*4) "FractureLength"
+END PROPERTIES
+
+BEGIN SETS
+    Set1 = "Set A"
+    Set2 = "Set B"
+END SETS
+
+BEGIN FRACTURE
+"""
+
+
+def synthetic_fab(path: Path, n_fracs: int, ragged: bool, seed: int = 0) -> Path:
+    "Write n_fracs polygonal fractures with 4 vertices, or 4 and 5 if ragged"
+    rng = np.random.default_rng(seed)
+    n_vert = rng.integers(4, 6, n_fracs) if ragged else np.full(n_fracs, 4)
+    lines = [HEADER.format(n=n_fracs)]
+    for fid, nv in enumerate(n_vert, start=1):
+        props = rng.uniform(0, 1, 3)
+        lines.append(
+            f"{fid} {nv} {fid % 2 + 1} {props[0]:.6e} {props[1]:.6e} {props[2]:.6e}\n"
+        )
+        for i, xyz in enumerate(rng.uniform(-500, 500, (nv, 3)), start=1):
+            lines.append(f"   {i} {xyz[0]:.6f} {xyz[1]:.6f} {xyz[2]:.6f}\n")
+        lines.append("   0 0.0 0.0 1.0\n")
+    lines.append("END FRACTURE\n")
+    path.write_text("".join(lines))
+    return path
+
+
+if __name__ == "__main__":
+    n_fracs = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as tmp:
+        for ragged in [False, True]:
+            f_name = synthetic_fab(Path(tmp) / "synthetic.fab", n_fracs, ragged)
+            line = min(
+                timeit.repeat(
+                    lambda: parse_fab_file(f_name, engine="line"), number=1, repeat=3
+                )
+            )
+            bulk = min(
+                timeit.repeat(
+                    lambda: parse_fab_file(f_name, engine="bulk"), number=1, repeat=3
+                )
+            )
+            layout = "4/5 vertices" if ragged else "4 vertices"
+            print(
+                f"{n_fracs:>7} fractures, {layout}: line {line:.2f} s, "
+                f"bulk {bulk:.2f} s ({line / bulk:.1f}x)"
+            )
@@ -0,0 +1,63 @@
+# Compare the row-wise and vectorized construction of stage geometries
+import timeit
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import LineString
+
+from pyfracman.well_geo import stage_locs_to_gdf
+
+
+def stage_locs_to_gdf_rowwise(stage_locs: pd.DataFrame) -> gpd.GeoDataFrame:
+    "Previous implementation, building each stage line in a row-wise apply"
+    stage_gdf = gpd.GeoDataFrame(
+        stage_locs,
+        geometry=gpd.points_from_xy(stage_locs["x_center_m"], stage_locs["y_center_m"]),
+    )
+    stage_gdf["top_pt"] = gpd.points_from_xy(
+        stage_locs["x_top_m"], stage_locs["y_top_m"]
+    )
+    stage_gdf["bot_pt"] = gpd.points_from_xy(
+        stage_locs["x_bottom_m"], stage_locs["y_bottom_m"]
+    )
+    stage_gdf["stg_line"] = stage_gdf.apply(
+        lambda row: LineString([row["bot_pt"], row["top_pt"]]), axis=1
+    )
+    return stage_gdf
+
+
+def synthetic_stages(n_stages: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    center = rng.uniform(-5000, 5000, (n_stages, 3))
+    half = rng.normal(0, 30, (n_stages, 3))
+    stages = {"well": rng.integers(0, 50, n_stages), "stage": np.arange(n_stages)}
+    for loc, xyz in [
+        ("center", center),
+        ("top", center + half),
+        ("bottom", center - half),
+    ]:
+        for i, ax in enumerate("xyz"):
+            stages[f"{ax}_{loc}_m"] = xyz[:, i]
+    return pd.DataFrame(stages)
+
+
+if __name__ == "__main__":
+    for n_stages in [1_000, 10_000, 50_000]:
+        stages = synthetic_stages(n_stages)
+        rowwise = min(
+            timeit.repeat(lambda: stage_locs_to_gdf_rowwise(stages), number=1, repeat=3)
+        )
+        vectorized = min(
+            timeit.repeat(lambda: stage_locs_to_gdf(stages), number=1, repeat=3)
+        )
+        three_d = min(
+            timeit.repeat(
+                lambda: stage_locs_to_gdf(stages, three_d=True), number=1, repeat=3
+            )
+        )
+        print(
+            f"{n_stages:>7} stages: row-wise {rowwise:.3f} s, "
+            f"vectorized {vectorized:.3f} s ({rowwise / vectorized:.0f}x), "
+            f"3D {three_d:.3f} s"
+        )
@@ -3,4 +3,11 @@ from pyfracman.fab import parse_fab_file
 fname = "C:/Users/scott.mckean/Desktop/pest_test_1/Scenario_1/Connected fracs/Connected_Fracs_seismic_1.fab"
 fab_info = parse_fab_file(fname)
 fracture_length = fab_info['property_df'].FractureLength.sum()
-fracture_length
\ No newline at end of file
+fracture_length
+
+# stream in batches when the file is larger than memory
+from pyfracman.fab import iter_fab_fractures
+
+fracture_length = sum(
+    batch.property_df.FractureLength.sum() for batch in iter_fab_fractures(fname)
+)
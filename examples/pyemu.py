@@ -42,4 +42,16 @@ PHIREDSWH [NOPTSWITCH] [SPLITSWH] [DOAUI] [DOSENREUSE] [BOUNDSCALE]
 NOPTMAX PHIREDSTP NPHISTP NPHINORED RELPARSTP NRELPAR [PHISTOPTHRESH] [LASTRUN] [PHIABANDON]
 ICOV ICOR IEIG [IRES] [JCOSAVE] [VERBOSEREC] [JCOSAVEITN] [REISAVEITN] [PARSAVEITN] [PARSAVERUN]""".lower().split(
     "\n"
-)
\ No newline at end of file
+)
+
+# full .pst from the json config, then a parallel local ensemble run
+from pyfracman.pest import PestGenerator, EnsembleRunner
+
+generator = PestGenerator("pest_config.json")
+generator.parse_config()
+generator.write_pst_file("test1.pst")
+
+pst = pyemu.Pst("test1.pst")
+parens = pyemu.ParameterEnsemble.from_gaussian_draw(pst, num_reals=100)
+runner = EnsembleRunner(generator, model_files=["run_simulation.py"], workers=8)
+obsens = runner.run(parens._df)
@@ -1,35 +1,41 @@
-from pyfracman.run import FracmanRunner
+from pyfracman.run import FracmanRunner, RunCache
+from pyfracman.data import read_f2d, trace_summary
 import argparse
-import pandas as pd
 
 macro_filepath = 'tmp_macro.fmf'
 input_file = 'input.in'
+output_file = 'trace_length.sts'  # read by output.pin in pest_config.json
 
-def run_simulation(macro_filepath):
+def run_simulation(macro_filepath, cache_dir=None):
 
     #PREPROCESS
 
     #RUN AND MONITOR
     fracman_runner = FracmanRunner()
+    if cache_dir is not None:
+        # identical macro and PEST input restore the previous trace length
+        cache = RunCache(cache_dir, outputs=[output_file])
+        key = cache.key(macro_filepath, input_files=[input_file])
+        if cache.restore(key, '.'):
+            return
     fracman_runner.Run(macro_filepath)
 
     #POSTPROCESS
     #read total trace length from f2d file and output
-    with open('tracemap.f2d') as f:
-        name = f.readline().split(maxsplit=2)[-1][:-1]
-        cl = f.readline()[1:]
-    columns = [s.strip() for s in cl.replace('\t', ' ').split(' ') if s]
-    trace_data = pd.read_csv('tracemap.f2d', skiprows=2, index_col=False, sep='\s{2,}', names=columns, engine='python')
+    traces = trace_summary(read_f2d('tracemap.f2d'))
+    total_length = traces['length'].sum()
 
-    total_length = trace_data['totlen[m]'].unique().sum()
-
-    with open('trace_length.sts','w') as f:
+    with open(output_file,'w') as f:
         f.write(f'{total_length}')
 
+    if cache_dir is not None:
+        cache.store(key, '.')
+
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='Fracman macro runner')
     parser.add_argument('macro', type=str, nargs=1, help='FracMan macro filename')
+    parser.add_argument('--cache', type=str, default=None, help='run cache directory')
     args = parser.parse_args()
-    run_simulation(args.macro)
+    run_simulation(args.macro[0], args.cache)
     
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""
+On-disk cache of parsed or simulated results, with a least recently used
+eviction policy bounded by total size
+"""
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+
+def hash_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Hash the contents of a file without loading it into memory
+
+    Args:
+        path (Path): file path
+        chunk_size (int, optional): bytes read per chunk. Defaults to 1 MB.
+
+    Returns:
+        str: sha256 hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_stamp(path: Path) -> dict:
+    """Cheap identity of a file, used to invalidate cache entries
+
+    Args:
+        path (Path): file path
+
+    Returns:
+        dict: resolved path, size and modification time
+    """
+    stat = os.stat(path)
+    return {
+        "path": str(Path(path).resolve()),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+class DiskCache:
+    """Directory of cache entries, one sub-directory per key
+    Each entry holds arbitrary files plus a meta.json, and entries are
+    evicted least recently used first once max_bytes is exceeded
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 20 * 1024**3) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def entry_path(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def get(self, key: str, validate=None):
+        """Look up an entry and mark it as recently used
+
+        Args:
+            key (str): entry key
+            validate (callable, optional): called with the entry metadata,
+                a falsy return invalidates the entry. Defaults to None.
+
+        Returns:
+            tuple: entry directory and metadata, or (None, None) on a miss
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path / "meta.json", "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None, None
+        if validate is not None and not validate(meta):
+            self.invalidate(key)
+            self.misses += 1
+            return None, None
+        os.utime(path / "meta.json")
+        self.hits += 1
+        return path, meta
+
+    def put(self, key: str, writer, meta: dict = None) -> Path:
+        """Write an entry atomically, then evict old entries
+
+        Args:
+            key (str): entry key
+            writer (callable): called with a directory to write files into
+            meta (dict, optional): json serializable metadata. Defaults to None.
+
+        Returns:
+            Path: entry directory, None if an older entry under the same key
+            is still in use and was kept
+        """
+        tmp = self.cache_dir / (".tmp_" + uuid.uuid4().hex)
+        tmp.mkdir()
+        try:
+            writer(tmp)
+            with open(tmp / "meta.json", "w") as f:
+                json.dump(meta or {}, f)
+            if not self.invalidate(key):
+                return None
+            os.replace(tmp, self.entry_path(key))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=key)
+        return self.entry_path(key)
+
+    def set_meta(self, key: str, meta: dict) -> None:
+        "Replace the metadata of an existing entry"
+        with open(self.entry_path(key) / "meta.json", "w") as f:
+            json.dump(meta, f)
+
+    def invalidate(self, key: str) -> bool:
+        """Remove an entry if it exists. The entry is moved aside before it is
+        deleted, so an entry whose files are still open or memory mapped
+        (which Windows refuses to move or delete) is kept whole instead of
+        being left half deleted
+
+        Args:
+            key (str): entry key
+
+        Returns:
+            bool: False if the entry is in use and was kept
+        """
+        trash = self.cache_dir / (".del_" + uuid.uuid4().hex)
+        try:
+            os.replace(self.entry_path(key), trash)
+        except FileNotFoundError:
+            return True
+        except OSError:
+            return False
+        shutil.rmtree(trash, ignore_errors=True)
+        return True
+
+    def entries(self) -> list:
+        """List entries with their size and last access time
+
+        Returns:
+            list: (last access time, size in bytes, key), oldest first
+        """
+        out = []
+        for path in self.cache_dir.iterdir():
+            if path.name.startswith(".") or not (path / "meta.json").exists():
+                continue
+            atime = (path / "meta.json").stat().st_mtime
+            out.append((atime, _dir_size(path), path.name))
+        return sorted(out)
+
+    def evict(self, keep: str = None) -> list:
+        """Delete least recently used entries until the cache fits in max_bytes
+
+        Args:
+            keep (str, optional): key that must not be evicted. Defaults to None.
+
+        Returns:
+            list: evicted keys, entries still in use are skipped
+        """
+        if self.max_bytes is None:
+            return []
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = []
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep or not self.invalidate(key):
+                continue
+            total -= size
+            evicted.append(key)
+        return evicted
+
+    def clear(self) -> None:
+        "Remove every entry"
+        for _, _, key in self.entries():
+            self.invalidate(key)
+
+    def stats(self) -> dict:
+        "Hit, miss, entry count and size statistics"
+        entries = self.entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
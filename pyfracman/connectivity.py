@@ -0,0 +1,454 @@
+"""
+Module to compute fracture-fracture and fracture-wellbore intersections
+from parsed .fab polygons, and the connectivity of stages through the
+resulting fracture network
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from .fab import FractureCollection, RaggedArray
+from .frac_geo import _next_vertex, _segment_reduce, _segment_sum
+from .frac_geo import polygon_area_vectors
+
+
+def polygon_planes(polygons: RaggedArray) -> tuple:
+    """Unit normal and offset (n . x = d) of every polygon plane
+
+    Args:
+        polygons (RaggedArray): polygon vertices in order
+
+    Returns:
+        tuple: unit normals (n x 3) and plane offsets (n)
+    """
+    area = polygon_area_vectors(polygons)
+    norm = np.linalg.norm(area, axis=1, keepdims=True)
+    normals = area / np.where(norm > 0, norm, 1.0)
+    counts = np.maximum(polygons.lengths, 1)[:, None]
+    centroids = _segment_sum(polygons.values, polygons.offsets) / counts
+    return normals, (normals * centroids).sum(axis=1)
+
+
+def polygon_bounds(polygons: RaggedArray) -> np.ndarray:
+    """Axis aligned bounding box of every polygon
+
+    Args:
+        polygons (RaggedArray): polygon vertices
+
+    Returns:
+        np.ndarray: xmin, ymin, zmin, xmax, ymax, zmax (n x 6)
+    """
+    lo = _segment_reduce(np.minimum, polygons.values, polygons.offsets, np.inf)
+    hi = _segment_reduce(np.maximum, polygons.values, polygons.offsets, -np.inf)
+    return np.hstack([lo, hi])
+
+
+def _edges(polygons: RaggedArray, poly: np.ndarray) -> tuple:
+    """Expand the edges of a list of polygons, repeated polygons included
+
+    Returns:
+        tuple: edge start rows, edge end rows, and edge offsets per entry
+    """
+    lengths = polygons.lengths[poly]
+    offsets = np.zeros(poly.size + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    entry = np.repeat(np.arange(poly.size), lengths)
+    start = polygons.offsets[poly][entry] + np.arange(offsets[-1]) - offsets[entry]
+    return start, _next_vertex(polygons.offsets)[start], offsets
+
+
+def _inside_convex(polygons, poly, point, n, tol) -> np.ndarray:
+    """Whether points on the plane of convex polygons fall inside them, i.e.
+    left of every edge looking down the polygon normal
+
+    Args:
+        polygons (RaggedArray): polygon vertices in order
+        poly (np.ndarray): polygon of each point
+        point (np.ndarray): points (m x 3)
+        n (np.ndarray): unit normal of each point's polygon (m x 3)
+        tol (float): distance tolerance
+
+    Returns:
+        np.ndarray: inside flag per point
+    """
+    edge_start, edge_end, offsets = _edges(polygons, poly)
+    pair = np.repeat(np.arange(poly.size), np.diff(offsets))
+    edge = polygons.values[edge_end] - polygons.values[edge_start]
+    rel = point[pair] - polygons.values[edge_start]
+    side = (np.cross(edge, rel) * n[pair]).sum(axis=1)
+    side /= np.maximum(np.linalg.norm(edge, axis=1), tol)
+    return _segment_reduce(np.minimum, side, offsets, -np.inf) >= -tol
+
+
+def _segment_distances(p0, p1, q0, q1, eps: float = 1e-12) -> np.ndarray:
+    "Shortest distance between segments p0-p1 and q0-q1, pairwise"
+    d1, d2, r = p1 - p0, q1 - q0, p0 - q0
+    a = (d1 * d1).sum(axis=1)
+    e = (d2 * d2).sum(axis=1)
+    b = (d1 * d2).sum(axis=1)
+    c = (d1 * r).sum(axis=1)
+    f = (d2 * r).sum(axis=1)
+    safe_a = np.where(a > eps, a, 1.0)
+    safe_e = np.where(e > eps, e, 1.0)
+
+    # closest points of the infinite lines, then clamped to the segments
+    denom = a * e - b * b
+    s = np.where(denom > eps, (b * f - c * e) / np.where(denom > eps, denom, 1.0), 0)
+    s = np.clip(s, 0, 1)
+    t = (b * s + f) / safe_e
+    s = np.where(t < 0, np.clip(-c / safe_a, 0, 1), s)
+    s = np.where(t > 1, np.clip((b - c) / safe_a, 0, 1), s)
+    t = np.clip(t, 0, 1)
+    # degenerate segments are points
+    s = np.where(a > eps, s, 0)
+    t = np.where(e > eps, t, 0)
+    t = np.where((a <= eps) & (e > eps), np.clip(f / safe_e, 0, 1), t)
+    return np.linalg.norm(p0 + d1 * s[:, None] - q0 - d2 * t[:, None], axis=1)
+
+
+def segment_polygon_distances(
+    polygons: RaggedArray,
+    normals: np.ndarray,
+    d: np.ndarray,
+    poly: np.ndarray,
+    p0: np.ndarray,
+    p1: np.ndarray,
+    tol: float = 1e-6,
+) -> np.ndarray:
+    """Shortest 3D distance between segments and convex planar polygons:
+    zero where the segment crosses the polygon, otherwise the smaller of the
+    endpoint distances to the polygon and the segment to edge distances
+
+    Args:
+        polygons (RaggedArray): polygon vertices in order
+        normals (np.ndarray): unit polygon normals, as from polygon_planes
+        d (np.ndarray): polygon plane offsets, as from polygon_planes
+        poly (np.ndarray): polygon of each pair
+        p0 (np.ndarray): segment start of each pair (m x 3)
+        p1 (np.ndarray): segment end of each pair (m x 3)
+        tol (float, optional): distance tolerance. Defaults to 1e-6.
+
+    Returns:
+        np.ndarray: distance of each pair
+    """
+    n = normals[poly]
+    s0 = (p0 * n).sum(axis=1) - d[poly]
+    s1 = (p1 * n).sum(axis=1) - d[poly]
+    dist = np.full(poly.size, np.inf)
+
+    crosses = (s0 * s1 <= 0) & (s0 != s1)
+    frac = s0 / np.where(crosses, s0 - s1, 1.0)
+    point = p0 + frac[:, None] * (p1 - p0)
+    dist[crosses & _inside_convex(polygons, poly, point, n, tol)] = 0.0
+
+    for p, s in ((p0, s0), (p1, s1)):
+        foot = p - s[:, None] * n
+        inside = _inside_convex(polygons, poly, foot, n, tol)
+        dist = np.minimum(dist, np.where(inside, np.abs(s), np.inf))
+
+    edge_start, edge_end, offsets = _edges(polygons, poly)
+    pair = np.repeat(np.arange(poly.size), np.diff(offsets))
+    to_edge = _segment_distances(
+        p0[pair], p1[pair], polygons.values[edge_start], polygons.values[edge_end]
+    )
+    return np.minimum(dist, _segment_reduce(np.minimum, to_edge, offsets, np.inf))
+
+
+def _plane_crossing(polygons, normals, d, poly, plane, direction, tol):
+    """Interval where each polygon crosses another polygon's plane, measured
+    along the direction of the planes' intersection line
+
+    Returns:
+        tuple: interval start and end per pair (inf, -inf if no crossing)
+    """
+    start, end, offsets = _edges(polygons, poly)
+    pair = np.repeat(np.arange(poly.size), np.diff(offsets))
+    v0 = polygons.values[start]
+    v1 = polygons.values[end]
+    n = normals[plane][pair]
+    s0 = (v0 * n).sum(axis=1) - d[plane][pair]
+    s1 = (v1 * n).sum(axis=1) - d[plane][pair]
+
+    # edges crossing the plane, and vertices lying on it
+    cross = s0 * s1 < 0
+    on = np.abs(s0) <= tol
+    frac = s0 / np.where(cross, s0 - s1, 1.0)
+    t_cross = ((v0 + frac[:, None] * (v1 - v0)) * direction[pair]).sum(axis=1)
+    t_on = (v0 * direction[pair]).sum(axis=1)
+    lo = np.minimum(np.where(cross, t_cross, np.inf), np.where(on, t_on, np.inf))
+    hi = np.maximum(np.where(cross, t_cross, -np.inf), np.where(on, t_on, -np.inf))
+    return (
+        _segment_reduce(np.minimum, lo, offsets, np.inf),
+        _segment_reduce(np.maximum, hi, offsets, -np.inf),
+    )
+
+
+def _intersect_pairs(polygons, normals, d, pa, pb, tol):
+    """Narrow phase: exact intersection of convex planar polygon pairs
+
+    Returns:
+        tuple: mask of intersecting pairs and the intersection length
+    """
+    direction = np.cross(normals[pa], normals[pb])
+    norm = np.linalg.norm(direction, axis=1, keepdims=True)
+    # parallel and coplanar pairs are not counted as intersecting
+    valid = norm[:, 0] > 1e-9
+    direction = direction / np.where(norm > 0, norm, 1.0)
+    lo_a, hi_a = _plane_crossing(polygons, normals, d, pa, pb, direction, tol)
+    lo_b, hi_b = _plane_crossing(polygons, normals, d, pb, pa, direction, tol)
+    lo = np.maximum(lo_a, lo_b)
+    hi = np.minimum(hi_a, hi_b)
+    hit = valid & (lo <= hi)
+    return hit, np.where(hit, hi - lo, 0.0)
+
+
+def _intersect_tile(values, offsets, poly_ids, region, tol, chunk_size=500_000):
+    """Broad and narrow phase for the polygons overlapping one tile. Pairs are
+    only kept by the tile holding the lower corner of their bounding box
+    overlap, so overlapping tiles do not report the same pair twice.
+
+    Returns:
+        tuple: global polygon ids of each intersecting pair, and the length
+        of the intersection
+    """
+    polygons = RaggedArray(values, offsets)
+    normals, d = polygon_planes(polygons)
+    bounds = polygon_bounds(polygons)
+    tree = shapely.STRtree(shapely.box(*bounds[:, [0, 1, 3, 4]].T))
+    pa, pb = tree.query(shapely.box(*bounds[:, [0, 1, 3, 4]].T))
+
+    keep = pa < pb
+    keep &= bounds[pa, 2] <= bounds[pb, 5] + tol
+    keep &= bounds[pb, 2] <= bounds[pa, 5] + tol
+    corner = np.maximum(bounds[pa, :2], bounds[pb, :2])
+    keep &= (corner[:, 0] >= region[0]) & (corner[:, 0] < region[2])
+    keep &= (corner[:, 1] >= region[1]) & (corner[:, 1] < region[3])
+    pa, pb = pa[keep], pb[keep]
+
+    hits = []
+    for start in range(0, pa.size, chunk_size):
+        a = pa[start : start + chunk_size]
+        b = pb[start : start + chunk_size]
+        hit, length = _intersect_pairs(polygons, normals, d, a, b, tol)
+        hits.append((poly_ids[a[hit]], poly_ids[b[hit]], length[hit]))
+    if not hits:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0)
+    return tuple(np.concatenate(h) for h in zip(*hits))
+
+
+def _tile_regions(bounds: np.ndarray, tiles: tuple) -> list:
+    "Split the plan view extent of the polygons into a grid of tiles"
+    x = np.linspace(bounds[:, 0].min(), bounds[:, 3].max(), tiles[0] + 1)
+    y = np.linspace(bounds[:, 1].min(), bounds[:, 4].max(), tiles[1] + 1)
+    x[0] = y[0] = -np.inf
+    x[-1] = y[-1] = np.inf
+    return [
+        (x[i], y[j], x[i + 1], y[j + 1])
+        for i in range(tiles[0])
+        for j in range(tiles[1])
+    ]
+
+
+def fracture_intersections(
+    collection: FractureCollection,
+    workers: int = None,
+    tiles: tuple = None,
+    tol: float = 1e-6,
+) -> pd.DataFrame:
+    """Find every pair of intersecting fractures from their polygons.
+    Candidate pairs come from overlapping bounding boxes (broad phase), and
+    each candidate is tested exactly as two convex planar polygons
+    (narrow phase), vectorized over all candidates. With workers, the plan
+    view is split into tiles that are processed in parallel.
+
+    Args:
+        collection (FractureCollection): parsed fractures
+        workers (int, optional): number of processes. Defaults to None (serial).
+        tiles (tuple, optional): number of tiles in x and y. Defaults to a
+            grid with about two tiles per worker.
+        tol (float, optional): distance tolerance. Defaults to 1e-6.
+
+    Returns:
+        pd.DataFrame: fid_a, fid_b (fid_a < fid_b) and the intersection
+        length of each intersecting fracture pair
+    """
+    polygons, owner = collection.polygons()
+    fid = np.concatenate([collection.fid, collection.t_fid])
+    poly_ids = np.arange(len(polygons))
+
+    if workers is None or workers <= 1 or len(polygons) == 0:
+        region = (-np.inf, -np.inf, np.inf, np.inf)
+        results = [
+            _intersect_tile(polygons.values, polygons.offsets, poly_ids, region, tol)
+        ]
+    else:
+        bounds = polygon_bounds(polygons)
+        n_side = int(np.ceil(np.sqrt(2 * workers)))
+        regions = _tile_regions(bounds, tiles or (n_side, n_side))
+        jobs = []
+        for region in regions:
+            inside = np.flatnonzero(
+                (bounds[:, 0] <= region[2])
+                & (bounds[:, 3] >= region[0])
+                & (bounds[:, 1] <= region[3])
+                & (bounds[:, 4] >= region[1])
+            )
+            tile = polygons.take(inside)
+            jobs.append((tile.values, tile.offsets, inside, region, tol))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_intersect_tile, *zip(*jobs)))
+
+    pa, pb, length = (np.concatenate(r) for r in zip(*results))
+    fa, fb = fid[owner[pa]], fid[owner[pb]]
+    pairs = pd.DataFrame(
+        {"fid_a": np.minimum(fa, fb), "fid_b": np.maximum(fa, fb), "length": length}
+    )
+    # tessellated fractures intersect through several triangles
+    pairs = pairs[pairs.fid_a != pairs.fid_b]
+    return pairs.groupby(["fid_a", "fid_b"], as_index=False)["length"].sum()
+
+
+def adjacency_matrix(
+    collection: FractureCollection, intersections: pd.DataFrame
+) -> sparse.csr_matrix:
+    """Symmetric sparse adjacency matrix of the fracture network, ordered by
+    fid followed by t_fid
+
+    Args:
+        collection (FractureCollection): parsed fractures
+        intersections (pd.DataFrame): output of fracture_intersections
+
+    Returns:
+        sparse.csr_matrix: intersection length between connected fractures
+    """
+    index = pd.Index(np.concatenate([collection.fid, collection.t_fid]))
+    a = index.get_indexer(intersections["fid_a"])
+    b = index.get_indexer(intersections["fid_b"])
+    length = intersections["length"].to_numpy()
+    adj = sparse.coo_matrix((length, (a, b)), shape=(index.size, index.size))
+    return (adj + adj.T).tocsr()
+
+
+def well_intersections(
+    collection: FractureCollection, lines, tol: float = 1e-6
+) -> pd.DataFrame:
+    """Points where 3D lines (well paths or stage segments) cross fractures
+
+    Args:
+        collection (FractureCollection): parsed fractures
+        lines: array-like of 3D shapely LineStrings
+        tol (float, optional): distance tolerance. Defaults to 1e-6.
+
+    Returns:
+        pd.DataFrame: line (position in lines), fid, and the x, y, z of the
+        first crossing of each line and fracture
+    """
+    polygons, owner = collection.polygons()
+    fid = np.concatenate([collection.fid, collection.t_fid])
+    normals, d = polygon_planes(polygons)
+    bounds = polygon_bounds(polygons)
+
+    coords, line_no = shapely.get_coordinates(
+        np.asarray(lines, dtype=object), include_z=True, return_index=True
+    )
+    start = np.flatnonzero(line_no[:-1] == line_no[1:])
+    p0, p1 = coords[start], coords[start + 1]
+    seg_lo, seg_hi = np.minimum(p0, p1), np.maximum(p0, p1)
+
+    # broad phase on bounding boxes
+    tree = shapely.STRtree(shapely.box(*bounds[:, [0, 1, 3, 4]].T))
+    seg, poly = tree.query(
+        shapely.box(seg_lo[:, 0], seg_lo[:, 1], seg_hi[:, 0], seg_hi[:, 1])
+    )
+    keep = (seg_lo[seg, 2] <= bounds[poly, 5] + tol) & (
+        seg_hi[seg, 2] >= bounds[poly, 2] - tol
+    )
+    seg, poly = seg[keep], poly[keep]
+
+    # crossing point of each segment with the polygon plane
+    n = normals[poly]
+    s0 = (p0[seg] * n).sum(axis=1) - d[poly]
+    s1 = (p1[seg] * n).sum(axis=1) - d[poly]
+    crosses = (s0 * s1 <= 0) & (s0 != s1)
+    frac = s0 / np.where(crosses, s0 - s1, 1.0)
+    # segments lying in the plane, zero length stages included, are tested
+    # at their start
+    in_plane = (np.abs(s0) <= tol) & (np.abs(s1) <= tol)
+    frac[in_plane] = 0.0
+    crosses |= in_plane
+    point = p0[seg] + frac[:, None] * (p1[seg] - p0[seg])
+
+    hit = crosses & _inside_convex(polygons, poly, point, n, tol)
+    hits = pd.DataFrame(
+        {
+            "line": line_no[start][seg[hit]],
+            "fid": fid[owner[poly[hit]]],
+            "x": point[hit, 0],
+            "y": point[hit, 1],
+            "z": point[hit, 2],
+        }
+    )
+    hits = hits.sort_values(["line", "fid"], kind="stable")
+    return hits.drop_duplicates(["line", "fid"], ignore_index=True)
+
+
+def stage_connectivity(
+    collection: FractureCollection,
+    stage_gdf: pd.DataFrame,
+    intersections: pd.DataFrame = None,
+    workers: int = None,
+) -> pd.DataFrame:
+    """Fractures hit by each stage and every fracture connected to them
+    through the fracture network (connected components of the adjacency)
+
+    Args:
+        collection (FractureCollection): parsed fractures
+        stage_gdf (pd.DataFrame): stages with well, stage, and top/bottom
+            x, y and z columns, as from stage_locs_to_gdf
+        intersections (pd.DataFrame, optional): precomputed output of
+            fracture_intersections. Defaults to None.
+        workers (int, optional): processes for fracture_intersections.
+            Defaults to None.
+
+    Returns:
+        pd.DataFrame: well, stage, the fractures intersecting the stage, and
+        the connected fracture ids and count per stage
+    """
+    if intersections is None:
+        intersections = fracture_intersections(collection, workers)
+    fid = np.concatenate([collection.fid, collection.t_fid])
+    _, labels = csgraph.connected_components(
+        adjacency_matrix(collection, intersections), directed=False
+    )
+
+    coords = np.stack(
+        [
+            stage_gdf[["x_bottom_m", "y_bottom_m", "z_bottom_m"]].to_numpy(float),
+            stage_gdf[["x_top_m", "y_top_m", "z_top_m"]].to_numpy(float),
+        ],
+        axis=1,
+    )
+    hits = well_intersections(collection, shapely.linestrings(coords))
+    hits["component"] = labels[pd.Index(fid).get_indexer(hits["fid"])]
+
+    members = pd.DataFrame({"component": labels, "connected_ids": fid})
+    connected = (
+        hits[["line", "component"]]
+        .drop_duplicates()
+        .merge(members, on="component")
+        .sort_values(["line", "connected_ids"])
+        .groupby("line")["connected_ids"]
+        .apply(list)
+    )
+
+    stages = stage_gdf[["well", "stage"]].reset_index(drop=True)
+    stages["stage_ids"] = hits.groupby("line")["fid"].apply(list)
+    stages["connected_ids"] = connected
+    for col in ["stage_ids", "connected_ids"]:
+        stages[col] = stages[col].apply(lambda x: x if isinstance(x, list) else [])
+    stages["connected_count"] = stages["connected_ids"].str.len()
+    return stages
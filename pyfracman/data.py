@@ -1,8 +1,11 @@
 """
 Functions to process data exported from FracMan
 """
+import numpy as np
 import pandas as pd
 
+from .readers import read_fracman_table, read_header_line, split_columns
+
 def clean_columns(df_cols: pd.core.indexes.base.Index) -> pd.core.indexes.base.Index:
     """Clean up dataframe columns into something python
 
@@ -27,42 +30,132 @@ def read_ors(filename: str) -> pd.DataFrame:
     Returns:
         pd.DataFrame: dataframe of point data
     """
-    df = pd.read_csv(filename, delim_whitespace=True)
+    df = read_fracman_table(filename, delimiter="whitespace")
     df.columns = clean_columns(df.columns)
     return df
 
-def read_f2d_trace_file(filepath: str) -> pd.DataFrame:
-    """Read an f2d file to get trace information, grouping by TraceID
-    Takes the average of the lengths
-    returns the length, strike and dip only for now
+def read_f2d(filepath: str) -> pd.DataFrame:
+    """Read the trace segments of an f2d file as typed numeric columns,
+    dropping zero length segments and deriving Seg_Strike[deg] from
+    Seg_Trend[deg] when the file only has the trend
 
     Args:
         filepath (str): filepath
 
     Returns:
-        pd.DataFrame: length, strike, and dip per trace
+        pd.DataFrame: one row per segment, TraceID as int64 and the other
+        columns numeric, text values being NaN
     """
-    columns = (
-        pd.read_csv(str(filepath), skiprows=1, nrows=1, header=None)
-        .iloc[0, 0]
-        .replace("#", "")
-        .replace("\t", "  ")
-        .split()
+    columns = split_columns(read_header_line(filepath, 1))
+    segments = read_fracman_table(
+        filepath,
+        skiprows=2,
+        header=None,
+        names=columns,
+        delimiter="whitespace",
     )
-    rows = pd.read_csv(filepath, skiprows=[0, 1], header=None)
-    fault_info = rows[0].str.replace("\t", " ").str.split(expand=True)
-    fault_info.columns = columns
 
-    fault_info = fault_info.apply(pd.to_numeric, errors="coerce")
-    fault_info = fault_info[fault_info["len[m]"] > 0]
+    text = segments.select_dtypes(exclude="number").columns
+    segments[text] = segments[text].apply(pd.to_numeric, errors="coerce")
+    segments = segments[segments["len[m]"] > 0].reset_index(drop=True)
+    segments["TraceID"] = segments["TraceID"].astype(np.int64)
 
-    if "Seg_Strike[deg]" not in columns:
-        fault_info["Seg_Strike[deg]"] = fault_info["Seg_Trend[deg]"] - 90
+    if "Seg_Strike[deg]" not in segments.columns:
+        segments["Seg_Strike[deg]"] = segments["Seg_Trend[deg]"] - 90
+    return segments
 
-    fault_info = (
-        fault_info.groupby("TraceID")
-        .mean()[["totlen[m]", "Seg_Strike[deg]", "Seg_VerticalDev[deg]"]]
-        .reset_index(drop=True)
-    )
-    fault_info.columns = ["length", "strike", "dip"]
-    return fault_info
+def _circular_mean(degrees: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """Mean direction of angles in each group, in [0, 360)
+
+    Args:
+        degrees (np.ndarray): angles in degrees
+        groups (np.ndarray): 0-based group of each angle
+        n_groups (int): number of groups
+
+    Returns:
+        np.ndarray: mean angle per group, NaN where the directions cancel
+    """
+    radians = np.deg2rad(degrees)
+    sin = np.bincount(groups, weights=np.sin(radians), minlength=n_groups)
+    cos = np.bincount(groups, weights=np.cos(radians), minlength=n_groups)
+    mean = np.rad2deg(np.arctan2(sin, cos)) % 360
+    # a tiny negative angle rounds up to 360 in the modulo
+    mean = np.where(mean < 360, mean, 0.0)
+    return np.where(np.hypot(sin, cos) > 1e-9, mean, np.nan)
+
+def trace_summary(segments: pd.DataFrame) -> pd.DataFrame:
+    """Per trace aggregates of the segments from read_f2d. Strike is a
+    circular mean, so strikes either side of north average to north rather
+    than south, and dip (0 to 90 degrees) a plain mean
+
+    Args:
+        segments (pd.DataFrame): segments from read_f2d
+
+    Returns:
+        pd.DataFrame: length, segment count, strike and dip, indexed by TraceID
+    """
+    trace_ids, groups = np.unique(segments["TraceID"].to_numpy(), return_inverse=True)
+    n_traces = len(trace_ids)
+    seg_length = segments["len[m]"].to_numpy()
+    n_segments = np.bincount(groups, minlength=n_traces)
+    if "totlen[m]" in segments.columns:
+        # totlen repeats the trace length on every segment
+        length = np.bincount(
+            groups, weights=segments["totlen[m]"].to_numpy(), minlength=n_traces
+            ) / n_segments
+    else:
+        length = np.bincount(groups, weights=seg_length, minlength=n_traces)
+
+    summary = pd.DataFrame({
+        "length": length,
+        "n_segments": n_segments,
+        "strike": _circular_mean(segments["Seg_Strike[deg]"].to_numpy(), groups, n_traces),
+        "dip": np.bincount(
+            groups, weights=segments["Seg_VerticalDev[deg]"].to_numpy(), minlength=n_traces
+            ) / n_segments,
+        }, index=pd.Index(trace_ids, name="TraceID"))
+    return summary
+
+def trace_p21(traces: pd.DataFrame, area: float) -> float:
+    """P21 intensity, total trace length per unit area of the trace plane
+
+    Args:
+        traces (pd.DataFrame): trace summary with a length column
+        area (float): area of the trace plane
+
+    Returns:
+        float: trace length per unit area
+    """
+    return traces["length"].sum() / area
+
+def trace_length_histogram(traces: pd.DataFrame, bins=10, log: bool = False) -> pd.DataFrame:
+    """Histogram of trace lengths
+
+    Args:
+        traces (pd.DataFrame): trace summary with a length column
+        bins (optional): number of bins or bin edges, as in np.histogram.
+            Defaults to 10.
+        log (bool, optional): space a number of bins evenly in log length.
+            Defaults to False.
+
+    Returns:
+        pd.DataFrame: lower and upper bin edges and the count of traces
+    """
+    length = traces["length"].to_numpy()
+    if log and np.ndim(bins) == 0 and len(length):
+        bins = np.geomspace(length.min(), length.max(), int(bins) + 1)
+    count, edges = np.histogram(length, bins=bins)
+    return pd.DataFrame({"lower": edges[:-1], "upper": edges[1:], "count": count})
+
+def read_f2d_trace_file(filepath: str) -> pd.DataFrame:
+    """Read an f2d file to get trace information, grouping by TraceID
+    returns the length, strike and dip only for now
+
+    Args:
+        filepath (str): filepath
+
+    Returns:
+        pd.DataFrame: length, strike, and dip per trace
+    """
+    traces = trace_summary(read_f2d(filepath))
+    return traces[["length", "strike", "dip"]].reset_index(drop=True)
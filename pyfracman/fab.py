@@ -1,9 +1,20 @@
 """
 Module to read .fab files and return properties
 """
+import hashlib
+import json
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import repeat
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 
+from .cache import DiskCache, file_stamp, hash_file
+
 
 def read_tesselated_fractures(f):
     # Read the fracture
@@ -134,7 +145,1416 @@ def make_properties_df(fid, prop_dict, prop_list):
     return prop_df
 
 
-def parse_fab_file(f_name):
+def _iter_sections(buf: bytes, start: int = 0, end: int = None):
+    """Find every BEGIN / END wrapped section in a raw .fab buffer
+
+    Args:
+        buf (bytes): file contents (bytes or a memory map)
+        start (int, optional): byte offset to start searching from. Defaults to 0.
+        end (int, optional): byte offset to stop searching at. Defaults to None.
+
+    Yields:
+        tuple: section name, first byte of the section body, and the byte
+        offset of the END keyword
+    """
+    end = len(buf) if end is None else end
+    pos = start
+    while True:
+        begin = buf.find(b"BEGIN ", pos, end)
+        if begin < 0:
+            return
+        # keywords must start a line
+        if begin > 0 and buf[begin - 1 : begin] not in (b"\n", b" ", b"\t"):
+            pos = begin + 6
+            continue
+        eol = buf.find(b"\n", begin, end)
+        eol = end if eol < 0 else eol
+        name = buf[begin + 6 : eol].strip().decode()
+        stop = buf.find(b"END " + name.encode(), eol, end)
+        if stop < 0:
+            raise ValueError("Missing END " + name)
+        yield name, eol + 1, stop
+        pos = stop + len(name) + 4
+
+
+def read_keywords(block: bytes) -> dict:
+    """Read all the key = val lines of a header section body
+
+    Args:
+        block (bytes): raw section body, without the BEGIN / END lines
+
+    Returns:
+        dict: section keywords
+    """
+    lines = block.decode().splitlines()
+    return dict(read_keyword(line) for line in lines if line.strip())
+
+
+def _walk_records(
+    flat: np.ndarray,
+    header_len: int,
+    count_cols: tuple,
+    item_lens: tuple,
+    tail_len=0,
+    guess=None,
+):
+    """Locate every record in a flat array of section tokens
+
+    A record is a header of header_len tokens, followed by one block of items
+    per entry in count_cols (the header column holding the number of items)
+    with item_lens tokens per item, followed by tail_len tokens. Only complete
+    records are returned, so a truncated buffer can be continued later.
+
+    Candidate record starts are checked all at once: a candidate reached from
+    the previous record whose own length leads to the next candidate starts
+    a run of records. The first candidates are the starts of records with
+    the same length as the first one. Once those no longer fit, guess gives
+    the candidates (e.g. from the line layout), and only records that are
+    not candidates are walked one by one.
+
+    Args:
+        flat (np.ndarray): all numeric tokens of the section
+        header_len (int): number of tokens in the record header
+        count_cols (tuple): header columns with the number of items per block
+        item_lens (tuple): number of tokens per item in each block
+        tail_len (int, optional): trailing tokens per record. Defaults to 0.
+        guess (callable, optional): returns sorted token offsets that may
+            start a record. Defaults to None.
+
+    Returns:
+        tuple: record starts, item counts (n_records x n_blocks), and the
+        number of tokens consumed
+    """
+    size = flat.size
+    count_cols = np.asarray(count_cols)
+    item_lens = np.asarray(item_lens)
+    if size < header_len:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, len(count_cols)), np.int64), 0
+
+    def chain(candidates):
+        "Candidates, the end of their records and the last index of each run"
+        candidates = candidates[candidates + header_len <= size]
+        counts = flat[candidates[:, None] + count_cols].astype(np.int64)
+        ends = candidates + header_len + tail_len + counts @ item_lens
+        last = np.flatnonzero(ends[:-1] != candidates[1:])
+        return candidates, ends, np.append(last, ends.size - 1)
+
+    rec_len = header_len + tail_len + int(flat[count_cols] @ item_lens)
+    candidates, ends, run_ends = chain(
+        np.arange(size // max(rec_len, 1), dtype=np.int64) * rec_len
+    )
+    runs = []
+    pos = 0
+    while pos + header_len <= size:
+        i = np.searchsorted(candidates, pos)
+        if i < candidates.size and candidates[i] == pos:
+            last = run_ends[np.searchsorted(run_ends, i)]
+            complete = ends[last] <= size
+            runs.append(candidates[i : last + complete])
+            if not complete:
+                pos = int(candidates[last])
+                break
+            pos = int(ends[last])
+            continue
+        if guess is not None:
+            candidates, ends, run_ends = chain(guess())
+            guess = None
+            continue
+        # not a candidate, step over one record
+        rec_len = header_len + tail_len
+        for col, item_len in zip(count_cols.tolist(), item_lens.tolist()):
+            rec_len += int(flat[pos + col]) * item_len
+        if pos + rec_len > size:
+            break
+        runs.append(np.array([pos], dtype=np.int64))
+        pos += rec_len
+    starts = np.concatenate([np.zeros(0, dtype=np.int64)] + runs)
+    counts = flat[starts[:, None] + count_cols].astype(np.int64)
+    return starts, counts, pos
+
+
+def _line_candidates(block: bytes, size: int, header_len: int) -> np.ndarray:
+    """Token offsets of the lines that may start a record: the lines holding
+    header_len tokens that follow a line of a different length. FracMan
+    writes every header, vertex, node, face and normal on its own line, so
+    these are the record starts unless header and item lines have the same
+    length, which _walk_records then resolves.
+
+    Args:
+        block (bytes): raw text of the last tokens of the section
+        size (int): number of tokens in the section
+        header_len (int): number of tokens in the record header
+
+    Returns:
+        np.ndarray: sorted token offsets
+    """
+    chars = np.frombuffer(block, dtype=np.uint8)
+    solid = chars > 32
+    token_starts = np.flatnonzero(solid[1:] > solid[:-1]) + 1
+    if solid[:1].any():
+        token_starts = np.concatenate([[0], token_starts])
+    # tokens before every line, and the token count of the non-blank lines
+    first = np.searchsorted(token_starts, np.flatnonzero(chars == 10))
+    first = np.concatenate([[0], first, [token_starts.size]])
+    lengths = np.diff(first)
+    heads = first[:-1][lengths > 0]
+    lengths = lengths[lengths > 0]
+    start = (lengths == header_len) & (np.roll(lengths, 1) != header_len)
+    start[:1] = lengths[:1] == header_len
+    offsets = size - token_starts.size + heads[start]
+    return offsets[offsets >= 0]
+
+
+def _gather_items(flat, starts, counts, first_item, item_len, cols):
+    """Gather ragged item blocks from a flat token array into one 2D array
+
+    Args:
+        flat (np.ndarray): all numeric tokens of the section
+        starts (np.ndarray): token offset of each block's owning record
+        counts (np.ndarray): number of items in each record
+        first_item (np.ndarray): token offset of the block within each record
+        item_len (int): number of tokens per item
+        cols (np.ndarray): token columns to keep for each item
+
+    Returns:
+        tuple: items (n_items x len(cols)), and offsets (n_records + 1)
+    """
+    offsets = np.zeros(counts.size + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    owner = np.repeat(np.arange(counts.size), counts)
+    local = np.arange(offsets[-1]) - offsets[owner]
+    pos = (starts + first_item)[owner] + item_len * local
+    return flat[pos[:, None] + cols], offsets
+
+
+def _count_tokens(block: bytes, line_no: int) -> int:
+    "Count the whitespace separated tokens on a line of a block"
+    lines = block.lstrip().split(b"\n", line_no + 1)
+    return len(lines[line_no].split())
+
+
+def _section_layout(block: bytes, section: str) -> int:
+    """Token count of the variable length line in the first record: the
+    header for FRACTURE sections and the first face for TESSFRACTURE sections
+    """
+    if section == "FRACTURE":
+        return _count_tokens(block, 0) if block.strip() else 3
+    if not block.strip():
+        return 5
+    return _count_tokens(block, 1 + int(block.split(maxsplit=2)[1]))
+
+
+def _walk_section(flat: np.ndarray, section: str, layout: int, block=None) -> tuple:
+    """Locate every complete record of a fracture section, see _walk_records
+
+    Args:
+        flat (np.ndarray): numeric tokens of the section
+        section (str): "FRACTURE" or "TESSFRACTURE"
+        layout (int): header length (FRACTURE) or face length (TESSFRACTURE)
+        block (bytes, optional): raw text of the last tokens of flat, used to
+            find the record starts from the line layout. Defaults to None.
+
+    Returns:
+        tuple: record starts, item counts, and the number of tokens consumed
+    """
+    header_len = layout if section == "FRACTURE" else 4
+    guess = None
+    if block is not None:
+        guess = partial(_line_candidates, block, flat.size, header_len)
+    if section == "FRACTURE":
+        return _walk_records(flat, layout, (1,), (4,), 4, guess)
+    return _walk_records(flat, 4, (1, 2), (4, layout), 0, guess)
+
+
+def _read_records(flat: np.ndarray, section: str, layout: int, block=None) -> tuple:
+    """Read every complete record of a fracture section from its tokens
+
+    Args:
+        flat (np.ndarray): numeric tokens of the section
+        section (str): "FRACTURE" or "TESSFRACTURE"
+        layout (int): header length (FRACTURE) or face length (TESSFRACTURE)
+        block (bytes, optional): raw text of the last tokens of flat, see
+            _walk_section. Defaults to None.
+
+    Returns:
+        tuple: read_fracture_block or read_tesselated_fracture_block
+        output, and the number of tokens consumed
+    """
+    starts, counts, used = _walk_section(flat, section, layout, block)
+    if section == "FRACTURE":
+        return _assemble_fractures(flat, starts, counts[:, 0], layout), used
+    return _assemble_tesselated_fractures(flat, starts, counts, layout), used
+
+
+def read_fracture_block(block: bytes):
+    """Read a whole FRACTURE section body in one pass
+
+    Tokenizes the section with numpy and gathers headers, vertices and
+    normals with array indexing instead of reading line by line.
+
+    Args:
+        block (bytes): raw section body, without the BEGIN / END lines
+
+    Returns:
+        tuple: fracture ids, sets, normals (n x 4), vertices (n_vert x 3),
+        vertex offsets (n + 1), and properties (n x n_prop)
+    """
+    flat = np.fromstring(block, sep=" ")
+    layout = _section_layout(block, "FRACTURE")
+    return _read_records(flat, "FRACTURE", layout, block)[0]
+
+
+def _assemble_fractures(flat, starts, n_vert, header_len):
+    "Gather the FRACTURE record arrays once the record starts are known"
+    header = flat[starts[:, None] + np.arange(header_len)]
+    vertices, offsets = _gather_items(
+        flat, starts, n_vert, header_len, 4, np.arange(1, 4)
+    )
+    normals = flat[(starts + header_len + 4 * n_vert)[:, None] + np.arange(4)]
+    return (
+        header[:, 0].astype(np.int64),
+        header[:, 2],
+        normals,
+        vertices,
+        offsets,
+        header[:, 3:],
+    )
+
+
+def read_tesselated_fracture_block(block: bytes):
+    """Read a whole TESSFRACTURE section body in one pass
+
+    Args:
+        block (bytes): raw section body, without the BEGIN / END lines
+
+    Returns:
+        tuple: fracture ids, sets, nodes (n_node x 3), node offsets (n + 1),
+        faces (n_face x 5), face properties (n_face x n_prop),
+        and face offsets (n + 1)
+    """
+    flat = np.fromstring(block, sep=" ")
+    layout = _section_layout(block, "TESSFRACTURE")
+    return _read_records(flat, "TESSFRACTURE", layout, block)[0]
+
+
+def _assemble_tesselated_fractures(flat, starts, counts, face_len):
+    "Gather the TESSFRACTURE record arrays once the record starts are known"
+    header = flat[starts[:, None] + np.arange(4)]
+    nodes, node_offsets = _gather_items(
+        flat, starts, counts[:, 0], 4, 4, np.arange(1, 4)
+    )
+    faces, face_offsets = _gather_items(
+        flat, starts, counts[:, 1], 4 + 4 * counts[:, 0], face_len, np.arange(face_len)
+    )
+    return (
+        header[:, 0].astype(np.int64),
+        header[:, 3],
+        nodes,
+        node_offsets,
+        faces[:, :5],
+        faces[:, 5:],
+        face_offsets,
+    )
+
+
+def split_ragged(values: np.ndarray, offsets: np.ndarray) -> list:
+    """Split a flat array into a list of transposed per-fracture views,
+    matching the layout of read_fractures and read_tesselated_fractures
+
+    Args:
+        values (np.ndarray): flat values (n_items x n_cols)
+        offsets (np.ndarray): item offsets per fracture (n + 1)
+
+    Returns:
+        list: n_cols x n_items arrays, one per fracture
+    """
+    bounds = offsets.tolist()
+    return [values[a:b].T for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+# TESSFRACTURE face records are laid out as
+#   FaceID N1 N2 N3 0 Prop1 ... PropN
+# with N1 to N3 the 1-based node numbers of the triangle within its fracture
+# and a 0 flag column, so these are the node columns of t_faces
+TESS_FACE_NODES = [1, 2, 3]
+TESS_FACE_FLAG = 4
+
+
+class RaggedArray:
+    """Per-fracture blocks of rows stored as one flat array plus offsets
+    (CSR layout). Rows of fracture i are values[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, values: np.ndarray, offsets: np.ndarray) -> None:
+        self.values = values
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_list(cls, arrays: list, n_cols: int) -> "RaggedArray":
+        """Build from a list of n_cols x n_items arrays, as returned by
+        read_fractures and read_tesselated_fractures
+
+        Args:
+            arrays (list): per-fracture arrays
+            n_cols (int): number of columns, used when the list is empty
+
+        Returns:
+            RaggedArray: flat representation
+        """
+        lengths = [np.shape(a)[1] for a in arrays]
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if not arrays:
+            return cls(np.zeros((0, n_cols)), offsets)
+        values = np.concatenate([np.asarray(a, dtype=float).T for a in arrays])
+        return cls(values, offsets)
+
+    @classmethod
+    def concat(cls, arrays: list) -> "RaggedArray":
+        """Join RaggedArrays end to end
+
+        Args:
+            arrays (list): RaggedArrays with the same number of columns
+
+        Returns:
+            RaggedArray: combined array
+        """
+        shifts = np.cumsum([0] + [a.offsets[-1] for a in arrays[:-1]])
+        offsets = [a.offsets[:-1] + shift for a, shift in zip(arrays, shifts)]
+        offsets.append([shifts[-1] + arrays[-1].offsets[-1]])
+        return cls(np.concatenate([a.values for a in arrays]), np.concatenate(offsets))
+
+    def __len__(self) -> int:
+        return self.offsets.size - 1
+
+    def __getitem__(self, key):
+        """Integer keys return a view of one fracture's rows, contiguous
+        slices return a RaggedArray view, and index arrays or masks return
+        a gathered copy.
+        """
+        if isinstance(key, (int, np.integer)):
+            key = key + len(self) if key < 0 else key
+            return self.values[self.offsets[key] : self.offsets[key + 1]]
+        if isinstance(key, slice) and key.step in (None, 1):
+            start, stop, _ = key.indices(len(self))
+            stop = max(start, stop)
+            offsets = self.offsets[start : stop + 1]
+            return RaggedArray(
+                self.values[offsets[0] : offsets[-1]], offsets - offsets[0]
+            )
+        return self.take(np.arange(len(self))[key])
+
+    @property
+    def lengths(self) -> np.ndarray:
+        "Number of rows per fracture"
+        return np.diff(self.offsets)
+
+    @property
+    def owner(self) -> np.ndarray:
+        "Fracture index of every row"
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.offsets.nbytes
+
+    def take(self, idx: np.ndarray) -> "RaggedArray":
+        """Gather a subset of fractures into a new RaggedArray
+
+        Args:
+            idx (np.ndarray): fracture indices
+
+        Returns:
+            RaggedArray: copy with the selected fractures, in idx order
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        lengths = self.lengths[idx]
+        offsets = np.zeros(idx.size + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        rows = np.repeat(self.offsets[idx] - offsets[:-1], lengths) + np.arange(
+            offsets[-1]
+        )
+        return RaggedArray(self.values[rows], offsets)
+
+    def to_list(self) -> list:
+        "Split into the n_cols x n_items arrays returned by parse_fab_file"
+        return split_ragged(self.values, self.offsets)
+
+
+class FractureCollection:
+    """Columnar container for a parsed .fab file
+
+    Polygonal fractures (FRACTURE section) keep one flat vertex array with
+    offsets, and tessellated fractures (TESSFRACTURE section) keep flat node,
+    face and face property arrays, so any fracture is an O(1) view and
+    downstream operations can work on whole arrays.
+    """
+
+    def __init__(
+        self,
+        fid: np.ndarray,
+        sets: np.ndarray,
+        normals: np.ndarray,
+        vertices: RaggedArray,
+        properties: np.ndarray,
+        t_fid: np.ndarray = None,
+        t_sets: np.ndarray = None,
+        t_nodes: RaggedArray = None,
+        t_faces: RaggedArray = None,
+        t_properties: RaggedArray = None,
+        prop_dict: dict = None,
+        set_dict: dict = None,
+        format: dict = None,
+    ) -> None:
+        self.fid = fid
+        self.sets = sets
+        self.normals = normals
+        self.vertices = vertices
+        self.properties = properties
+        self.t_fid = np.zeros(0, dtype=np.int64) if t_fid is None else t_fid
+        self.t_sets = np.zeros(0) if t_sets is None else t_sets
+        empty = RaggedArray(np.zeros((0, 3)), np.zeros(1, dtype=np.int64))
+        self.t_nodes = empty if t_nodes is None else t_nodes
+        self.t_faces = (
+            RaggedArray(np.zeros((0, 5)), empty.offsets) if t_faces is None else t_faces
+        )
+        self.t_properties = (
+            RaggedArray(np.zeros((0, 0)), empty.offsets)
+            if t_properties is None
+            else t_properties
+        )
+        self.prop_dict = {} if prop_dict is None else prop_dict
+        self.set_dict = {} if set_dict is None else set_dict
+        self.format = {} if format is None else format
+
+    @classmethod
+    def from_dict(cls, output: dict) -> "FractureCollection":
+        """Build a collection from the dictionary returned by parse_fab_file
+
+        Args:
+            output (dict): parse_fab_file output (either engine)
+
+        Returns:
+            FractureCollection: columnar collection
+        """
+        kwargs = {}
+        if "t_fid" in output:
+            kwargs = dict(
+                t_fid=np.asarray(output["t_fid"], dtype=np.int64),
+                t_sets=np.asarray(output["t_sets"], dtype=float),
+                t_nodes=RaggedArray.from_list(output["t_nodes"], 3),
+                t_faces=RaggedArray.from_list(output["t_faces"], 5),
+                t_properties=RaggedArray.from_list(output["t_properties"], 0),
+            )
+        properties = np.asarray(output["properties"], dtype=float)
+        return cls(
+            fid=np.asarray(output["fid"], dtype=np.int64),
+            sets=np.asarray(output["sets"], dtype=float),
+            normals=np.asarray(output["normals"], dtype=float).reshape(-1, 4),
+            vertices=RaggedArray.from_list(output["vertices"], 3),
+            properties=properties.reshape(len(output["fid"]), -1),
+            prop_dict=output.get("prop_dict"),
+            set_dict=output.get("set_dict"),
+            format=output.get("format"),
+            **kwargs,
+        )
+
+    @classmethod
+    def concat(cls, collections: list) -> "FractureCollection":
+        """Join collections parsed from the same file, keeping the headers
+        of the first one
+
+        Args:
+            collections (list): FractureCollections
+
+        Returns:
+            FractureCollection: combined collection
+        """
+        first = collections[0]
+        kwargs = _concat_fields(
+            [
+                {name: getattr(c, name) for name in _ARRAYS + _RAGGED}
+                for c in collections
+            ]
+        )
+        return cls(
+            prop_dict=first.prop_dict,
+            set_dict=first.set_dict,
+            format=first.format,
+            **kwargs,
+        )
+
+    def __len__(self) -> int:
+        return self.fid.size + self.t_fid.size
+
+    @property
+    def property_df(self) -> pd.DataFrame:
+        "Fracture properties indexed by fracture id"
+        return make_properties_df(self.fid, self.prop_dict, self.properties)
+
+    @property
+    def nbytes(self) -> int:
+        "Memory used by the fracture arrays"
+        arrays = (
+            self.fid,
+            self.sets,
+            self.normals,
+            self.properties,
+            self.t_fid,
+            self.t_sets,
+        )
+        ragged = (self.vertices, self.t_nodes, self.t_faces, self.t_properties)
+        return sum(a.nbytes for a in arrays) + sum(r.nbytes for r in ragged)
+
+    def tess_triangles(self) -> np.ndarray:
+        """Rows of t_nodes.values at the corners of every TESSFRACTURE face,
+        checking the faces follow the TESS_FACE_NODES layout
+
+        Returns:
+            np.ndarray: node rows (n_face x 3)
+        """
+        faces = self.t_faces
+        if np.any(faces.values[:, TESS_FACE_FLAG] != 0):
+            raise ValueError(
+                "TESSFRACTURE faces are not laid out as FaceID N1 N2 N3 0 props"
+            )
+        nodes = faces.values[:, TESS_FACE_NODES].astype(np.int64) - 1
+        n_nodes = self.t_nodes.lengths[faces.owner][:, None]
+        if np.any((nodes < 0) | (nodes >= n_nodes)):
+            raise ValueError("TESSFRACTURE face references a missing node")
+        return nodes + self.t_nodes.offsets[faces.owner][:, None]
+
+    def polygons(self) -> tuple:
+        """Planar polygons of every fracture: the polygon of each FRACTURE
+        record followed by the triangles of each TESSFRACTURE record
+
+        Returns:
+            tuple: polygon vertices (RaggedArray), and the position of the
+            owning fracture in fid followed by t_fid
+        """
+        nodes = self.tess_triangles()
+        triangles = RaggedArray(
+            self.t_nodes.values[nodes.ravel()], np.arange(0, nodes.size + 1, 3)
+        )
+        owner = np.concatenate(
+            [np.arange(self.fid.size), self.fid.size + self.t_faces.owner]
+        )
+        return RaggedArray.concat([self.vertices, triangles]), owner
+
+    def select(self, idx=slice(None), t_idx=slice(None)) -> "FractureCollection":
+        """Select fractures by position in each section. Contiguous slices
+        return views, index arrays or masks return copies.
+
+        Args:
+            idx (optional): FRACTURE positions. Defaults to all.
+            t_idx (optional): TESSFRACTURE positions. Defaults to all.
+
+        Returns:
+            FractureCollection: selected fractures
+        """
+        return FractureCollection(
+            fid=self.fid[idx],
+            sets=self.sets[idx],
+            normals=self.normals[idx],
+            vertices=self.vertices[idx],
+            properties=self.properties[idx],
+            t_fid=self.t_fid[t_idx],
+            t_sets=self.t_sets[t_idx],
+            t_nodes=self.t_nodes[t_idx],
+            t_faces=self.t_faces[t_idx],
+            t_properties=self.t_properties[t_idx],
+            prop_dict=self.prop_dict,
+            set_dict=self.set_dict,
+            format=self.format,
+        )
+
+    def select_set(self, set_no: float) -> "FractureCollection":
+        """Select a single fracture set. The result is a zero-copy view when
+        the set is stored contiguously, which is the case for FracMan exports
+        and after sort_by_set.
+
+        Args:
+            set_no (float): set number as stored in the fracture records
+
+        Returns:
+            FractureCollection: fractures in the set
+        """
+        return self.select(
+            _contiguous(np.flatnonzero(self.sets == set_no)),
+            _contiguous(np.flatnonzero(self.t_sets == set_no)),
+        )
+
+    def sort_by_set(self) -> "FractureCollection":
+        "Copy of the collection ordered by set, so every set is contiguous"
+        return self.select(
+            np.argsort(self.sets, kind="stable"), np.argsort(self.t_sets, kind="stable")
+        )
+
+    def save(self, directory: Path) -> None:
+        """Write the collection as uncompressed .npy files, so it can be
+        memory mapped back in with load
+
+        Args:
+            directory (Path): existing output directory
+        """
+        directory = Path(directory)
+        for name in _ARRAYS:
+            np.save(directory / (name + ".npy"), getattr(self, name))
+        for name in _RAGGED:
+            ragged = getattr(self, name)
+            np.save(directory / (name + ".npy"), ragged.values)
+            np.save(directory / (name + "_offsets.npy"), ragged.offsets)
+        with open(directory / "collection.json", "w") as f:
+            json.dump(
+                {
+                    "prop_dict": self.prop_dict,
+                    "set_dict": self.set_dict,
+                    "format": self.format,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, directory: Path, mmap_mode: str = "r") -> "FractureCollection":
+        """Load a collection written by save
+
+        Args:
+            directory (Path): directory written by save
+            mmap_mode (str, optional): numpy memory map mode, None reads the
+                arrays into memory. Defaults to "r".
+
+        Returns:
+            FractureCollection: loaded collection
+        """
+        directory = Path(directory)
+        with open(directory / "collection.json", "r") as f:
+            kwargs = json.load(f)
+        for name in _ARRAYS:
+            kwargs[name] = np.load(directory / (name + ".npy"), mmap_mode=mmap_mode)
+        for name in _RAGGED:
+            kwargs[name] = RaggedArray(
+                np.load(directory / (name + ".npy"), mmap_mode=mmap_mode),
+                np.load(directory / (name + "_offsets.npy")),
+            )
+        return cls(**kwargs)
+
+    def to_dict(self) -> dict:
+        "Convert to the dictionary layout returned by parse_fab_file"
+        output = {
+            "format": self.format,
+            "prop_dict": self.prop_dict,
+            "set_dict": self.set_dict,
+            "sets": self.sets,
+            "fid": self.fid,
+            "normals": self.normals,
+            "vertices": self.vertices.to_list(),
+            "properties": self.properties,
+        }
+        if self.t_fid.size:
+            output["t_fid"] = self.t_fid
+            output["t_sets"] = self.t_sets
+            output["t_nodes"] = self.t_nodes.to_list()
+            output["t_faces"] = self.t_faces.to_list()
+            output["t_properties"] = self.t_properties.to_list()
+        output["property_df"] = self.property_df
+        return output
+
+
+_ARRAYS = ("fid", "sets", "normals", "properties", "t_fid", "t_sets")
+_RAGGED = ("vertices", "t_nodes", "t_faces", "t_properties")
+
+
+def _contiguous(idx: np.ndarray):
+    "Replace a run of consecutive indices with a slice, so selections are views"
+    if idx.size == 0 or idx[-1] - idx[0] + 1 == idx.size:
+        start = int(idx[0]) if idx.size else 0
+        return slice(start, start + idx.size)
+    return idx
+
+
+def _fracture_fields(fid, sets, normals, vertices, offsets, props) -> dict:
+    "FractureCollection arguments from read_fracture_block output"
+    return dict(
+        fid=fid,
+        sets=sets,
+        normals=normals,
+        vertices=RaggedArray(vertices, offsets),
+        properties=props,
+    )
+
+
+def _tesselated_fields(
+    fid, sets, nodes, node_offsets, faces, face_props, face_offsets
+) -> dict:
+    "FractureCollection arguments from read_tesselated_fracture_block output"
+    return dict(
+        t_fid=fid,
+        t_sets=sets,
+        t_nodes=RaggedArray(nodes, node_offsets),
+        t_faces=RaggedArray(faces, face_offsets),
+        t_properties=RaggedArray(face_props, face_offsets),
+    )
+
+
+def _empty_fracture_fields(n_props: int) -> dict:
+    "FractureCollection arguments for a file without a FRACTURE section"
+    return dict(
+        fid=np.zeros(0, dtype=np.int64),
+        sets=np.zeros(0),
+        normals=np.zeros((0, 4)),
+        vertices=RaggedArray(np.zeros((0, 3)), np.zeros(1, dtype=np.int64)),
+        properties=np.zeros((0, n_props)),
+    )
+
+
+def _section_fields(records: tuple, section: str) -> dict:
+    "FractureCollection arguments for records read from one fracture section"
+    if section == "FRACTURE":
+        return _fracture_fields(*records)
+    return _tesselated_fields(*records)
+
+
+def _concat_fields(parts: list) -> dict:
+    "Join FractureCollection arguments read from consecutive parts of a file"
+    fields = {}
+    for name in parts[0]:
+        values = [part[name] for part in parts]
+        if isinstance(values[0], RaggedArray):
+            fields[name] = RaggedArray.concat(values)
+        else:
+            fields[name] = np.concatenate(values)
+    if "t_properties" in fields:
+        # faces and face properties share offsets
+        fields["t_properties"].offsets = fields["t_faces"].offsets
+    return fields
+
+
+def _record_boundaries(buf, start: int, stop: int, section: str, n_parts: int):
+    """Split a fracture section body into byte ranges that each start on a
+    record header. FRACTURE records end with the normal line (first token 0)
+    and TESSFRACTURE headers are the 4 token lines that follow a face line.
+
+    Args:
+        buf: file contents (bytes or a memory map)
+        start (int): first byte of the section body
+        stop (int): byte offset of the END keyword
+        section (str): "FRACTURE" or "TESSFRACTURE"
+        n_parts (int): target number of ranges
+
+    Returns:
+        list: byte offsets of the range boundaries, including start and stop
+    """
+    bounds = [start]
+    for k in range(1, n_parts):
+        pos = max(start + (stop - start) * k // n_parts, bounds[-1])
+        pos = buf.find(b"\n", pos, stop) + 1
+        prev = None
+        while 0 < pos < stop:
+            eol = buf.find(b"\n", pos, stop)
+            eol = stop if eol < 0 else eol
+            tokens = buf[pos:eol].split()
+            if section == "FRACTURE" and tokens[:1] == [b"0"]:
+                pos = eol + 1
+                break
+            if section == "TESSFRACTURE" and tokens:
+                if prev is not None and prev != 4 and len(tokens) == 4:
+                    break
+                prev = len(tokens)
+            pos = eol + 1
+        if not bounds[-1] < pos < stop:
+            break
+        bounds.append(pos)
+    bounds.append(stop)
+    return bounds
+
+
+def _read_record_range(f_name, section: str, start: int, stop: int, layout: int):
+    "Process pool worker reading the records in one byte range of a section"
+    with open(f_name, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buf:
+        block = buf[start:stop]
+    flat = np.fromstring(block, sep=" ")
+    records, used = _read_records(flat, section, layout, block)
+    if used != flat.size:
+        raise ValueError("Byte range does not hold whole records")
+    return records
+
+
+def _read_section_parallel(f_name, buf, start, stop, section, workers) -> tuple:
+    """Read a fracture section by handing record aligned byte ranges to a
+    process pool, falling back to a serial read if the split is not clean
+
+    Returns:
+        tuple: records of the whole section, as from _read_records
+    """
+    layout = _section_layout(buf[start : min(stop, start + (1 << 20))], section)
+    bounds = _record_boundaries(buf, start, stop, section, workers)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(
+                pool.map(
+                    _read_record_range,
+                    repeat(f_name),
+                    repeat(section),
+                    bounds[:-1],
+                    bounds[1:],
+                    repeat(layout),
+                )
+            )
+    except ValueError:
+        block = buf[start:stop]
+        flat = np.fromstring(block, sep=" ")
+        return _read_records(flat, section, layout, block)[0]
+
+    fields = _concat_fields([_section_fields(part, section) for part in parts])
+    if section == "FRACTURE":
+        vertices = fields["vertices"]
+        return (
+            fields["fid"],
+            fields["sets"],
+            fields["normals"],
+            vertices.values,
+            vertices.offsets,
+            fields["properties"],
+        )
+    return (
+        fields["t_fid"],
+        fields["t_sets"],
+        fields["t_nodes"].values,
+        fields["t_nodes"].offsets,
+        fields["t_faces"].values,
+        fields["t_properties"].values,
+        fields["t_faces"].offsets,
+    )
+
+
+def _parse_fab_bulk(f_name, workers: int = None) -> FractureCollection:
+    """Parse a .fab file into a collection by tokenizing whole sections at
+    once, optionally spreading the fracture sections over worker processes
+    """
+    with open(f_name, "rb") as f:
+        if workers is None or workers <= 1 or os.fstat(f.fileno()).st_size == 0:
+            return _parse_fab_buffer(f_name, f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return _parse_fab_buffer(f_name, buf, workers)
+
+
+def _parse_fab_buffer(f_name, buf, workers: int = None) -> FractureCollection:
+    "Parse the contents of a .fab file, see _parse_fab_bulk"
+    kwargs = {}
+    for name, start, stop in _iter_sections(buf):
+        if name == "FORMAT":
+            kwargs["format"] = clean_dict_values(read_keywords(buf[start:stop]))
+        elif name == "PROPERTIES":
+            kwargs["prop_dict"] = make_properties_dict(read_keywords(buf[start:stop]))
+        elif name == "SETS":
+            kwargs["set_dict"] = clean_dict_values(read_keywords(buf[start:stop]))
+        elif name in ("FRACTURE", "TESSFRACTURE") and workers:
+            records = _read_section_parallel(f_name, buf, start, stop, name, workers)
+            kwargs.update(_section_fields(records, name))
+        elif name == "FRACTURE":
+            kwargs.update(_fracture_fields(*read_fracture_block(buf[start:stop])))
+        elif name == "TESSFRACTURE":
+            kwargs.update(
+                _tesselated_fields(*read_tesselated_fracture_block(buf[start:stop]))
+            )
+        elif name == "ROCKBLOCK":
+            raise NotImplementedError("Rock Block Not Implemented, Sorry!")
+        else:
+            raise ValueError("Unknown section type BEGIN " + name)
+
+    if "fid" not in kwargs:
+        kwargs.update(_empty_fracture_fields(len(kwargs.get("prop_dict", {}))))
+    return FractureCollection(**kwargs)
+
+
+def _read_header_sections(f) -> tuple:
+    """Read the header sections of a binary file handle up to the first
+    fracture section
+
+    Args:
+        f: .fab file opened in binary mode
+
+    Returns:
+        tuple: FractureCollection header arguments, and the name of the first
+        fracture section (None at the end of the file)
+    """
+    kwargs = {}
+    for line in f:
+        name = line.strip().decode()
+        if not name.startswith("BEGIN "):
+            continue
+        name = name[6:].strip()
+        if name in ("FRACTURE", "TESSFRACTURE"):
+            return kwargs, name
+        body = []
+        for line in f:
+            if line.strip().decode() == "END " + name:
+                break
+            body.append(line)
+        body = read_keywords(b"".join(body))
+        if name == "FORMAT":
+            kwargs["format"] = clean_dict_values(body)
+        elif name == "PROPERTIES":
+            kwargs["prop_dict"] = make_properties_dict(body)
+        elif name == "SETS":
+            kwargs["set_dict"] = clean_dict_values(body)
+        elif name == "ROCKBLOCK":
+            raise NotImplementedError("Rock Block Not Implemented, Sorry!")
+        else:
+            raise ValueError("Unknown section type BEGIN " + name)
+    return kwargs, None
+
+
+def _select_section(collection, section: str, idx) -> FractureCollection:
+    "Select positions in one fracture section, dropping the other section"
+    if section == "FRACTURE":
+        return collection.select(idx, slice(0, 0))
+    return collection.select(slice(0, 0), idx)
+
+
+def iter_fab_fractures(
+    f_name,
+    chunk_size: int = 100_000,
+    section: str = "FRACTURE",
+    block_bytes: int = 1 << 24,
+):
+    """Stream the fractures of a .fab file in fixed size batches, so peak
+    memory depends on chunk_size and block_bytes rather than the file size.
+    The FORMAT, PROPERTIES and SETS sections are read before the first batch.
+
+    Args:
+        f_name: .fab file path
+        chunk_size (int, optional): fractures per batch (the last batch may
+            be smaller). Defaults to 100,000.
+        section (str, optional): "FRACTURE" or "TESSFRACTURE".
+            Defaults to "FRACTURE".
+        block_bytes (int, optional): bytes read from disk at a time.
+            Defaults to 16 MB.
+
+    Yields:
+        FractureCollection: batch of fractures with the file headers
+    """
+    if section not in ("FRACTURE", "TESSFRACTURE"):
+        raise ValueError("Unknown section type " + section)
+
+    with open(f_name, "rb") as f:
+        header, name = _read_header_sections(f)
+        while name is not None and name != section:
+            # skip over the other fracture section
+            for line in f:
+                if line.strip().decode() == "END " + name:
+                    break
+            more, name = _read_header_sections(f)
+            header.update(more)
+        if name is None:
+            return
+        n_props = len(header.get("prop_dict", {}))
+
+        pending = []
+        n_pending = 0
+        leftover = np.zeros(0)
+        layout = None
+        done = False
+        while not done:
+            block = f.read(block_bytes) + f.readline()
+            stop = block.find(b"END " + section.encode())
+            if stop >= 0 or not block:
+                block = block[: max(stop, 0)]
+                done = True
+
+            if layout is None and block.strip():
+                layout = _section_layout(block, section)
+
+            flat = np.concatenate([leftover, np.fromstring(block, sep=" ")])
+            records, used = _read_records(
+                flat, section, layout or _section_layout(b"", section), block
+            )
+            fields = _section_fields(records, section)
+            if section == "TESSFRACTURE":
+                fields.update(_empty_fracture_fields(n_props))
+            leftover = flat[used:]
+
+            pending.append(FractureCollection(**fields, **header))
+            n_pending += records[0].size
+            if n_pending < chunk_size and not done:
+                continue
+            batch = FractureCollection.concat(pending)
+            n_ready = n_pending if done else n_pending - n_pending % chunk_size
+            for start in range(0, n_ready, chunk_size):
+                yield _select_section(
+                    batch, section, slice(start, min(start + chunk_size, n_ready))
+                )
+            pending = [_select_section(batch, section, slice(n_ready, None))]
+            n_pending -= n_ready
+
+        if leftover.size:
+            raise ValueError("Incomplete fracture record at END " + section)
+
+
+# fracture sections in the order of the section codes of a .fab index
+_FRACTURE_SECTIONS = ("FRACTURE", "TESSFRACTURE")
+
+
+def _line_starts(block: bytes) -> np.ndarray:
+    "Byte offsets of the lines of a block holding more than whitespace"
+    chars = np.frombuffer(block, dtype=np.uint8)
+    if chars.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.concatenate([[0], np.flatnonzero(chars == 10) + 1])
+    starts = starts[starts < chars.size]
+    # a blank line reduces over its whitespace and newline only
+    return starts[np.logical_or.reduceat(chars > 32, starts)]
+
+
+def _index_record_range(f_name, section: str, start: int, stop: int, layout: int):
+    """Process pool worker indexing the records in one byte range of a
+    section. Every vertex, node, face and normal must be on its own line,
+    as FracMan writes them, so each record spans a known number of lines.
+
+    Returns:
+        tuple: fracture ids, sets, byte offsets and byte lengths of the records
+    """
+    with open(f_name, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buf:
+        block = buf[start:stop]
+    flat = np.fromstring(block, sep=" ")
+    starts, counts, used = _walk_section(flat, section, layout, block)
+    if section == "FRACTURE":
+        n_lines = counts[:, 0] + 2
+        sets = flat[starts + 2]
+    else:
+        n_lines = counts.sum(axis=1) + 1
+        sets = flat[starts + 3]
+    lines = _line_starts(block)
+    if used != flat.size or n_lines.sum() != lines.size:
+        raise ValueError("Byte range does not hold whole records")
+    offsets = start + lines[np.cumsum(n_lines) - n_lines]
+    lengths = np.diff(np.append(offsets, stop))
+    return flat[starts].astype(np.int64), sets, offsets, lengths
+
+
+def _index_section(f_name, buf, start, stop, section, workers, block_bytes) -> tuple:
+    """Index a fracture section in record aligned byte ranges of about
+    block_bytes, spread over a process pool when workers > 1, falling back
+    to a single range if the split is not clean
+
+    Returns:
+        tuple: section layout, and the fracture ids, sets, byte offsets and
+        byte lengths of its records
+    """
+    layout = _section_layout(buf[start : min(stop, start + (1 << 20))], section)
+    n_parts = max(workers or 1, -(-(stop - start) // block_bytes))
+    bounds = _record_boundaries(buf, start, stop, section, n_parts)
+    args = (repeat(f_name), repeat(section), bounds[:-1], bounds[1:], repeat(layout))
+    try:
+        if workers is not None and workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = list(pool.map(_index_record_range, *args))
+        else:
+            parts = list(map(_index_record_range, *args))
+    except ValueError:
+        parts = [_index_record_range(f_name, section, start, stop, layout)]
+    return (layout,) + tuple(np.concatenate(field) for field in zip(*parts))
+
+
+def fab_index_path(f_name) -> Path:
+    "Sidecar index file of a .fab file"
+    return Path(str(f_name) + ".idx.npz")
+
+
+def build_fab_index(f_name, workers: int = None, block_bytes: int = 1 << 26) -> dict:
+    """Scan a .fab file once for the byte offset and length of every
+    fracture record, and the byte ranges of the header sections
+
+    Args:
+        f_name: .fab file path
+        workers (int, optional): number of processes scanning the fracture
+            sections. Defaults to None (serial).
+        block_bytes (int, optional): bytes of a section tokenized at a time.
+            Defaults to 64 MB.
+
+    Returns:
+        dict: index arrays, one entry per record for fid, sets, section
+        (code in _FRACTURE_SECTIONS), offset and length
+    """
+    stamp = file_stamp(f_name)
+    index = {
+        "fid": [np.zeros(0, dtype=np.int64)],
+        "sets": [np.zeros(0)],
+        "section": [np.zeros(0, dtype=np.int8)],
+        "offset": [np.zeros(0, dtype=np.int64)],
+        "length": [np.zeros(0, dtype=np.int64)],
+    }
+    layouts = [3, 5]
+    sections = []
+    with open(f_name, "rb") as f:
+        if stamp["size"] == 0:
+            raise ValueError("Empty .fab file " + str(f_name))
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for name, start, stop in _iter_sections(buf):
+                sections.append((name, start, stop))
+                if name == "ROCKBLOCK":
+                    raise NotImplementedError("Rock Block Not Implemented, Sorry!")
+                if name not in _FRACTURE_SECTIONS:
+                    continue
+                code = _FRACTURE_SECTIONS.index(name)
+                layouts[code], *fields = _index_section(
+                    f_name, buf, start, stop, name, workers, block_bytes
+                )
+                for key, values in zip(("fid", "sets", "offset", "length"), fields):
+                    index[key].append(values)
+                index["section"].append(np.full(fields[0].size, code, dtype=np.int8))
+
+    index = {key: np.concatenate(values) for key, values in index.items()}
+    index["layouts"] = np.array(layouts, dtype=np.int64)
+    index["section_names"] = np.array([s[0] for s in sections], dtype=str)
+    index["section_bounds"] = np.array([s[1:] for s in sections], dtype=np.int64)
+    index["size"] = np.int64(stamp["size"])
+    index["mtime_ns"] = np.int64(stamp["mtime_ns"])
+    return index
+
+
+def save_fab_index(index: dict, path: Path) -> None:
+    "Write an index from build_fab_index atomically"
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp.npz")
+    np.savez(tmp, **index)
+    os.replace(tmp, path)
+
+
+def load_fab_index(path: Path, f_name=None) -> dict:
+    """Read an index written by save_fab_index
+
+    Args:
+        path (Path): index file
+        f_name (optional): .fab file the index must still match in size and
+            modification time. Defaults to None (no check).
+
+    Returns:
+        dict: index arrays, or None if missing, unreadable or out of date
+    """
+    try:
+        with np.load(path) as data:
+            index = {key: data[key] for key in data.files}
+    except (OSError, ValueError):
+        return None
+    if f_name is not None:
+        stamp = file_stamp(f_name)
+        if (int(index["size"]), int(index["mtime_ns"])) != (
+            stamp["size"],
+            stamp["mtime_ns"],
+        ):
+            return None
+    return index
+
+
+class FabFile:
+    """Random access to the fractures of a .fab file
+
+    A sidecar index (see build_fab_index) maps every fracture id to the byte
+    range of its record, so fractures selected by id or set are decoded
+    straight from a memory map of the file without parsing the rest.
+    """
+
+    def __init__(
+        self, f_name, index_path: Path = None, workers: int = None, rebuild=False
+    ) -> None:
+        """Open a .fab file, building and saving its index if it is missing or
+        older than the file
+
+        Args:
+            f_name: .fab file path
+            index_path (Path, optional): sidecar index file.
+                Defaults to None (f_name with .idx.npz appended).
+            workers (int, optional): processes used to build the index.
+                Defaults to None (serial).
+            rebuild (bool, optional): rebuild the index even if it is current.
+                Defaults to False.
+        """
+        self.f_name = Path(f_name)
+        self.index_path = (
+            fab_index_path(f_name) if index_path is None else Path(index_path)
+        )
+        self.index = None if rebuild else load_fab_index(self.index_path, f_name)
+        if self.index is None:
+            self.index = build_fab_index(f_name, workers)
+            save_fab_index(self.index, self.index_path)
+        self._order = np.argsort(self.index["fid"], kind="stable")
+        self._sorted_fid = self.index["fid"][self._order]
+        self._file = open(self.f_name, "rb")
+        self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header = self._read_header()
+
+    def __enter__(self) -> "FabFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        "Release the memory map and file handle"
+        self._buf.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self.index["fid"].size
+
+    @property
+    def fid(self) -> np.ndarray:
+        "Fracture id of every record, in file order"
+        return self.index["fid"]
+
+    @property
+    def sets(self) -> np.ndarray:
+        "Set number of every record, in file order"
+        return self.index["sets"]
+
+    def _read_header(self) -> dict:
+        "FractureCollection header arguments from the indexed header sections"
+        header = {}
+        for name, (start, stop) in zip(
+            self.index["section_names"], self.index["section_bounds"]
+        ):
+            if name == "FORMAT":
+                body = read_keywords(self._buf[start:stop])
+                header["format"] = clean_dict_values(body)
+            elif name == "PROPERTIES":
+                header["prop_dict"] = make_properties_dict(
+                    read_keywords(self._buf[start:stop])
+                )
+            elif name == "SETS":
+                header["set_dict"] = clean_dict_values(
+                    read_keywords(self._buf[start:stop])
+                )
+        return header
+
+    def read_records(self, rows) -> FractureCollection:
+        """Decode index rows into a collection, keeping their order within
+        each fracture section
+
+        Args:
+            rows: positions in the index
+
+        Returns:
+            FractureCollection: selected fractures with the file headers
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        fields = _empty_fracture_fields(len(self.header.get("prop_dict", {})))
+        for code, section in enumerate(_FRACTURE_SECTIONS):
+            sel = rows[self.index["section"][rows] == code]
+            if sel.size == 0:
+                continue
+            offsets = self.index["offset"][sel].tolist()
+            lengths = self.index["length"][sel].tolist()
+            block = b"\n".join(
+                self._buf[start : start + length]
+                for start, length in zip(offsets, lengths)
+            )
+            flat = np.fromstring(block, sep=" ")
+            layout = int(self.index["layouts"][code])
+            records, _ = _read_records(flat, section, layout, block)
+            fields.update(_section_fields(records, section))
+        return FractureCollection(**fields, **self.header)
+
+    def get(self, ids) -> FractureCollection:
+        """Decode the fractures with the given ids
+
+        Args:
+            ids: fracture ids, from either fracture section
+
+        Returns:
+            FractureCollection: the fractures, in ids order within each section
+        """
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        pos = np.searchsorted(self._sorted_fid, ids)
+        if self._sorted_fid.size:
+            pos = np.minimum(pos, self._sorted_fid.size - 1)
+            found = self._sorted_fid[pos] == ids
+        else:
+            found = np.zeros(ids.size, dtype=bool)
+        if not found.all():
+            raise KeyError(f"Fracture ids not in {self.f_name}: {ids[~found][:10]}")
+        return self.read_records(self._order[pos])
+
+    def get_sets(self, sets) -> FractureCollection:
+        """Decode every fracture of the given sets
+
+        Args:
+            sets: set numbers
+
+        Returns:
+            FractureCollection: the fractures, in file order
+        """
+        return self.read_records(np.flatnonzero(np.isin(self.sets, sets)))
+
+
+def _parse_fab_cached(f_name, cache, workers: int = None) -> FractureCollection:
+    """Load a parsed .fab file from a cache, parsing and storing it on a miss.
+    Entries are keyed by the resolved file path and invalidated when the
+    size changes, or when the modification time changes and the content hash
+    no longer matches.
+    """
+    if not isinstance(cache, DiskCache):
+        cache = DiskCache(cache)
+    stamp = file_stamp(f_name)
+    key = "fab_" + hashlib.sha1(stamp["path"].encode()).hexdigest()
+
+    def validate(meta):
+        if meta.get("size") != stamp["size"]:
+            return False
+        if meta.get("mtime_ns") == stamp["mtime_ns"]:
+            return True
+        return meta.get("sha256") == hash_file(f_name)
+
+    path, meta = cache.get(key, validate)
+    if path is not None:
+        if meta["mtime_ns"] != stamp["mtime_ns"]:
+            cache.set_meta(key, dict(meta, mtime_ns=stamp["mtime_ns"]))
+        return FractureCollection.load(path)
+
+    collection = _parse_fab_bulk(f_name, workers)
+    cache.put(key, collection.save, meta=dict(stamp, sha256=hash_file(f_name)))
+    return collection
+
+
+def parse_fab_file(
+    f_name,
+    engine: str = "line",
+    as_collection: bool = False,
+    cache_dir=None,
+    workers: int = None,
+):
+    """Parse a .fab file into a dictionary of fracture information
+
+    Args:
+        f_name: .fab file path
+        engine (str, optional): "line" reads the file line by line, "bulk"
+            tokenizes each fracture section in one pass, returning numeric
+            normals and a 2D property array. Defaults to "line".
+        as_collection (bool, optional): return a columnar FractureCollection
+            instead of a dictionary. Defaults to False.
+        cache_dir (optional): directory or DiskCache to store the parsed
+            arrays in, so later calls memory map them instead of parsing.
+            Cached files are always parsed with the bulk engine.
+            Defaults to None.
+        workers (int, optional): number of processes used to parse the
+            fracture sections with the bulk engine. Defaults to None (serial).
+
+    Returns:
+        dict: format, properties, set names (set_dict), and fracture arrays
+    """
+    if cache_dir is not None:
+        collection = _parse_fab_cached(f_name, cache_dir, workers)
+        return collection if as_collection else collection.to_dict()
+    if engine == "bulk" or (workers or 0) > 1:
+        collection = _parse_fab_bulk(f_name, workers)
+        return collection if as_collection else collection.to_dict()
+    elif engine != "line":
+        raise ValueError("Unknown engine " + engine)
+
     output = {}
     with open(f_name, "r") as f:
         for line in f:
@@ -148,7 +1568,7 @@ def parse_fab_file(f_name):
                 )
             elif line.strip() == "BEGIN SETS":
                 # Read set section
-                output["sets"] = clean_dict_values(read_section(f, "SETS"))
+                output["set_dict"] = clean_dict_values(read_section(f, "SETS"))
             elif line.strip() == "BEGIN FRACTURE":
                 # Read fractures
                 (
@@ -176,4 +1596,123 @@ def parse_fab_file(f_name):
     output["property_df"] = make_properties_df(
         output["fid"], output["prop_dict"], output["properties"]
     )
+    if as_collection:
+        return FractureCollection.from_dict(output)
     return output
+
+
+def _float_format(values: np.ndarray) -> str:
+    "Integer format for whole numbers, shortest round trip format otherwise"
+    return "%d" if np.array_equal(values, np.round(values)) else "%r"
+
+
+def _format_fractures(c: FractureCollection, header_fmt: str) -> str:
+    "Format FRACTURE records, one % operation per fracture"
+    lengths = c.vertices.lengths
+    out = np.empty(lengths.size, dtype=object)
+    for n_vert in np.unique(lengths):
+        idx = np.flatnonzero(lengths == n_vert)
+        rows = np.column_stack(
+            [
+                c.fid[idx],
+                np.full(idx.size, n_vert),
+                c.sets[idx],
+                c.properties[idx],
+                c.vertices.take(idx).values.reshape(idx.size, -1),
+                c.normals[idx],
+            ]
+        )
+        fmt = header_fmt
+        for k in range(n_vert):
+            fmt += "\n   " + str(k + 1) + " %r %r %r"
+        fmt += "\n   %d %r %r %r\n"
+        out[idx] = [fmt % tuple(row) for row in rows.tolist()]
+    return "".join(out)
+
+
+def _format_tesselated_fractures(c: FractureCollection, header_fmt: str) -> str:
+    "Format TESSFRACTURE records, one % operation per fracture"
+    n_nodes = c.t_nodes.lengths
+    n_faces = c.t_faces.lengths
+    n_props = c.t_properties.values.shape[1]
+    key = n_nodes * (n_faces.max(initial=0) + 1) + n_faces
+    out = np.empty(key.size, dtype=object)
+    for k in np.unique(key):
+        idx = np.flatnonzero(key == k)
+        n_node, n_face = n_nodes[idx[0]], n_faces[idx[0]]
+        faces = np.column_stack(
+            [c.t_faces.take(idx).values, c.t_properties.take(idx).values]
+        )
+        rows = np.column_stack(
+            [
+                c.t_fid[idx],
+                np.full(idx.size, n_node),
+                np.full(idx.size, n_face),
+                c.t_sets[idx],
+                c.t_nodes.take(idx).values.reshape(idx.size, -1),
+                faces.reshape(idx.size, -1),
+            ]
+        )
+        fmt = header_fmt
+        for j in range(n_node):
+            fmt += "\n  " + str(j + 1) + " %r %r %r"
+        fmt += ("\n  %d %d %d %d %d" + " %r" * n_props) * n_face + "\n"
+        out[idx] = [fmt % tuple(row) for row in rows.tolist()]
+    return "".join(out)
+
+
+def write_fab_file(collection, f_name, chunk_size: int = 100_000) -> None:
+    """Write fractures to a .fab file that FracMan can import, e.g. after
+    filtering or changing properties of a parsed file.
+
+    Records are formatted with one prebuilt format string per record layout
+    and written in chunks, so parse -> write -> parse reproduces the arrays.
+
+    Args:
+        collection: FractureCollection or parse_fab_file dictionary
+        f_name: output .fab file path
+        chunk_size (int, optional): fractures formatted per write.
+            Defaults to 100,000.
+    """
+    if isinstance(collection, dict):
+        collection = FractureCollection.from_dict(collection)
+    c = collection
+
+    # keep the counts in the format section consistent with the fractures
+    counts = {
+        "No_Fractures": len(c.fid),
+        "No_TessFractures": len(c.t_fid),
+        "No_Nodes": len(c.vertices.values) + len(c.t_nodes.values),
+        "No_Properties": len(c.prop_dict),
+    }
+    fmt = {k: counts.get(k, v) for k, v in c.format.items()}
+
+    with open(f_name, "w") as f:
+        f.write("BEGIN FORMAT\n")
+        f.writelines("    %s = %s\n" % item for item in fmt.items())
+        f.write("END FORMAT\n\n")
+
+        f.write("BEGIN PROPERTIES\n")
+        f.writelines('    %s = (Real*4) "%s"\n' % item for item in c.prop_dict.items())
+        f.write("END PROPERTIES\n\n")
+
+        f.write("BEGIN SETS\n")
+        f.writelines('    %s = "%s"\n' % item for item in c.set_dict.items())
+        f.write("END SETS\n\n")
+
+        if len(c.fid):
+            header_fmt = "%d %d " + _float_format(c.sets)
+            header_fmt += " %r" * c.properties.shape[1]
+            f.write("BEGIN FRACTURE\n")
+            for start in range(0, len(c.fid), chunk_size):
+                chunk = c.select(slice(start, start + chunk_size), slice(0, 0))
+                f.write(_format_fractures(chunk, header_fmt))
+            f.write("END FRACTURE\n\n")
+
+        if len(c.t_fid):
+            header_fmt = "%d %d %d " + _float_format(c.t_sets)
+            f.write("BEGIN TESSFRACTURE\n")
+            for start in range(0, len(c.t_fid), chunk_size):
+                chunk = c.select(slice(0, 0), slice(start, start + chunk_size))
+                f.write(_format_tesselated_fractures(chunk, header_fmt))
+            f.write("END TESSFRACTURE\n")
@@ -1,10 +1,18 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
 import pandas as pd
 import numpy as np
+import geopandas as gpd
+import shapely
 from shapely.geometry import LineString
 from sklearn.linear_model import LinearRegression
 from .data import clean_columns
+from .fab import FractureCollection, RaggedArray
+from .readers import read_fracman_table
 from pathlib import Path
 
+
 # Module for geospatial analysis of fractures
 def flatten_frac(vertices: np.ndarray, z_val: float = None) -> LineString:
     """Take the vertices of a single fracture and flatten it to
@@ -56,44 +64,574 @@ def get_mid_z(vertices: np.array) -> float:
     return vertices[2, :].mean()
 
 
-def get_fracture_set_stats(fpath: Path, set_name: str, set_alias: str) -> pd.DataFrame:
-    """Parse a connection export from FracMan to get the Fracture set statistics
+def _segment_reduce(
+    ufunc: np.ufunc, values: np.ndarray, offsets: np.ndarray, empty: float = 0.0
+) -> np.ndarray:
+    """Reduce the rows of every fracture in a flat (CSR) array with a ufunc
+
+    Args:
+        ufunc (np.ufunc): reduction, e.g. np.add or np.minimum
+        values (np.ndarray): flat values (n_items x n_cols)
+        offsets (np.ndarray): item offsets per fracture (n + 1)
+        empty (float, optional): result for fractures without rows.
+            Defaults to 0.
+
+    Returns:
+        np.ndarray: reduced values (n x n_cols)
+    """
+    lengths = np.diff(offsets)
+    out = np.full((lengths.size,) + values.shape[1:], empty, dtype=float)
+    full = lengths > 0
+    if values.shape[0]:
+        out[full] = ufunc.reduceat(values, offsets[:-1][full], axis=0)
+    return out
+
+
+def _segment_sum(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    "Sum the rows of every fracture in a flat (CSR) array"
+    return _segment_reduce(np.add, values, offsets)
+
+
+def _next_vertex(offsets: np.ndarray) -> np.ndarray:
+    "Row of the next vertex around each polygon in a flat (CSR) array"
+    nxt = np.arange(1, offsets[-1] + 1)
+    full = offsets[1:] > offsets[:-1]
+    nxt[offsets[1:][full] - 1] = offsets[:-1][full]
+    return nxt
+
+
+def _fan_triangles(vertices: RaggedArray) -> tuple:
+    """Fan of triangles from the vertex mean of every polygon, shared by the
+    area vector and centroid calculations
+
+    Args:
+        vertices (RaggedArray): polygon vertices in order (n_vert x 3)
+
+    Returns:
+        tuple: vertex means (n x 3), vertices relative to their mean and the
+        following vertex (n_vert x 3 each), and twice the triangle area
+        vectors (n_vert x 3)
+    """
+    counts = np.maximum(vertices.lengths, 1)[:, None]
+    means = _segment_sum(vertices.values, vertices.offsets) / counts
+    centred = vertices.values - means[vertices.owner]
+    following = centred[_next_vertex(vertices.offsets)]
+    return means, centred, following, np.cross(centred, following)
+
+
+def polygon_area_vectors(vertices: RaggedArray) -> np.ndarray:
+    """Area vector of every planar polygon (Newell's method): the normal,
+    oriented by the vertex order, scaled by the polygon area
+
+    Args:
+        vertices (RaggedArray): polygon vertices in order (n_vert x 3)
+
+    Returns:
+        np.ndarray: area vectors (n x 3)
+    """
+    cross = _fan_triangles(vertices)[3]
+    return _segment_sum(cross, vertices.offsets) / 2
+
+
+def fit_planes(vertices: RaggedArray) -> tuple:
+    """Fit a plane through the vertices of every fracture at once, using the
+    smallest eigenvector of each vertex covariance matrix as the normal.
+    Unlike a z = f(x, y) regression this is valid for vertical fractures.
+
+    Args:
+        vertices (RaggedArray): fracture vertices (n_vert x 3)
+
+    Returns:
+        tuple: centroids (n x 3) and unit normals (n x 3)
+    """
+    counts = np.maximum(vertices.lengths, 1)[:, None]
+    centroids = _segment_sum(vertices.values, vertices.offsets) / counts
+    centred = vertices.values - centroids[vertices.owner]
+    outer = centred[:, :, None] * centred[:, None, :]
+    cov = _segment_sum(outer.reshape(-1, 9), vertices.offsets).reshape(-1, 3, 3)
+    _, vectors = np.linalg.eigh(cov)
+    return centroids, vectors[:, :, 0]
+
+
+def tess_face_geometry(collection: FractureCollection) -> tuple:
+    """Area and centroid of every triangular TESSFRACTURE face
+
+    Args:
+        collection (FractureCollection): parsed fractures
+
+    Returns:
+        tuple: face areas (n_face) and face centroids (n_face x 3), in the
+        row order of collection.t_faces
+    """
+    nodes = collection.tess_triangles()
+    a, b, c = (collection.t_nodes.values[nodes[:, i]] for i in range(3))
+    areas = np.linalg.norm(np.cross(b - a, c - a), axis=1) / 2
+    return areas, (a + b + c) / 3
+
+
+def tess_property_names(collection: FractureCollection) -> list:
+    "Names of the face property columns, numbered if the header does not match"
+    names = list(collection.prop_dict.values())
+    n_props = collection.t_properties.values.shape[1]
+    if len(names) != n_props:
+        names = [f"Prop{i + 1}" for i in range(n_props)]
+    return names
+
+
+def tess_fracture_summary(collection: FractureCollection) -> pd.DataFrame:
+    """Summarise the faces of every tessellated fracture with segment
+    reductions over the flat face arrays: total area, area weighted
+    centroid, and the area weighted mean, min and max of each face property
+
+    Args:
+        collection (FractureCollection): parsed fractures
+
+    Returns:
+        pd.DataFrame: set, area, x, y, z, and <property>_mean, _min and _max
+        columns, indexed by t_fid. Means are NaN for fractures without area,
+        min and max for fractures without faces.
+    """
+    areas, centroids = tess_face_geometry(collection)
+    offsets = collection.t_faces.offsets
+    props = collection.t_properties.values
+    names = tess_property_names(collection)
+
+    weighted = areas[:, None] * np.column_stack([centroids, props])
+    sums = _segment_sum(np.column_stack([areas, weighted]), offsets)
+    area = sums[:, 0]
+    means = sums[:, 1:] / np.where(area > 0, area, np.nan)[:, None]
+    p_min = _segment_reduce(np.minimum, props, offsets, np.nan)
+    p_max = _segment_reduce(np.maximum, props, offsets, np.nan)
+
+    columns = {"set": collection.t_sets, "area": area}
+    columns.update(zip(["x", "y", "z"], means[:, :3].T))
+    for i, name in enumerate(names):
+        columns[f"{name}_mean"] = means[:, 3 + i]
+        columns[f"{name}_min"] = p_min[:, i]
+        columns[f"{name}_max"] = p_max[:, i]
+    return pd.DataFrame(columns, index=pd.Index(collection.t_fid, name="t_fid"))
+
+
+def polygon_geometry(vertices: RaggedArray) -> tuple:
+    """Area vector and centroid of every planar polygon in one pass. The
+    centroid is the area weighted centroid of the fan of triangles from the
+    vertex mean, which is the vertex mean for polygons without area.
+
+    Args:
+        vertices (RaggedArray): polygon vertices in order (n_vert x 3)
+
+    Returns:
+        tuple: area vectors (n x 3) and centroids (n x 3)
+    """
+    means, centred, following, cross = _fan_triangles(vertices)
+    area_vectors = _segment_sum(cross, vertices.offsets) / 2
+
+    norm = np.linalg.norm(area_vectors, axis=1)
+    unit = area_vectors / np.where(norm > 0, norm, 1.0)[:, None]
+    tri_areas = np.einsum("ij,ij->i", cross, unit[vertices.owner]) / 2
+    moments = _segment_sum(
+        tri_areas[:, None] * (centred + following) / 3, vertices.offsets
+    )
+    centroids = means + moments / np.where(norm > 0, norm, np.inf)[:, None]
+    return area_vectors, centroids
+
+
+def plane_orientations(normals: np.ndarray) -> tuple:
+    """Strike, dip and dip direction of planes from their normals, with x
+    east, y north and strike following the right hand rule
+
+    Args:
+        normals (np.ndarray): plane normals of any length and sign (n x 3)
+
+    Returns:
+        tuple: strike, dip and dip direction in degrees, NaN for zero normals
+    """
+    norm = np.linalg.norm(normals, axis=1)
+    unit = normals / np.where(norm > 0, norm, np.nan)[:, None]
+    # the upward normal points horizontally along the dip direction
+    unit = np.where(unit[:, 2:3] < 0, -unit, unit)
+    dip = np.degrees(np.arccos(np.clip(unit[:, 2], -1.0, 1.0)))
+    dip_direction = np.degrees(np.arctan2(unit[:, 0], unit[:, 1])) % 360
+    strike = (dip_direction - 90) % 360
+    return strike, dip, dip_direction
+
+
+def fracture_attributes(
+    collection: FractureCollection, aperture: str = "Aperture"
+) -> pd.DataFrame:
+    """Geometric attributes of every fracture at once: area, centroid,
+    strike, dip, dip direction, equivalent radius and, when aperture is one
+    of the properties, volume. Polygonal fractures use the file normals
+    (falling back to the polygon normal when zero), tessellated fractures
+    the summed areas of their faces and a plane fitted through their nodes.
+
+    Args:
+        collection (FractureCollection): parsed fractures
+        aperture (str, optional): name of the aperture property.
+            Defaults to "Aperture".
+
+    Returns:
+        pd.DataFrame: set, area, x, y, z, strike, dip, dip_direction, radius
+        and volume, indexed by fid with tessellated fractures last
+    """
+    area_vectors, centroids = polygon_geometry(collection.vertices)
+    normals = np.asarray(collection.normals, dtype=float)[:, 1:4]
+    missing = ~normals.any(axis=1)
+    normals[missing] = area_vectors[missing]
+    areas = np.linalg.norm(area_vectors, axis=1)
+
+    t_areas, t_centroids = tess_face_geometry(collection)
+    t_offsets = collection.t_faces.offsets
+    t_sums = _segment_sum(
+        np.column_stack([t_areas, t_areas[:, None] * t_centroids]), t_offsets
+    )
+    t_area = t_sums[:, 0]
+    t_centroid = t_sums[:, 1:] / np.where(t_area > 0, t_area, np.nan)[:, None]
+    t_normals = fit_planes(collection.t_nodes)[1]
+
+    area = np.concatenate([areas, t_area])
+    strike, dip, dip_direction = plane_orientations(np.vstack([normals, t_normals]))
+    columns = {
+        "set": np.concatenate([collection.sets, collection.t_sets]),
+        "area": area,
+    }
+    columns.update(zip(["x", "y", "z"], np.vstack([centroids, t_centroid]).T))
+    columns.update(
+        strike=strike,
+        dip=dip,
+        dip_direction=dip_direction,
+        radius=np.sqrt(area / np.pi),
+    )
+
+    names = list(collection.prop_dict.values())
+    if aperture in names:
+        col = names.index(aperture)
+        width = np.asarray(collection.properties, dtype=float)[:, col]
+        t_names = tess_property_names(collection)
+        if aperture in t_names:
+            t_width = collection.t_properties.values[:, t_names.index(aperture)]
+            t_volume = _segment_sum(t_areas * t_width, t_offsets)
+        else:
+            t_volume = np.full(collection.t_fid.size, np.nan)
+        columns["volume"] = np.concatenate([areas * width, t_volume])
+
+    fid = np.concatenate([collection.fid, collection.t_fid])
+    return pd.DataFrame(columns, index=pd.Index(fid, name="fid"))
+
+
+def flatten_fracs(
+    collection: FractureCollection, z_val: float = None, tol: float = 1e-9
+) -> gpd.GeoDataFrame:
+    """Flatten every fracture to a 2D trace at a z value in one batch,
+    the vectorized version of flatten_frac. Tessellated fractures are
+    flattened through their nodes and follow the polygonal fractures.
+
+    Each trace keeps one point per vertex: x is kept and y solved on the
+    plane (as in flatten_frac), or y is kept and x solved when the fracture
+    strikes closer to north-south, so vertical fractures are handled.
+
+    Args:
+        collection (FractureCollection): parsed fractures
+        z_val (float, optional): Z value to flatten to. Defaults to None,
+            the mid z of each fracture.
+        tol (float, optional): fractures with a horizontal normal component
+            below this are treated as flat and get no trace. Defaults to 1e-9.
+
+    Returns:
+        gpd.GeoDataFrame: mid_z and the flattened trace, indexed by fid.
+        Flat fractures, and fractures not spanning z_val, have no geometry.
+    """
+    vertices = RaggedArray.concat([collection.vertices, collection.t_nodes])
+    fid = np.concatenate([collection.fid, collection.t_fid])
+    centroids, normals = fit_planes(vertices)
+    mid_z = centroids[:, 2]
+
+    owner = vertices.owner
+    x, y, z = vertices.values.T
+    c = centroids[owner]
+    n = normals[owner]
+    z0 = mid_z[owner] if z_val is None else np.full(x.size, z_val, dtype=float)
+
+    # solve for the coordinate with the largest normal component
+    along_x = np.abs(n[:, 1]) >= np.abs(n[:, 0])
+    denom = np.where(along_x, n[:, 1], n[:, 0])
+    safe = np.where(np.abs(denom) > tol, denom, 1.0)
+    dz = n[:, 2] * (z0 - c[:, 2])
+    trace_y = c[:, 1] - (n[:, 0] * (x - c[:, 0]) + dz) / safe
+    trace_x = c[:, 0] - (n[:, 1] * (y - c[:, 1]) + dz) / safe
+    coords = np.column_stack(
+        [np.where(along_x, x, trace_x), np.where(along_x, trace_y, y)]
+    )
+
+    valid = np.ones(fid.size, dtype=bool)
+    valid[owner[np.abs(denom) <= tol]] = False
+    if z_val is not None:
+        z_min = _segment_reduce(np.minimum, z, vertices.offsets, np.inf)
+        z_max = _segment_reduce(np.maximum, z, vertices.offsets, -np.inf)
+        valid &= (z_min < z_val) & (z_val < z_max)
+
+    lines = np.full(fid.size, None, dtype=object)
+    keep = valid[owner]
+    if keep.any():
+        # shapely needs consecutive indices, so renumber the kept fractures
+        kept, indices = np.unique(owner[keep], return_inverse=True)
+        lines[kept] = shapely.linestrings(coords[keep], indices=indices)
+    return gpd.GeoDataFrame(
+        {"mid_z": mid_z},
+        geometry=lines,
+        index=pd.Index(fid, name="fid"),
+    )
+
+
+class FractureIndex:
+    """Spatial index over fracture polygons for batched proximity queries
+    against stages and well paths. Each fracture is stored as its plan view
+    footprint (convex hull of the vertices) in a shapely STRtree, with its
+    z range checked after the 2D query as a broad phase. Pairs with 3D
+    lines are then kept only if the exact distance from the line segment
+    to a fracture polygon is within the search distance.
+    """
+
+    def __init__(self, collection: FractureCollection) -> None:
+        vertices = RaggedArray.concat([collection.vertices, collection.t_nodes])
+        self.fid = np.concatenate([collection.fid, collection.t_fid])
+        owner = vertices.owner
+        self.footprints = np.full(self.fid.size, None, dtype=object)
+        if owner.size:
+            points = shapely.multipoints(vertices.values[:, :2], indices=owner)
+            self.footprints[np.unique(owner)] = shapely.convex_hull(points)
+        z = vertices.values[:, 2]
+        self.z_min = _segment_reduce(np.minimum, z, vertices.offsets, np.inf)
+        self.z_max = _segment_reduce(np.maximum, z, vertices.offsets, -np.inf)
+        self.tree = shapely.STRtree(self.footprints)
+
+        # polygons (tessellated fractures as triangles) for the narrow phase,
+        # imported here as the connectivity module builds on this one
+        from .connectivity import polygon_planes
+
+        self.polygons, owner = collection.polygons()
+        self.poly_offsets = np.searchsorted(owner, np.arange(self.fid.size + 1))
+        self.normals, self.plane_d = polygon_planes(self.polygons)
+
+    def query_lines(self, lines, distance: float = 0.0) -> pd.DataFrame:
+        """Find the fractures within a distance of every line at once.
+        Lines are split into segments. 3D segments are tested exactly against
+        the fracture polygons, so dipping fractures only match where the path
+        reaches them, while 2D lines are tested against the footprints.
+
+        Args:
+            lines: array-like of shapely LineStrings, 2D or 3D
+            distance (float, optional): search distance. Defaults to 0,
+                fractures intersecting the line.
+
+        Returns:
+            pd.DataFrame: line (position in lines) and fid of each hit
+        """
+        lines = np.asarray(lines, dtype=object)
+        coords, line_no = shapely.get_coordinates(
+            lines, include_z=True, return_index=True
+        )
+        # segments between consecutive vertices of the same line
+        start = np.flatnonzero(line_no[:-1] == line_no[1:])
+        segments = shapely.linestrings(
+            np.stack([coords[start, :2], coords[start + 1, :2]], axis=1)
+        )
+        seg_z = np.sort(np.column_stack([coords[start, 2], coords[start + 1, 2]]))
+
+        # broad phase on bounding boxes, then the z range, then exact 2D
+        bounds = shapely.bounds(segments) + np.array([-1, -1, 1, 1]) * distance
+        seg, frac = self.tree.query(shapely.box(*bounds.T))
+        overlap = (seg_z[seg, 0] <= self.z_max[frac] + distance) & (
+            seg_z[seg, 1] >= self.z_min[frac] - distance
+        )
+        # 2D lines have nan z and skip the vertical check
+        flat = np.isnan(seg_z[seg]).any(axis=1)
+        overlap |= flat
+        seg, frac, flat = seg[overlap], frac[overlap], flat[overlap]
+        if distance > 0:
+            keep = shapely.dwithin(segments[seg], self.footprints[frac], distance)
+        else:
+            keep = shapely.intersects(segments[seg], self.footprints[frac])
+        solid = keep & ~flat
+        keep[solid] = self._within(
+            coords[start[seg[solid]]],
+            coords[start[seg[solid]] + 1],
+            frac[solid],
+            distance,
+        )
+        hits = pd.DataFrame(
+            {"line": line_no[start][seg[keep]], "fid": self.fid[frac[keep]]}
+        )
+        return hits.drop_duplicates().sort_values(["line", "fid"], ignore_index=True)
+
+    def _within(self, p0, p1, frac, distance: float, tol: float = 1e-6):
+        """Exact narrow phase: whether each 3D segment comes within distance
+        of any polygon of its paired fracture
+        """
+        from .connectivity import segment_polygon_distances
+
+        lengths = self.poly_offsets[frac + 1] - self.poly_offsets[frac]
+        pair = np.repeat(np.arange(frac.size), lengths)
+        local = np.arange(lengths.sum()) - np.repeat(
+            np.cumsum(lengths) - lengths, lengths
+        )
+        poly = self.poly_offsets[frac][pair] + local
+        dist = segment_polygon_distances(
+            self.polygons, self.normals, self.plane_d, poly, p0[pair], p1[pair], tol
+        )
+        nearest = np.full(frac.size, np.inf)
+        np.minimum.at(nearest, pair, dist)
+        return nearest <= distance + tol
+
+    def query_stages(self, stage_gdf: pd.DataFrame, distance: float) -> pd.DataFrame:
+        """All fractures within a distance of every stage segment, using the
+        top and bottom stage coordinates from stage_locs_to_gdf in 3D
+
+        Args:
+            stage_gdf (pd.DataFrame): stages with well, stage, and top/bottom
+                x, y and z columns
+            distance (float): search distance
+
+        Returns:
+            pd.DataFrame: well, stage and fid of each stage-fracture pair
+        """
+        coords = np.stack(
+            [
+                stage_gdf[["x_bottom_m", "y_bottom_m", "z_bottom_m"]].to_numpy(float),
+                stage_gdf[["x_top_m", "y_top_m", "z_top_m"]].to_numpy(float),
+            ],
+            axis=1,
+        )
+        hits = self.query_lines(shapely.linestrings(coords), distance)
+        stages = stage_gdf[["well", "stage"]].iloc[hits["line"]].reset_index(drop=True)
+        return stages.assign(fid=hits["fid"].to_numpy())
+
+    def query_wells(self, well_lines: gpd.GeoDataFrame, distance: float = 0.0):
+        """All fractures intersecting (or within a distance of) each well path
+
+        Args:
+            well_lines (gpd.GeoDataFrame): well paths indexed by well, as
+                from well_surveys_to_linestrings
+            distance (float, optional): search distance. Defaults to 0.
+
+        Returns:
+            pd.DataFrame: well and fid of each well-fracture pair
+        """
+        hits = self.query_lines(well_lines.geometry.to_numpy(), distance)
+        wells = well_lines.index.to_numpy()[hits["line"]]
+        return pd.DataFrame({"well": wells, "fid": hits["fid"].to_numpy()})
+
+
+CONNECTION_COLUMNS = ["object", "well", "stage_no", "fractureset", "count", "ids"]
+
+
+def read_connections(fpath: Path, delimiter: str = "whitespace") -> pd.DataFrame:
+    """Read a *_Connections.txt export from FracMan, with the object and
+    fracture set names as categoricals
 
     Args:
         fpath (Path): file path
-        set_name (str): name of fracture set to summarize
+        delimiter (str, optional): "whitespace", or "multi" when set names
+            hold single spaces, as in read_fracman_table.
+            Defaults to "whitespace".
 
     Returns:
-        pd.DataFrame: Dataframe with statistics
+        pd.DataFrame: one row per connected fracture, with clean column names
     """
-    conn = pd.read_csv(fpath, delim_whitespace=True).rename(
+    conn = read_fracman_table(fpath, delimiter=delimiter).rename(
         columns={"Set_Name": "FractureSet"}
     )
     conn.columns = clean_columns(conn.columns)
+    return conn.astype({"object": "category", "fractureset": "category"})
 
-    # get set ids
-    set_ids = (
-        conn.query("fractureset == @set_name").groupby("object")["fracid"].apply(list)
-    )
-    set_ids.name = set_alias + "_ids"
 
-    # get set counts
-    set_ct = conn.query("fractureset == @set_name").groupby("object").count().iloc[:, 0]
-    set_ct.name = set_alias + "_count"
+def connection_set_stats(conn: pd.DataFrame, sets: list = None) -> pd.DataFrame:
+    """Count and list the connected fractures of every fracture set for each
+    object (stage) in one grouped pass
+
+    Args:
+        conn (pd.DataFrame): connections from read_connections
+        sets (list, optional): fracture set names to keep. Defaults to None (all).
 
-    # get stage counts
-    stages = (
-        conn.groupby("object")
-        .count()
+    Returns:
+        pd.DataFrame: object, well, stage_no, fractureset, count and ids, one
+        row per object and set with connections
+    """
+    if sets is not None:
+        conn = conn[conn["fractureset"].isin(sets)]
+    stats = (
+        conn.groupby(["object", "fractureset"], observed=True)["fracid"]
+        .agg(count="size", ids=list)
         .reset_index()
-        .rename(columns={"FractureSet": "interactions"})
-    )
-    stages["stage_no"] = stages.object.str.split("_").str[-1]
-    stages["well"] = stages.object.str.split("_").str[-3]
-    stages = (
-        stages[["stage_no", "well", "object"]]
-        .merge(set_ids, left_on="object", right_index=True)
-        .merge(set_ct, left_on="object", right_index=True)
     )
+    # object names end in <well>_Stage_<stage_no>
+    parts = stats["object"].cat.categories.to_series().str.split("_")
+    stats["well"] = stats["object"].map(parts.str[-3])
+    stats["stage_no"] = stats["object"].map(parts.str[-1])
+    return stats[CONNECTION_COLUMNS]
+
+
+def _file_set_stats(fpath: Path, sets: list, delimiter: str) -> pd.DataFrame:
+    "Process pool worker summarising one connection file"
+    stats = connection_set_stats(read_connections(fpath, delimiter), sets)
+    stats.insert(0, "file", str(fpath))
+    return stats
+
 
-    return stages
+def connection_stats_dir(
+    directory: Path,
+    sets: list = None,
+    pattern: str = "*_Connections.txt",
+    workers: int = None,
+    delimiter: str = "whitespace",
+) -> pd.DataFrame:
+    """Summarise every connection export under a directory into one table,
+    reading the files in parallel
+
+    Args:
+        directory (Path): directory searched recursively
+        sets (list, optional): fracture set names to keep. Defaults to None (all).
+        pattern (str, optional): file name pattern.
+            Defaults to "*_Connections.txt".
+        workers (int, optional): number of processes. Defaults to None (serial).
+        delimiter (str, optional): as in read_connections.
+            Defaults to "whitespace".
+
+    Returns:
+        pd.DataFrame: file followed by the connection_set_stats columns, with
+        file, object, well and fractureset as categoricals
+    """
+    files = sorted(Path(directory).rglob(pattern))
+    args = (files, repeat(sets), repeat(delimiter))
+    if workers is not None and workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_file_set_stats, *args))
+    else:
+        parts = list(map(_file_set_stats, *args))
+    if not parts:
+        return pd.DataFrame(columns=["file"] + CONNECTION_COLUMNS)
+    stats = pd.concat(parts, ignore_index=True)
+    categorical = ["file", "object", "well", "fractureset"]
+    return stats.astype({col: "category" for col in categorical})
+
+
+def get_fracture_set_stats(fpath: Path, set_name: str, set_alias: str) -> pd.DataFrame:
+    """Parse a connection export from FracMan to get the Fracture set statistics
+
+    Args:
+        fpath (Path): file path
+        set_name (str): name of fracture set to summarize
+        set_alias (str): prefix of the ids and count columns
+
+    Returns:
+        pd.DataFrame: Dataframe with statistics
+    """
+    stats = connection_set_stats(read_connections(fpath), [set_name])
+    # rows keep the position of their object among all objects in the file
+    stats.index = stats["object"].cat.codes.to_numpy(np.int64)
+    stats = stats.rename(
+        columns={"ids": set_alias + "_ids", "count": set_alias + "_count"}
+    ).astype({"object": str, "well": object, "stage_no": object})
+    return stats[
+        ["stage_no", "well", "object", set_alias + "_ids", set_alias + "_count"]
+    ]
@@ -0,0 +1,428 @@
+"""
+Fracture intensity (P32), fracture counts and area weighted properties on a
+regular 3D grid, from fracture polygons clipped exactly to every cell or from
+points sampled over the polygons
+"""
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from .connectivity import polygon_bounds
+from .fab import FractureCollection, RaggedArray
+from .frac_geo import _fan_triangles, tess_property_names
+
+
+class VoxelGrid:
+    """Regular grid of axis aligned cells, indexed i, j, k along x, y and z"""
+
+    def __init__(self, origin, cell_size, shape) -> None:
+        self.origin = np.asarray(origin, dtype=float).reshape(3)
+        self.cell_size = np.broadcast_to(np.asarray(cell_size, dtype=float), (3,))
+        self.shape = tuple(int(n) for n in np.broadcast_to(shape, (3,)))
+
+    @classmethod
+    def from_bounds(cls, lower, upper, cell_size) -> "VoxelGrid":
+        """Grid covering a box, rounding the number of cells up
+
+        Args:
+            lower: x, y, z of the lower corner
+            upper: x, y, z of the upper corner
+            cell_size: cell edge length, or one per axis
+
+        Returns:
+            VoxelGrid: grid starting at the lower corner
+        """
+        lower = np.asarray(lower, dtype=float)
+        cell_size = np.broadcast_to(np.asarray(cell_size, dtype=float), (3,))
+        shape = np.ceil((np.asarray(upper, dtype=float) - lower) / cell_size - 1e-9)
+        return cls(lower, cell_size, np.maximum(shape, 1).astype(np.int64))
+
+    @property
+    def upper(self) -> np.ndarray:
+        "x, y, z of the upper corner"
+        return self.origin + self.cell_size * self.shape
+
+    @property
+    def cell_volume(self) -> float:
+        return float(self.cell_size.prod())
+
+    @property
+    def n_cells(self) -> int:
+        return int(np.prod(self.shape))
+
+    def centres(self) -> tuple:
+        "Cell centre coordinates along x, y and z"
+        return tuple(
+            self.origin[a] + self.cell_size[a] * (np.arange(self.shape[a]) + 0.5)
+            for a in range(3)
+        )
+
+    def cell_index(self, points: np.ndarray) -> np.ndarray:
+        """Flat (C order) cell index of points
+
+        Args:
+            points (np.ndarray): x, y, z coordinates (n x 3)
+
+        Returns:
+            np.ndarray: cell index, -1 for points outside the grid
+        """
+        ijk = np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+        inside = ((ijk >= 0) & (ijk < self.shape)).all(axis=1)
+        flat = np.full(len(points), -1, dtype=np.int64)
+        flat[inside] = np.ravel_multi_index(tuple(ijk[inside].T), self.shape)
+        return flat
+
+    def blocks(self, block_shape=64) -> list:
+        """Blocks of cells tiling the grid
+
+        Args:
+            block_shape (optional): cells per block, or one per axis.
+                Defaults to 64.
+
+        Returns:
+            list: (start, stop) cell indices of every block
+        """
+        block_shape = np.broadcast_to(block_shape, (3,))
+        ranges = [
+            [(s, min(s + int(b), n)) for s in range(0, n, int(b))]
+            for n, b in zip(self.shape, block_shape)
+        ]
+        return [tuple(zip(*r)) for r in product(*ranges)]
+
+    def sub_grid(self, start, stop) -> "VoxelGrid":
+        "Grid of the cells from start up to stop"
+        start = np.asarray(start)
+        return VoxelGrid(
+            self.origin + start * self.cell_size,
+            self.cell_size,
+            np.asarray(stop) - start,
+        )
+
+    def to_df(self, cubes: dict) -> pd.DataFrame:
+        """Flatten cubes on this grid into a table with one row per cell
+
+        Args:
+            cubes (dict): name to array shaped like the grid
+
+        Returns:
+            pd.DataFrame: x, y, z of the cell centres and one column per cube
+        """
+        x, y, z = np.meshgrid(*self.centres(), indexing="ij")
+        columns = {"x": x.ravel(), "y": y.ravel(), "z": z.ravel()}
+        columns.update((name, np.ravel(cube)) for name, cube in cubes.items())
+        return pd.DataFrame(columns)
+
+
+def _clip_half_space(pts, count, axis: int, value, sign: float) -> tuple:
+    """Clip padded polygons to the half space sign * (coordinate - value) >= 0
+    with one Sutherland-Hodgman step for all polygons at once
+
+    Args:
+        pts (np.ndarray): polygon vertices padded to a common length (m x k x 3)
+        count (np.ndarray): number of valid vertices of each polygon
+        axis (int): coordinate axis of the clipping plane
+        value (np.ndarray): plane position for each polygon
+        sign (float): 1 to keep the side above the plane, -1 below
+
+    Returns:
+        tuple: clipped vertices (m x k' x 3) and their counts
+    """
+    m, k = pts.shape[:2]
+    idx = np.arange(k)
+    valid = idx < count[:, None]
+    following = np.where(idx + 1 < count[:, None], idx + 1, 0)
+    nxt = np.take_along_axis(pts, following[:, :, None], axis=1)
+    d0 = sign * (pts[:, :, axis] - value[:, None])
+    d1 = sign * (nxt[:, :, axis] - value[:, None])
+    in0, in1 = d0 >= 0, d1 >= 0
+    t = d0 / np.where(in0 != in1, d0 - d1, 1.0)
+    crossing = pts + t[:, :, None] * (nxt - pts)
+
+    # each edge emits its start if inside, then its crossing point if any
+    out = np.stack([pts, crossing], axis=2).reshape(m, 2 * k, 3)
+    keep = np.stack([valid & in0, valid & (in0 != in1)], axis=2).reshape(m, 2 * k)
+    count = keep.sum(axis=1)
+    order = np.argsort(~keep, axis=1, kind="stable")[:, : max(count.max(initial=0), 1)]
+    return np.take_along_axis(out, order[:, :, None], axis=1), count
+
+
+def _padded_areas(pts: np.ndarray, count: np.ndarray) -> np.ndarray:
+    "Area of planar padded polygons (Newell's method)"
+    valid = np.arange(pts.shape[1]) < count[:, None]
+    rel = np.where(valid[:, :, None], pts - pts[:, :1], 0.0)
+    cross = np.cross(rel, np.roll(rel, -1, axis=1)).sum(axis=1)
+    return np.linalg.norm(cross, axis=1) / 2
+
+
+def _cell_pairs(vertices: RaggedArray, grid: VoxelGrid) -> tuple:
+    """Every polygon and grid cell pair whose bounding boxes overlap
+
+    Returns:
+        tuple: polygon index and cell i, j, k (n_pairs x 3) of each pair
+    """
+    bounds = polygon_bounds(vertices)
+    lo, hi = bounds[:, :3], bounds[:, 3:]
+    first = np.floor((lo - grid.origin) / grid.cell_size).astype(np.int64)
+    last = np.floor((hi - grid.origin) / grid.cell_size).astype(np.int64)
+    first = np.maximum(first, 0)
+    last = np.minimum(last, np.array(grid.shape) - 1)
+    span = np.maximum(last - first + 1, 0)
+    counts = span.prod(axis=1)
+
+    poly = np.repeat(np.arange(len(vertices)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    span = span[poly]
+    ijk = np.column_stack(
+        [
+            local % span[:, 0],
+            local // span[:, 0] % span[:, 1],
+            local // (span[:, 0] * span[:, 1]),
+        ]
+    )
+    return poly, first[poly] + ijk
+
+
+def _clipped_areas(vertices: RaggedArray, poly, ijk, grid: VoxelGrid) -> np.ndarray:
+    "Area of each polygon inside each paired cell, by clipping to the 6 faces"
+    lengths = vertices.lengths[poly]
+    k = lengths.max(initial=1)
+    rows = vertices.offsets[poly][:, None] + np.minimum(
+        np.arange(k), lengths[:, None] - 1
+    )
+    pts, count = vertices.values[rows], lengths
+    lower = grid.origin + ijk * grid.cell_size
+    upper = lower + grid.cell_size
+    for axis in range(3):
+        pts, count = _clip_half_space(pts, count, axis, lower[:, axis], 1.0)
+        pts, count = _clip_half_space(pts, count, axis, upper[:, axis], -1.0)
+    return _padded_areas(pts, count)
+
+
+def _triangle_lattice(k: int) -> np.ndarray:
+    """Barycentric u, v of the centroids of the k * k congruent triangles a
+    triangle splits into when each edge is divided in k
+    """
+    i, j = np.meshgrid(np.arange(k), np.arange(k), indexing="ij")
+    up = i + j <= k - 1
+    down = i + j <= k - 2
+    uv = np.concatenate(
+        [
+            np.column_stack([i[up], j[up]]) + 1 / 3,
+            np.column_stack([i[down], j[down]]) + 2 / 3,
+        ]
+    )
+    return uv / k
+
+
+def _sampled_points(vertices: RaggedArray, spacing: float, max_split: int = 64):
+    """Points spread evenly over the polygons, about spacing apart
+
+    Returns:
+        tuple: polygon index, point coordinates (n x 3) and the polygon area
+        each point stands for
+    """
+    # triangles from the vertex mean to every edge
+    means, centred, following, cross = _fan_triangles(vertices)
+    poly = vertices.owner
+    a, ab, ac = means[poly], centred, following
+    areas = np.linalg.norm(cross, axis=1) / 2
+    longest = np.linalg.norm(np.stack([ab, ac, ac - ab]), axis=2).max(axis=0)
+    split = np.clip(np.ceil(longest / spacing), 1, max_split).astype(np.int64)
+
+    owners, points, weights = [], [], []
+    for k in np.unique(split):
+        tri = np.flatnonzero(split == k)
+        uv = _triangle_lattice(int(k))
+        pts = (
+            a[tri, None]
+            + uv[None, :, 0, None] * ab[tri, None]
+            + uv[None, :, 1, None] * ac[tri, None]
+        )
+        owners.append(np.repeat(poly[tri], len(uv)))
+        points.append(pts.reshape(-1, 3))
+        weights.append(np.repeat(areas[tri] / len(uv), len(uv)))
+    if not points:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 3)), np.zeros(0)
+    return np.concatenate(owners), np.concatenate(points), np.concatenate(weights)
+
+
+def _upscale_block(
+    vertices: RaggedArray,
+    owner: np.ndarray,
+    values: np.ndarray,
+    grid: VoxelGrid,
+    start: tuple,
+    stop: tuple,
+    method: str,
+    spacing: float,
+    chunk_size: int,
+) -> tuple:
+    """Fracture area, fracture count and area weighted property sums in the
+    cells of one grid block, from start up to stop
+
+    Returns:
+        tuple: area, count, property sums and the area with a value for each
+        property (n_cells x n_props each), flat in C order over the block
+    """
+    block = grid.sub_grid(start, stop)
+    n_cells = block.n_cells
+    area = np.zeros(n_cells)
+    sums = np.zeros((n_cells, values.shape[1]))
+    known = np.zeros((n_cells, values.shape[1]))
+    touched = []
+
+    def add_values(cell, poly, weights):
+        # missing values leave both the sum and its area untouched
+        for i in range(values.shape[1]):
+            valued = np.isfinite(values[poly, i])
+            weighted = np.where(valued, weights * values[poly, i], 0.0)
+            sums[:, i] += np.bincount(cell, weights=weighted, minlength=n_cells)
+            known[:, i] += np.bincount(
+                cell, weights=weights * valued, minlength=n_cells
+            )
+
+    if method == "exact":
+        poly, ijk = _cell_pairs(vertices, block)
+        for first in range(0, len(poly), chunk_size):
+            p = poly[first : first + chunk_size]
+            ijk_chunk = ijk[first : first + chunk_size]
+            pair_area = _clipped_areas(vertices, p, ijk_chunk, block)
+            hit = pair_area > 1e-12 * block.cell_size.max() ** 2
+            cell = np.ravel_multi_index(tuple(ijk_chunk[hit].T), block.shape)
+            p, pair_area = p[hit], pair_area[hit]
+            area += np.bincount(cell, weights=pair_area, minlength=n_cells)
+            add_values(cell, p, pair_area)
+            touched.append(owner[p] * n_cells + cell)
+    else:
+        # locate points on the whole grid, so that a point on a block face
+        # falls in exactly one of the blocks sharing it
+        poly, points, weights = _sampled_points(vertices, spacing)
+        cell = grid.cell_index(points)
+        ijk = np.column_stack(np.unravel_index(np.maximum(cell, 0), grid.shape))
+        inside = (cell >= 0) & ((ijk >= start) & (ijk < stop)).all(axis=1)
+        cell = np.ravel_multi_index(tuple((ijk[inside] - start).T), block.shape)
+        poly, weights = poly[inside], weights[inside]
+        area += np.bincount(cell, weights=weights, minlength=n_cells)
+        add_values(cell, poly, weights)
+        touched.append(owner[poly] * n_cells + cell)
+
+    # a fracture counts once per cell, however many of its faces reach it
+    touched = np.unique(np.concatenate(touched + [np.zeros(0, dtype=np.int64)]))
+    count = np.bincount(touched % n_cells, minlength=n_cells)
+    return area, count, sums, known
+
+
+def _polygon_values(collection: FractureCollection, properties: list) -> np.ndarray:
+    """Property values of every polygon from FractureCollection.polygons,
+    the fracture properties for polygonal fractures and the face properties
+    for the triangles of tessellated fractures
+    """
+    names = list(collection.prop_dict.values())
+    t_names = tess_property_names(collection)
+    n_frac = collection.fid.size
+    values = np.full((n_frac + len(collection.t_faces.values), len(properties)), np.nan)
+    for i, name in enumerate(properties):
+        if name not in names and name not in t_names:
+            raise KeyError("Unknown property " + name)
+        if name in names:
+            prop = np.asarray(collection.properties, dtype=float)
+            values[:n_frac, i] = prop[:, names.index(name)]
+        if name in t_names:
+            values[n_frac:, i] = collection.t_properties.values[:, t_names.index(name)]
+    return values
+
+
+def upscale_fractures(
+    collection: FractureCollection,
+    grid: VoxelGrid,
+    properties: list = None,
+    method: str = "exact",
+    spacing: float = None,
+    workers: int = None,
+    block_shape=64,
+    chunk_size: int = 100_000,
+) -> dict:
+    """P32 intensity, fracture count and area weighted mean properties of the
+    fractures in every cell of a grid. Polygonal fractures and the triangles
+    of tessellated fractures are either clipped exactly to every cell they
+    may cross, or sampled with evenly spread points that each carry a share
+    of the polygon area, which is faster for fractures much larger than the
+    cells but may miss cells a fracture only grazes.
+
+    Args:
+        collection (FractureCollection): parsed fractures
+        grid (VoxelGrid): grid cells
+        properties (list, optional): fracture properties to average in each
+            cell, weighted by fracture area. Defaults to None.
+        method (str, optional): "exact" or "sampled". Defaults to "exact".
+        spacing (float, optional): distance between sample points.
+            Defaults to None, a quarter of the smallest cell edge.
+        workers (int, optional): number of processes handling grid blocks.
+            Defaults to None (serial).
+        block_shape (optional): cells per block along each axis.
+            Defaults to 64.
+        chunk_size (int, optional): fracture and cell pairs clipped at a time.
+            Defaults to 100,000.
+
+    Returns:
+        dict: "p32" (fracture area per cell volume), "count" (fractures
+        reaching each cell) and one cube per property, averaged over the
+        fractures that have a value for it (a property only one of the
+        FRACTURE and TESSFRACTURE sections defines is missing for the other)
+        and NaN where none of them do, each shaped like the grid
+    """
+    if method not in ("exact", "sampled"):
+        raise ValueError("Unknown method " + method)
+    properties = [] if properties is None else list(properties)
+    spacing = grid.cell_size.min() / 4 if spacing is None else spacing
+    vertices, owner = collection.polygons()
+    values = _polygon_values(collection, properties)
+    bounds = polygon_bounds(vertices)
+    lo, hi = bounds[:, :3], bounds[:, 3:]
+
+    jobs = []
+    blocks = grid.blocks(block_shape)
+    for start, stop in blocks:
+        block = grid.sub_grid(start, stop)
+        near = (lo <= block.upper).all(axis=1) & (hi >= block.origin).all(axis=1)
+        idx = np.flatnonzero(near & (vertices.lengths >= 3))
+        jobs.append(
+            (
+                vertices.take(idx),
+                owner[idx],
+                values[idx],
+                grid,
+                start,
+                stop,
+                method,
+                spacing,
+                chunk_size,
+            )
+        )
+    if workers is not None and workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_upscale_block, *zip(*jobs)))
+    else:
+        results = [_upscale_block(*job) for job in jobs]
+
+    area = np.zeros(grid.shape)
+    count = np.zeros(grid.shape, dtype=np.int64)
+    sums = np.zeros(grid.shape + (len(properties),))
+    known = np.zeros(grid.shape + (len(properties),))
+    for (start, stop), (b_area, b_count, b_sums, b_known) in zip(blocks, results):
+        cells = tuple(slice(a, b) for a, b in zip(start, stop))
+        shape = tuple(b - a for a, b in zip(start, stop))
+        area[cells] = b_area.reshape(shape)
+        count[cells] = b_count.reshape(shape)
+        sums[cells] = b_sums.reshape(shape + (len(properties),))
+        known[cells] = b_known.reshape(shape + (len(properties),))
+
+    cubes = {"p32": area / grid.cell_volume, "count": count}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for i, name in enumerate(properties):
+            cubes[name] = np.where(
+                known[..., i] > 0, sums[..., i] / known[..., i], np.nan
+            )
+    return cubes
@@ -4,9 +4,46 @@ PEST: https://pesthomepage.org/
 FracMan: https://www.golder.com/fracman/
 """
 import json
+import re
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import warnings
 
+import numpy as np
+import pandas as pd
+
+# optional control data values and their defaults, line by line
+CONTROL_DEFAULTS = [
+    [('precision', 'single'), ('decimal point', 'point'), ('numcom', 1),
+     ('jacfile', 0), ('messfile', 0)],
+    [('rlambda1', 10.0), ('rlamfac', -3.0), ('phiratsuf', 0.3),
+     ('phiredlam', 0.03), ('numlam', 10)],
+    [('relparmax', 5.0), ('facparmax', 5.0), ('facorig', 1.0e-3)],
+    [('phiredswh', 0.1), ('doaui', False)],
+    [('noptmax', 5), ('phiredstp', 0.005), ('nphistp', 4), ('nphinored', 4),
+     ('relparstp', 0.005), ('nrelpar', 4)],
+    [('icov', 1), ('icor', 1), ('ieig', 1)],
+]
+
+PARAMETER_GROUP_FIELDS = [
+    ('inctyp', 'relative'), ('derinc', 0.01), ('derinclb', 0.0),
+    ('forcen', 'switch'), ('derincmul', 2.0), ('dermthd', 'parabolic'),
+]
+
+PARAMETER_DATA_FIELDS = [
+    ('partrans', 'none'), ('parchglim', 'relative'), ('parval1', None),
+    ('parlbnd', None), ('parubnd', None), ('pargp', None), ('scale', 1.0),
+    ('offset', 0.0), ('dercom', 1),
+]
+
+OBSERVATION_DATA_FIELDS = [('obsval', None), ('weight', 1.0), ('obgnme', None)]
+
+PRIOR_INFORMATION_FIELDS = [
+    ('equation', None), ('pival', None), ('weight', 1.0), ('obgnme', None),
+]
+
 class PestGenerator:
     """Class to generate a basic pest file from a config json
     Provides numerous input checks
@@ -27,11 +64,15 @@ class PestGenerator:
         assert 'parameter groups' in self.config.keys()
         assert 'parameter data' in self.config.keys()
         assert 'observation groups' in self.config.keys()
+        assert 'observation data' in self.config.keys()
         assert 'model command line' in self.config.keys()
         assert 'model input/output' in self.config.keys()
 
         # check and parse control data
         self.check_control_data()
+        self.check_parameters()
+        self.check_observations()
+        self.check_model_io()
 
     def check_control_data(self):
         "Check control data section of json"
@@ -69,17 +110,318 @@ class PestGenerator:
         self.npargp = cdata.get('parameter groups')
         assert self.npargp is not None
         assert isinstance(self.npargp, int)
-        assert self.nobs > 0
+        assert self.npargp > 0
+
+        # nprior, nobsgp: prior information and observation groups
+        self.nprior = cdata.get('priors', 0)
+        assert isinstance(self.nprior, int)
+        self.nobsgp = cdata.get('observation groups', 1)
+        assert isinstance(self.nobsgp, int)
+        assert self.nobsgp > 0
+
+        ## REMAINING LINES ##
+        # optional settings, with defaults from the PEST manual examples
+        self.control_lines = [
+            [cdata.get(key, default) for key, default in line]
+            for line in CONTROL_DEFAULTS
+        ]
+        assert self.control_lines[0][0] in ['single', 'double']
+        assert self.control_lines[0][1] in ['point', 'nopoint']
+        # DOAUI: PEST only accepts aui, auid or noaui
+        self.control_lines[3][1] = 'aui' if self.control_lines[3][1] else 'noaui'
+
+    def check_parameters(self):
+        "Check parameter groups and data, filling in default fields"
+        self.parameter_groups = {}
+        for name, group in self.config['parameter groups'].items():
+            assert len(name) <= 12, 'PEST names are limited to 12 characters'
+            assert group.get('inctyp', 'relative') in ['relative', 'absolute', 'rel_to_max']
+            self.parameter_groups[name] = [
+                group.get(key, default) for key, default in PARAMETER_GROUP_FIELDS
+            ]
+        assert len(self.parameter_groups) == self.npargp
+
+        self.parameter_data = {}
+        self.tied = {}
+        for name, par in self.config['parameter data'].items():
+            assert len(name) <= 12, 'PEST names are limited to 12 characters'
+            values = dict(PARAMETER_DATA_FIELDS)
+            values.update(par)
+            for key in ['parval1', 'parlbnd', 'parubnd', 'pargp']:
+                assert values[key] is not None, f'{name} is missing {key}'
+            assert values['partrans'] in ['none', 'log', 'fixed', 'tied']
+            assert values['parlbnd'] <= values['parval1'] <= values['parubnd']
+            assert values['pargp'] in self.parameter_groups
+            if values['partrans'] == 'tied':
+                assert values.get('partied') is not None, f'{name} is missing partied'
+                self.tied[name] = values['partied']
+            self.parameter_data[name] = [values[key] for key, _ in PARAMETER_DATA_FIELDS]
+        assert len(self.parameter_data) == self.npar
+
+        # a parameter can only be tied to an adjustable parameter
+        for name, parent in self.tied.items():
+            assert parent in self.parameter_data, f'{name} is tied to unknown {parent}'
+            assert self.parameter_data[parent][0] in ['none', 'log'], \
+                f'{name} is tied to {parent}, which is not adjustable'
+
+    def check_observations(self):
+        "Check observation groups and data"
+        self.observation_groups = list(self.config['observation groups'].keys())
+        assert len(self.observation_groups) == self.nobsgp
+
+        self.observation_data = {}
+        for name, obs in self.config['observation data'].items():
+            assert len(name) <= 20, 'PEST observation names are limited to 20 characters'
+            values = dict(OBSERVATION_DATA_FIELDS)
+            values.update(obs)
+            assert values['obsval'] is not None, f'{name} is missing obsval'
+            assert values['obgnme'] in self.observation_groups
+            self.observation_data[name] = [values[key] for key, _ in OBSERVATION_DATA_FIELDS]
+        assert len(self.observation_data) == self.nobs
+
+        # prior information, one equation per label:
+        # {"pi1": {"equation": "1.0 * log(p32_a)", "pival": -2.0,
+        #          "weight": 1.0, "obgnme": "regul"}}
+        self.prior_information = {}
+        for name, prior in self.config.get('prior information', {}).items():
+            assert len(name) <= 20, 'PEST prior information labels are limited to 20 characters'
+            values = dict(PRIOR_INFORMATION_FIELDS)
+            values.update(prior)
+            for key in ['equation', 'pival', 'obgnme']:
+                assert values[key] is not None, f'{name} is missing {key}'
+            assert values['obgnme'] in self.observation_groups
+            self.prior_information[name] = [values[key] for key, _ in PRIOR_INFORMATION_FIELDS]
+        assert len(self.prior_information) == self.nprior
+
+    def check_model_io(self):
+        "Check the model command and template / instruction file pairs"
+        self.command = self.config['model command line'].get('command')
+        assert isinstance(self.command, str)
+
+        io = self.config['model input/output']
+        self.templates = [tuple(pair) for pair in io.get('templates', [])]
+        self.instructions = [tuple(pair) for pair in io.get('instructions', [])]
+        assert len(self.templates) > 0
+        assert len(self.instructions) > 0
+        assert all(len(pair) == 2 for pair in self.templates + self.instructions)
     
     def check_pest_viability(self):
         "Some checks built off the pest manual"
         if self.npar > self.nobs:
             warnings.warn("Number of parameters exceeds observations, risk of non-unique solution")
 
+    def pst_lines(self) -> list:
+        "Lines of the .pst file"
+        lines = ['pcf', '* control data', _join([self.RSTFLE, self.PESTMODE])]
+        lines.append(_join([self.npar, self.nobs, self.npargp, self.nprior, self.nobsgp]))
+        lines.append(_join([len(self.templates), len(self.instructions)] + self.control_lines[0]))
+        lines.extend(_join(line) for line in self.control_lines[1:])
+
+        lines.append('* parameter groups')
+        lines.extend(_join([name] + vals) for name, vals in self.parameter_groups.items())
+        lines.append('* parameter data')
+        lines.extend(_join([name] + vals) for name, vals in self.parameter_data.items())
+        lines.extend(_join(pair) for pair in self.tied.items())
+        lines.append('* observation groups')
+        lines.extend(self.observation_groups)
+        lines.append('* observation data')
+        lines.extend(_join([name] + vals) for name, vals in self.observation_data.items())
+        lines.append('* model command line')
+        lines.append(self.command)
+        lines.append('* model input/output')
+        lines.extend(_join(pair) for pair in self.templates + self.instructions)
+        if self.prior_information:
+            lines.append('* prior information')
+            for name, (equation, pival, weight, obgnme) in self.prior_information.items():
+                lines.append(_join([name, equation, '=', pival, weight, obgnme]))
+        return lines
+
     def write_pst_file(self, filename='case.pst'):
         "Write out .pst file"
         with open(self.config_path.parent / filename, 'w') as f:
-            f.writelines("pcf \n")
-            f.writelines("* control data \n")
-            f.writelines(self.RSTFLE + "  " + self.PESTMODE)
+            f.write('\n'.join(self.pst_lines()) + '\n')
+
+
+def _join(values: list) -> str:
+    "Two space separated PEST record"
+    return '  '.join(str(v) for v in values)
+
+
+def read_template_names(tpl_path: Path) -> list:
+    """Parameter names in a PEST template file
+
+    Args:
+        tpl_path (Path): template file, first line 'ptf <delimiter>'
+
+    Returns:
+        list: parameter names in order of first appearance
+    """
+    with open(tpl_path, 'r') as f:
+        header = f.readline().split()
+        assert header[0].lower() == 'ptf'
+        delim = re.escape(header[1])
+        names = re.findall(delim + r'\s*([^\s' + delim + r']+)\s*' + delim, f.read())
+    return list(dict.fromkeys(name.lower() for name in names))
+
+
+def fill_template(tpl_path: Path, out_path: Path, params: dict) -> None:
+    """Write a model input file from a PEST template, each parameter marker
+    replaced by its value in the full width of the marker
+
+    Args:
+        tpl_path (Path): template file, first line 'ptf <delimiter>'
+        out_path (Path): model input file to write
+        params (dict): parameter name to value
+    """
+    params = {str(k).lower(): v for k, v in params.items()}
+    with open(tpl_path, 'r') as f:
+        header = f.readline().split()
+        assert header[0].lower() == 'ptf'
+        text = f.read()
+    delim = re.escape(header[1])
+    pattern = re.compile(delim + r'(\s*([^\s' + delim + r']+)\s*)' + delim)
+
+    def replace(match):
+        width = len(match.group(0))
+        value = params[match.group(2).lower()]
+        for precision in range(width - 1, 0, -1):
+            out = '{0:.{1}g}'.format(value, precision)
+            if len(out) <= width:
+                return out.rjust(width)
+        raise ValueError(f'{match.group(2)} does not fit in a {width} character marker')
+
+    with open(out_path, 'w') as f:
+        f.write(pattern.sub(replace, text))
+
+
+# text up to and including the next whitespace, for the w instruction
+WHITESPACE = re.compile(r'\S*\s+')
+
+
+def read_instruction_file(ins_path: Path, out_path: Path) -> dict:
+    """Read observations from a model output file with a PEST instruction
+    file. Supports line advance (l<n>), primary and secondary markers,
+    whitespace (w), non-fixed (!name!) and fixed ([name]c1:c2) observations.
+
+    Args:
+        ins_path (Path): instruction file, first line 'pif <marker>'
+        out_path (Path): model output file
+
+    Returns:
+        dict: observation name to value
+    """
+    with open(ins_path, 'r') as f:
+        header = f.readline().split()
+        assert header[0].lower() == 'pif'
+        marker = header[1]
+        instructions = [line for line in f.read().splitlines() if line.strip()]
+    with open(out_path, 'r') as f:
+        lines = f.read().splitlines()
+
+    token = re.compile(
+        re.escape(marker) + '(.*?)' + re.escape(marker)
+        + r'|\[([^\]]+)\](\d+):(\d+)|!([^!]+)!|([lL]\d+)|([wW])(?=\s|$)'
+    )
+    obs = {}
+    row, col = -1, 0
+    for instruction in instructions:
+        for match in token.finditer(instruction):
+            text, fixed, c1, c2, free, advance, space = match.groups()
+            if advance:
+                row += int(advance[1:])
+                col = 0
+            elif text is not None:
+                if match.start() == 0 and instruction.lstrip() == instruction:
+                    # primary marker, search forward from the next line
+                    row += 1
+                    while text not in lines[row]:
+                        row += 1
+                    col = lines[row].index(text) + len(text)
+                else:
+                    col = lines[row].index(text, col) + len(text)
+            elif space:
+                # move to the next whitespace, then past it
+                gap = WHITESPACE.match(lines[row], col)
+                if gap is None:
+                    raise ValueError(f'No whitespace after column {col + 1} of line {row + 1}')
+                col = gap.end()
+            elif fixed:
+                obs[fixed.lower()] = float(lines[row][int(c1) - 1:int(c2)])
+                col = int(c2)
+            elif free:
+                rest = lines[row][col:]
+                value = re.match(r'\s*([^\s,]+)', rest)
+                obs[free.lower()] = float(value.group(1))
+                col += value.end()
+    return obs
+
+
+class EnsembleRunner:
+    """Run the model for a whole parameter ensemble in parallel, each
+    realization in its own directory, and collect the observations
+    """
+
+    def __init__(self, generator: PestGenerator, model_files: list = None,
+                 workers: int = 4, workdir_root: Path = 'ensemble', timeout: float = None):
+        """
+        Args:
+            generator (PestGenerator): parsed config, giving the command and
+                template / instruction files
+            model_files (list, optional): files copied into every run
+                directory, e.g. the run script. Defaults to None.
+            workers (int, optional): model calls at once. Defaults to 4.
+            workdir_root (Path, optional): parent of the run directories.
+                Defaults to 'ensemble'.
+            timeout (float, optional): seconds per model call. Defaults to None.
+        """
+        self.generator = generator
+        self.root = generator.config_path.parent
+        self.model_files = [Path(f) for f in model_files or []]
+        self.workers = workers
+        self.workdir_root = Path(workdir_root)
+        self.timeout = timeout
+        self.obs_names = list(generator.observation_data.keys())
+
+    def _run_one(self, index: int, params: dict) -> np.ndarray:
+        "Fill templates, run the model and read the observations"
+        workdir = self.workdir_root / f'real_{index:05d}'
+        if workdir.exists():
+            shutil.rmtree(workdir)
+        workdir.mkdir(parents=True)
+        for f in self.model_files:
+            shutil.copy2(self.root / f, workdir / f.name)
+        obs = np.full(len(self.obs_names), np.nan)
+        try:
+            for tpl, model_in in self.generator.templates:
+                fill_template(self.root / tpl, workdir / model_in, params)
+            subprocess.run(self.generator.command, shell=True, cwd=workdir,
+                           timeout=self.timeout, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            values = {}
+            for ins, model_out in self.generator.instructions:
+                values.update(read_instruction_file(self.root / ins, workdir / model_out))
+        except (subprocess.SubprocessError, OSError, KeyError, ValueError, IndexError) as err:
+            warnings.warn(f'Realization {index} failed: {err}')
+            return obs
+        for i, name in enumerate(self.obs_names):
+            obs[i] = values.get(name.lower(), np.nan)
+        return obs
+
+    def run(self, ensemble: pd.DataFrame) -> pd.DataFrame:
+        """Evaluate every parameter set of an ensemble
+
+        Args:
+            ensemble (pd.DataFrame): one realization per row, one parameter
+                per column, e.g. a pyemu ParameterEnsemble
+
+        Returns:
+            pd.DataFrame: observations per realization, NaN where a
+            model call failed
+        """
+        ensemble = pd.DataFrame(ensemble)
+        rows = [row.to_dict() for _, row in ensemble.iterrows()]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            obs = list(pool.map(self._run_one, range(len(rows)), rows))
+        return pd.DataFrame(np.array(obs).reshape(len(rows), -1),
+                            index=ensemble.index, columns=self.obs_names)
 
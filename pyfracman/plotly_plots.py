@@ -151,8 +151,10 @@ def make_3d_plot(is_df, stage_locs, surveys, surfaces, plot_bounds):
             )
         )
 
-    # add surfaces for geological reference
+    # add surfaces for geological reference, with their triangles if parsed
     for surf_name in surfaces.keys():
+        triangles = surfaces[surf_name].get("triangles")
+        faces = {} if triangles is None else dict(zip("ijk", triangles.T))
         fig.add_trace(
             go.Mesh3d(
                 x=surfaces[surf_name]["df"].x.values,
@@ -161,6 +163,7 @@ def make_3d_plot(is_df, stage_locs, surveys, surfaces, plot_bounds):
                 color=surfaces[surf_name]["col"],
                 name=surf_name,
                 opacity=0.1,
+                **faces,
             )
         )
 
@@ -2,7 +2,38 @@
 Module for point pattern analysis of FracMan simulated
 microseismic or induced seismicity events
 """
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
 import pandas as pd
+from scipy.spatial import cKDTree
+from scipy.special import gamma
+
+from .readers import (
+    iter_fracman_table,
+    read_fracman_table,
+    read_header_line,
+    split_columns,
+)
+
+# the fracture and surface modules (and shapely) are only imported by the
+# functions that need them, so event statistics load without them
+if TYPE_CHECKING:
+    from .fab import FractureCollection
+
+# dtypes of the event columns FracMan writes to ORS and ASC exports, so that
+# coordinates and magnitudes stay float when a chunk holds only whole numbers
+# and well names stay text; other columns are inferred
+EVENT_DTYPES = {
+    "X": "float64",
+    "Y": "float64",
+    "Z": "float64",
+    "Magnitude": "float64",
+    "Moment": "float64",
+    "Well": "str",
+}
 
 
 def read_ors_file(filename: str) -> pd.DataFrame:
@@ -14,39 +45,170 @@ def read_ors_file(filename: str) -> pd.DataFrame:
     Returns:
         pd.DataFrame: Parsed dataframe with original column names
     """
-    with open(filename) as f:
-        cols = f.readline()
-    columns = [s.strip() for s in cols.replace("\t", " ").split(" ") if s]
-    return pd.read_csv(
-        filename,
-        skiprows=1,
-        index_col=False,
-        sep="\s{2,}",
-        names=columns,
-        engine="python",
+    columns = split_columns(read_header_line(filename))
+    return read_fracman_table(
+        filename, skiprows=1, names=columns, index_col=False, dtype=EVENT_DTYPES
     )
 
 
+def _asc_layout(filename: str) -> tuple:
+    """Column names and number of header lines of an ASC file. The third line
+    holds the number of columns, followed by one line per column name.
+
+    Returns:
+        tuple: column names and header line count
+    """
+    with open(filename) as f:
+        f.readline()
+        f.readline()
+        ncols = int(f.readline().split()[0])
+        columns = [f.readline().split()[0] for _ in range(ncols)]
+    return columns, 3 + ncols
+
+
 def read_asc_file(filename: str) -> pd.DataFrame:
     """Read an ASC file, preferred for point exports due to better precision
 
     Args:
-        filename (str): asc filename with suffix (e.g. events.ors)
+        filename (str): asc filename with suffix (e.g. events.asc)
 
     Returns:
         pd.DataFrame: Parsed dataframe with original column names
     """
-    filename = "InducedEvents_1_pt.asc"
-    with open(filename) as f:
-        lines = f.readlines()
-    ncols = int(lines[2].split()[0])
-    columns = [l.split()[0] for l in lines[3 : 3 + ncols]]
-    data = [l.split() for l in lines[3 + ncols :]]
-    return pd.DataFrame(data, columns=columns).apply(pd.to_numeric)
+    columns, skiprows = _asc_layout(filename)
+    return read_fracman_table(
+        filename,
+        skiprows=skiprows,
+        header=None,
+        names=columns,
+        delimiter="whitespace",
+        dtype=EVENT_DTYPES,
+    )
+
+
+def iter_events(filename: str, chunksize: int = 1_000_000, usecols: list = None):
+    """Stream events from an ASC or ORS file in typed chunks, so a whole
+    realization can be summarized without loading it
+
+    Args:
+        filename (str): .asc or .ors filename
+        chunksize (int, optional): events per chunk. Defaults to 1,000,000.
+        usecols (list, optional): only parse these columns. Defaults to None.
+
+    Yields:
+        pd.DataFrame: chunk of events with the original column names
+    """
+    if Path(filename).suffix.lower() == ".asc":
+        columns, skiprows = _asc_layout(filename)
+        delimiter = "whitespace"
+    else:
+        columns, skiprows = split_columns(read_header_line(filename)), 1
+        delimiter = "multi"
+    yield from iter_fracman_table(
+        filename,
+        names=columns,
+        skiprows=skiprows,
+        chunksize=chunksize,
+        delimiter=delimiter,
+        usecols=usecols,
+        index_col=False,
+        dtype=EVENT_DTYPES,
+    )
+
+
+def _add_counts(counts: pd.Series, chunk_counts: pd.Series) -> pd.Series:
+    "Accumulate the value counts of one chunk"
+    if counts is None:
+        return chunk_counts
+    return counts.add(chunk_counts, fill_value=0)
+
+
+def stage_event_counts(
+    filename: str, by="Stage", chunksize: int = 1_000_000
+) -> pd.Series:
+    """Number of events per stage, or any other grouping columns
+
+    Args:
+        filename (str): .asc or .ors filename
+        by (str or list, optional): grouping columns. Defaults to "Stage".
+        chunksize (int, optional): events per chunk. Defaults to 1,000,000.
+
+    Returns:
+        pd.Series: event count per group
+    """
+    # a single column keeps a flat index
+    by = by if isinstance(by, str) else list(by)
+    usecols = [by] if isinstance(by, str) else by
+    counts = None
+    for chunk in iter_events(filename, chunksize, usecols=usecols):
+        counts = _add_counts(counts, chunk[by].value_counts())
+    if counts is None:
+        return pd.Series(dtype=np.int64, name="count")
+    return counts.astype(np.int64).rename("count")
+
+
+def magnitude_histogram(
+    filename: str,
+    bins: np.ndarray,
+    column: str = "Magnitude",
+    chunksize: int = 1_000_000,
+) -> tuple:
+    """Histogram of event magnitudes with fixed bin edges, values outside the
+    edges are not counted
+
+    Args:
+        filename (str): .asc or .ors filename
+        bins (np.ndarray): bin edges
+        column (str, optional): magnitude column. Defaults to "Magnitude".
+        chunksize (int, optional): events per chunk. Defaults to 1,000,000.
+
+    Returns:
+        tuple: counts per bin and the bin edges
+    """
+    bins = np.asarray(bins, dtype=float)
+    counts = np.zeros(bins.size - 1, dtype=np.int64)
+    for chunk in iter_events(filename, chunksize, usecols=[column]):
+        counts += np.histogram(chunk[column].to_numpy(float), bins)[0]
+    return counts, bins
+
+
+def spatial_bin_counts(
+    filename: str,
+    cell_size: float,
+    columns: tuple = ("X", "Y"),
+    origin: tuple = None,
+    chunksize: int = 1_000_000,
+) -> pd.Series:
+    """Number of events in each cell of a regular grid, only occupied cells
+    are kept so memory scales with the occupied area
+
+    Args:
+        filename (str): .asc or .ors filename
+        cell_size (float): grid cell size
+        columns (tuple, optional): coordinate columns, two for a map grid or
+            three for a voxel grid. Defaults to ("X", "Y").
+        origin (tuple, optional): grid origin. Defaults to zeros.
+        chunksize (int, optional): events per chunk. Defaults to 1,000,000.
+
+    Returns:
+        pd.Series: event count indexed by the integer cell index per column
+    """
+    columns = list(columns)
+    origin = np.zeros(len(columns)) if origin is None else np.asarray(origin)
+    names = [f"i_{col}" for col in columns]
+    counts = None
+    for chunk in iter_events(filename, chunksize, usecols=columns):
+        cells = np.floor((chunk[columns].to_numpy(float) - origin) / cell_size)
+        cells = pd.DataFrame(cells.astype(np.int64), columns=names)
+        counts = _add_counts(counts, cells.value_counts())
+    if counts is None:
+        return pd.Series(dtype=np.int64, name="count")
+    return counts.astype(np.int64).rename("count")
 
 
 def parse_gocad_surface(filename: str) -> pd.DataFrame:
-    """Parse a gocad surface and return a dataframe of xyz vertices
+    """Parse a gocad surface and return a dataframe of xyz vertices.
+    Use surface.read_tsurf or surface.Surface for the triangles as well.
 
     Args:
         filename (str): Relative filename
@@ -54,8 +216,320 @@ def parse_gocad_surface(filename: str) -> pd.DataFrame:
     Returns:
         pd.DataFrame: Dataframe
     """
-    ts_df = pd.read_csv(filename)
-    vrtx = ts_df[ts_df.iloc[:, 0].str.contains("VRTX")]
-    surf = vrtx.iloc[:, 0].str.split(" ", expand=True).iloc[:, 2:5].astype(float)
-    surf.columns = ["x", "y", "z"]
-    return surf
+    from .surface import read_tsurf
+
+    vertices, _ = read_tsurf(filename)
+    return pd.DataFrame(vertices, columns=["x", "y", "z"])
+
+
+def _window(points: np.ndarray, bounds=None) -> tuple:
+    """Lower and upper corners and volume (area in 2D) of the observation
+    window, the bounding box of the points by default
+    """
+    if bounds is None:
+        lo, hi = points.min(axis=0), points.max(axis=0)
+    else:
+        lo, hi = np.asarray(bounds, dtype=float)
+    return lo, hi, float(np.prod(hi - lo))
+
+
+def _ball_volume(radii: np.ndarray, dim: int) -> np.ndarray:
+    "Volume of a ball (area of a disc in 2D)"
+    return np.pi ** (dim / 2) / gamma(dim / 2 + 1) * radii**dim
+
+
+def ripley_k(
+    points: np.ndarray, radii: np.ndarray, bounds=None, edge_correction: str = None
+) -> np.ndarray:
+    """Ripley's K function from KD tree pair counts, without forming all
+    pairwise distances
+
+    Args:
+        points (np.ndarray): event coordinates (n x 2 or n x 3)
+        radii (np.ndarray): distances to evaluate
+        bounds (optional): window lower and upper corners (2 x dim).
+            Defaults to the bounding box of the points.
+        edge_correction (str, optional): "border" only counts events further
+            than r from the window edge as centres. Defaults to None.
+
+    Returns:
+        np.ndarray: K(r)
+    """
+    points = np.asarray(points, dtype=float)
+    radii = np.asarray(radii, dtype=float)
+    lo, hi, volume = _window(points, bounds)
+    n = len(points)
+    tree = cKDTree(points)
+    if edge_correction is None:
+        pairs = tree.count_neighbors(tree, radii) - n
+        return volume * pairs / (n * (n - 1))
+    if edge_correction != "border":
+        raise ValueError(f"Unknown edge correction: {edge_correction}")
+
+    edge = np.minimum(points - lo, hi - points).min(axis=1)
+    k = np.full(radii.size, np.nan)
+    for i, r in enumerate(radii):
+        inner = points[edge >= r]
+        if len(inner):
+            pairs = tree.query_ball_point(inner, r, return_length=True).sum()
+            k[i] = volume * (pairs - len(inner)) / (len(inner) * (n - 1))
+    return k
+
+
+def ripley_l(
+    points: np.ndarray, radii: np.ndarray, bounds=None, edge_correction: str = None
+) -> np.ndarray:
+    """Ripley's L function, the K function scaled so L(r) = r under complete
+    spatial randomness
+
+    Args:
+        points (np.ndarray): event coordinates (n x 2 or n x 3)
+        radii (np.ndarray): distances to evaluate
+        bounds (optional): window corners. Defaults to the points' bounding box.
+        edge_correction (str, optional): as in ripley_k. Defaults to None.
+
+    Returns:
+        np.ndarray: L(r)
+    """
+    dim = np.shape(points)[1]
+    k = ripley_k(points, radii, bounds, edge_correction)
+    return (k / _ball_volume(1.0, dim)) ** (1 / dim)
+
+
+def pair_correlation(points: np.ndarray, radii: np.ndarray, bounds=None) -> tuple:
+    """Pair correlation function from pair counts in distance shells,
+    1 under complete spatial randomness
+
+    Args:
+        points (np.ndarray): event coordinates (n x 2 or n x 3)
+        radii (np.ndarray): shell edges
+        bounds (optional): window corners. Defaults to the points' bounding box.
+
+    Returns:
+        tuple: shell mid distances and g(r)
+    """
+    radii = np.asarray(radii, dtype=float)
+    dim = np.shape(points)[1]
+    k = ripley_k(points, radii, bounds)
+    shell = np.diff(_ball_volume(radii, dim))
+    return (radii[1:] + radii[:-1]) / 2, np.diff(k) / shell
+
+
+def g_function(points: np.ndarray, radii: np.ndarray, bounds=None) -> np.ndarray:
+    """Nearest neighbour distance distribution G(r) between events
+
+    Args:
+        points (np.ndarray): event coordinates (n x 2 or n x 3)
+        radii (np.ndarray): distances to evaluate
+        bounds (optional): unused, for the same signature as the other
+            functions. Defaults to None.
+
+    Returns:
+        np.ndarray: fraction of events with a neighbour within r
+    """
+    dist, _ = cKDTree(points).query(points, k=2)
+    nearest = np.sort(dist[:, 1])
+    return np.searchsorted(nearest, radii, side="right") / len(nearest)
+
+
+def f_function(
+    points: np.ndarray,
+    radii: np.ndarray,
+    bounds=None,
+    n_test: int = 10_000,
+    seed: int = None,
+) -> np.ndarray:
+    """Empty space function F(r), the distance from random locations in the
+    window to the nearest event
+
+    Args:
+        points (np.ndarray): event coordinates (n x 2 or n x 3)
+        radii (np.ndarray): distances to evaluate
+        bounds (optional): window corners. Defaults to the points' bounding box.
+        n_test (int, optional): random test locations. Defaults to 10,000.
+        seed (int, optional): random seed. Defaults to None.
+
+    Returns:
+        np.ndarray: fraction of test locations with an event within r
+    """
+    lo, hi, _ = _window(np.asarray(points, dtype=float), bounds)
+    test = np.random.default_rng(seed).uniform(lo, hi, (n_test, lo.size))
+    dist, _ = cKDTree(points).query(test)
+    return np.searchsorted(np.sort(dist), radii, side="right") / n_test
+
+
+_STATISTICS = {
+    "K": ripley_k,
+    "L": ripley_l,
+    "G": g_function,
+    "F": f_function,
+}
+
+
+def _simulate_csr(stat, n_points, bounds, radii, seeds) -> np.ndarray:
+    "Statistic of complete spatial randomness realizations, one per seed"
+    lo, hi = np.asarray(bounds, dtype=float)
+    out = []
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        points = rng.uniform(lo, hi, (n_points, lo.size))
+        if stat == "F":
+            out.append(f_function(points, radii, bounds, seed=rng))
+        else:
+            out.append(_STATISTICS[stat](points, radii, bounds))
+    return np.array(out)
+
+
+def csr_envelope(
+    n_points: int,
+    bounds,
+    radii: np.ndarray,
+    stat: str = "L",
+    n_sims: int = 99,
+    quantiles: tuple = (0.025, 0.975),
+    workers: int = None,
+    seed: int = None,
+) -> pd.DataFrame:
+    """Monte Carlo envelope of a statistic under complete spatial randomness,
+    with the simulations split across a process pool
+
+    Args:
+        n_points (int): events per simulation, usually the observed count
+        bounds: window lower and upper corners (2 x dim)
+        radii (np.ndarray): distances to evaluate
+        stat (str, optional): "K", "L", "G" or "F". Defaults to "L".
+        n_sims (int, optional): number of simulations. Defaults to 99.
+        quantiles (tuple, optional): envelope quantiles.
+            Defaults to (0.025, 0.975).
+        workers (int, optional): processes. Defaults to None (serial).
+        seed (int, optional): random seed. Defaults to None.
+
+    Returns:
+        pd.DataFrame: r, mean, lower and upper envelope of the statistic
+    """
+    if stat not in _STATISTICS:
+        raise ValueError(f"Unknown statistic: {stat}")
+    radii = np.asarray(radii, dtype=float)
+    seeds = np.random.SeedSequence(seed).spawn(n_sims)
+    if workers is None or workers <= 1:
+        sims = _simulate_csr(stat, n_points, bounds, radii, seeds)
+    else:
+        # contiguous batches keep the simulations in seed order
+        splits = np.array_split(np.arange(n_sims), workers)
+        batches = [[seeds[i] for i in split] for split in splits]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_simulate_csr, stat, n_points, bounds, radii, batch)
+                for batch in batches
+                if batch
+            ]
+            sims = np.vstack([f.result() for f in futures])
+    lower, upper = np.quantile(sims, quantiles, axis=0)
+    return pd.DataFrame(
+        {"r": radii, "mean": sims.mean(axis=0), "lower": lower, "upper": upper}
+    )
+
+
+def _scale_bins(values: np.ndarray) -> np.ndarray:
+    "Power of two bin of non negative values, relative to their maximum"
+    scale = max(values.max(initial=0.0), np.finfo(float).tiny)
+    return np.floor(np.log2(np.maximum(values / scale, 2.0**-20))).astype(np.int64)
+
+
+def _point_polygon_distances(polygons, normals, d, points, poly) -> np.ndarray:
+    """Exact distance between points and convex planar polygons, pair by pair:
+    the plane distance if the projection falls inside the polygon, otherwise
+    the distance to the nearest edge
+    """
+    from .connectivity import _edges
+
+    start, end, offsets = _edges(polygons, poly)
+    pair = np.repeat(np.arange(poly.size), np.diff(offsets))
+    n = normals[poly]
+    signed = (points * n).sum(axis=1) - d[poly]
+    projected = points - signed[:, None] * n
+
+    v0 = polygons.values[start]
+    edge = polygons.values[end] - v0
+    side = (np.cross(edge, projected[pair] - v0) * n[pair]).sum(axis=1)
+    inside = np.minimum.reduceat(side, offsets[:-1]) >= 0
+
+    rel = points[pair] - v0
+    length2 = (edge * edge).sum(axis=1)
+    t = np.clip((rel * edge).sum(axis=1) / np.where(length2 > 0, length2, 1), 0, 1)
+    edge_dist = np.linalg.norm(rel - t[:, None] * edge, axis=1)
+    edge_dist = np.minimum.reduceat(edge_dist, offsets[:-1])
+    return np.where(inside, np.abs(signed), edge_dist)
+
+
+def event_fracture_distances(
+    points: np.ndarray, collection: "FractureCollection", k: int = 8
+) -> pd.DataFrame:
+    """Distance from each event to the nearest fracture polygon. A KD tree of
+    polygon centroids gives an upper bound from the k nearest polygons, and
+    every polygon whose bounding sphere is within that bound is then checked
+    exactly, so the result is exact without testing all pairs.
+
+    Args:
+        points (np.ndarray): event coordinates (n x 3)
+        collection (FractureCollection): parsed fractures
+        k (int, optional): polygons tested in the first pass. Defaults to 8.
+
+    Returns:
+        pd.DataFrame: distance and fid of the nearest fracture per event
+    """
+    from .connectivity import polygon_planes
+
+    points = np.asarray(points, dtype=float)
+    polygons, owner = collection.polygons()
+    fid = np.concatenate([collection.fid, collection.t_fid])[owner]
+    normals, d = polygon_planes(polygons)
+    lengths = np.maximum(polygons.lengths, 1)[:, None]
+    centroids = np.add.reduceat(polygons.values, polygons.offsets[:-1]) / lengths
+    radius = np.linalg.norm(
+        polygons.values - np.repeat(centroids, polygons.lengths, axis=0), axis=1
+    )
+    radius = np.maximum.reduceat(radius, polygons.offsets[:-1])
+    tree = cKDTree(centroids)
+
+    # first pass, an upper bound from the nearest centroids
+    k = min(k, len(polygons))
+    _, cand = tree.query(points, k=k)
+    cand = cand.reshape(len(points), k)
+    dist = _point_polygon_distances(
+        polygons, normals, d, np.repeat(points, k, axis=0), cand.ravel()
+    ).reshape(len(points), k)
+    best = np.argmin(dist, axis=1)
+    upper = dist[np.arange(len(points)), best]
+    nearest = cand[np.arange(len(points)), best]
+
+    # second pass, every polygon that could be closer than the bound. Pairs
+    # are searched between groups of events and polygons of similar bound and
+    # radius, so one large fracture does not widen the search of every event
+    event_bin, poly_bin = _scale_bins(upper), _scale_bins(radius)
+    poly_groups = [np.flatnonzero(poly_bin == b) for b in np.unique(poly_bin)]
+    poly_trees = [cKDTree(centroids[group]) for group in poly_groups]
+    event, poly, dist = [np.zeros(0, np.int64)], [np.zeros(0, np.int64)], [[]]
+    for b in np.unique(event_bin):
+        group = np.flatnonzero(event_bin == b)
+        event_tree = cKDTree(points[group])
+        for poly_group, poly_tree in zip(poly_groups, poly_trees):
+            pairs = event_tree.sparse_distance_matrix(
+                poly_tree,
+                upper[group].max() + radius[poly_group].max(),
+                output_type="ndarray",
+            )
+            event.append(group[pairs["i"]])
+            poly.append(poly_group[pairs["j"]])
+            dist.append(pairs["v"])
+    event, poly = np.concatenate(event), np.concatenate(poly)
+    check = np.concatenate(dist) - radius[poly] < upper[event]
+    event, poly = event[check], poly[check]
+    exact = _point_polygon_distances(polygons, normals, d, points[event], poly)
+    closer = exact < upper[event]
+    order = np.lexsort((exact[closer], event[closer]))
+    event, poly, exact = event[closer][order], poly[closer][order], exact[closer][order]
+    first = np.unique(event, return_index=True)[1]
+    upper[event[first]] = exact[first]
+    nearest[event[first]] = poly[first]
+    return pd.DataFrame({"distance": upper, "fid": fid[nearest]})
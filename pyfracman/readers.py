@@ -0,0 +1,163 @@
+"""
+Shared reader for whitespace delimited tables exported from FracMan
+(ORS events, well surveys, interval/stage locations, f2d traces)
+"""
+import csv
+import io
+from itertools import islice
+from pathlib import Path
+
+import pandas as pd
+
+
+def read_header_line(path: Path, line_no: int = 0) -> str:
+    """Read a single line of a file without reading the rest
+
+    Args:
+        path (Path): file path
+        line_no (int, optional): 0-based line number. Defaults to 0.
+
+    Returns:
+        str: line without the trailing newline
+    """
+    with open(path) as f:
+        for i, line in enumerate(f):
+            if i == line_no:
+                return line.rstrip("\r\n")
+    return ""
+
+
+def split_columns(line: str) -> list:
+    """Column names from a header line, split on any whitespace and ignoring
+    a leading comment character
+
+    Args:
+        line (str): header line
+
+    Returns:
+        list: column names
+    """
+    return line.strip().lstrip("#").split()
+
+
+def _blank_runs_to_tabs(text: str) -> str:
+    """Replace runs of two or more blanks, or a tab, with a single tab and
+    drop blanks at the start and end of lines, using plain string replaces
+    which are much faster than a regular expression on large files
+    """
+    text = text.replace("\t", "  ").replace("  ", "\t").replace("\t ", "\t")
+    while "\t\t" in text:
+        text = text.replace("\t\t", "\t")
+    text = text.replace(" \n", "\n").replace("\n\t", "\n").replace("\t\n", "\n")
+    return text.strip("\t ")
+
+
+def _read_body(path: Path, skiprows: int) -> str:
+    "Text of a file after the first skiprows lines"
+    with open(path) as f:
+        for _ in range(skiprows):
+            f.readline()
+        return f.read()
+
+
+def read_fracman_table(
+    path: Path,
+    skiprows: int = 0,
+    header="infer",
+    names: list = None,
+    delimiter: str = "multi",
+    dtype=None,
+    **kwargs,
+) -> pd.DataFrame:
+    """Read a whitespace delimited FracMan export with the pandas C engine
+
+    FracMan pads columns with runs of spaces or tabs, and text fields such as
+    well or set names can hold single spaces. With delimiter="multi" runs of
+    two or more blanks (or a tab) separate fields, as the former
+    sep="\\s{2,}" python engine reads did, and are rewritten to tabs before
+    parsing. Quotes are kept as written, leading and trailing blanks ignored.
+
+    Args:
+        path (Path): file path
+        skiprows (int, optional): lines to skip before the header or data.
+            Defaults to 0.
+        header (optional): as in pd.read_csv, "infer" reads column names from
+            the first line after skiprows unless names is given.
+            Defaults to "infer".
+        names (list, optional): column names. Defaults to None.
+        delimiter (str, optional): "multi" for runs of two or more blanks,
+            or "whitespace" for any whitespace run. Defaults to "multi".
+        dtype (optional): explicit column dtypes passed to pd.read_csv.
+            Defaults to None.
+        **kwargs: passed to pd.read_csv
+
+    Returns:
+        pd.DataFrame: parsed table
+    """
+    if delimiter not in ("multi", "whitespace"):
+        raise ValueError(f"Unknown delimiter: {delimiter}")
+    options = dict(
+        header=header,
+        names=names,
+        dtype=dtype,
+        engine="c",
+        quoting=csv.QUOTE_NONE,
+        **kwargs,
+    )
+    if delimiter == "whitespace":
+        return pd.read_csv(path, skiprows=skiprows, sep=r"\s+", **options)
+    text = _blank_runs_to_tabs(_read_body(path, skiprows))
+    return pd.read_csv(io.StringIO(text), sep="\t", **options)
+
+
+def iter_fracman_table(
+    path: Path,
+    names: list,
+    skiprows: int = 0,
+    chunksize: int = 1_000_000,
+    delimiter: str = "multi",
+    dtype=None,
+    **kwargs,
+):
+    """Read a whitespace delimited FracMan export in chunks of rows, holding
+    at most one chunk of text and its parsed table in memory
+
+    Args:
+        path (Path): file path
+        names (list): column names
+        skiprows (int, optional): lines before the data. Defaults to 0.
+        chunksize (int, optional): rows per chunk. Defaults to 1,000,000.
+        delimiter (str, optional): "multi" or "whitespace", as in
+            read_fracman_table. Defaults to "multi".
+        dtype (optional): explicit column dtypes. Defaults to None.
+        **kwargs: passed to pd.read_csv
+
+    Yields:
+        pd.DataFrame: chunk of at most chunksize rows
+    """
+    if delimiter not in ("multi", "whitespace"):
+        raise ValueError(f"Unknown delimiter: {delimiter}")
+    options = dict(
+        header=None,
+        names=names,
+        dtype=dtype,
+        engine="c",
+        quoting=csv.QUOTE_NONE,
+        **kwargs,
+    )
+    if delimiter == "whitespace":
+        yield from pd.read_csv(
+            path, skiprows=skiprows, sep=r"\s+", chunksize=chunksize, **options
+        )
+        return
+
+    with open(path) as f:
+        for _ in range(skiprows):
+            f.readline()
+        while True:
+            text = "".join(islice(f, chunksize))
+            if not text:
+                return
+            text = _blank_runs_to_tabs(text)
+            if text.strip():
+                yield pd.read_csv(io.StringIO(text), sep="\t", **options)
@@ -1,5 +1,35 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
 import time
 import subprocess
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .cache import DiskCache, hash_file
+
+
+class RunResult:
+    """Outcome of one FracMan run"""
+
+    def __init__(self, macro_filepath, workdir, status, exit_code, wall_time_s):
+        self.macro_filepath = str(macro_filepath)
+        self.workdir = None if workdir is None else str(workdir)
+        self.status = status  # NORMAL_FINISH, TIME_OUT, NOT_RESPONDING or FAILED
+        self.exit_code = exit_code
+        self.wall_time_s = wall_time_s
+
+    def __repr__(self):
+        return "RunResult({0}, {1}, exit_code={2}, wall_time_s={3:.1f})".format(
+            self.macro_filepath, self.status, self.exit_code, self.wall_time_s
+        )
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
 
 
 class FracmanRunner:
@@ -17,55 +47,120 @@ class FracmanRunner:
         self.show_window = False  # should we show the fracman window?
         self.check_interval_s = 5  # check the process after t seconds
 
-    def Run(self, macro_filepath):
-        """run FracMan with the macro"""
+    def command(self, macro_filepath) -> list:
+        """Command line for a macro. fracman_exe_path may be a path or a list
+        of arguments, e.g. [sys.executable, "stub.py"] to stand in for FracMan
+
+        Args:
+            macro_filepath: macro file path
+
+        Returns:
+            list: program and arguments
+        """
         if self.fracman_exe_path is None:
-            system_command = "fracman " + macro_filepath
-        else:
-            assert isinstance(self.fracman_exe_path, str)
-            system_command = self.fracman_exe_path + '" "' + macro_filepath + '"'
+            return ["fracman", str(macro_filepath)]
+        if isinstance(self.fracman_exe_path, (list, tuple)):
+            return [str(arg) for arg in self.fracman_exe_path] + [str(macro_filepath)]
+        assert isinstance(self.fracman_exe_path, (str, Path))
+        return [str(self.fracman_exe_path), str(macro_filepath)]
 
-        print("RUNNING: {0}".format(macro_filepath))
+    def _startupinfo(self):
+        "Window settings for the process, only used on Windows"
+        if os.name != "nt":
+            return None
         info = subprocess.STARTUPINFO()
         info.dwFlags = 1
         info.wShowWindow = self.show_window
+        return info
+
+    def Run(self, macro_filepath):
+        """run FracMan with the macro"""
+        print("RUNNING: {0}".format(macro_filepath))
+        result = self.run_process(macro_filepath)
+        self.start_time = time.time() - result.wall_time_s
+        return result
+
+    def run_process(self, macro_filepath, cwd=None, stdin=subprocess.PIPE):
+        """Run one macro and monitor it until it finishes, times out or stops
+        responding. Safe to call from several threads at once.
 
-        # start the process
-        p = subprocess.Popen(system_command, stdin=subprocess.PIPE, startupinfo=info)
-        self.start_time = time.time()
+        Args:
+            macro_filepath: macro file path
+            cwd (optional): working directory of the process. Defaults to None.
+            stdin (optional): stdin of the process. Defaults to a pipe.
+
+        Returns:
+            RunResult: status, exit code and wall time
+        """
+        start_time = time.time()
+        try:
+            p = subprocess.Popen(
+                self.command(macro_filepath),
+                stdin=stdin,
+                cwd=cwd,
+                startupinfo=self._startupinfo(),
+            )
+        except OSError as err:
+            print("FAILED: {0} ({1})".format(macro_filepath, err))
+            return RunResult(macro_filepath, cwd, "FAILED", None, 0.0)
+
+        status = self.monitor(p, macro_filepath, start_time)
+        return RunResult(
+            macro_filepath, cwd, status, p.returncode, time.time() - start_time
+        )
 
+    def monitor(self, p, macro_filepath, start_time) -> str:
+        """Poll a process every check_interval_s, applying the time out and
+        not responding limits
+
+        Args:
+            p (subprocess.Popen): running process
+            macro_filepath: macro file path, for messages
+            start_time (float): process start time
+
+        Returns:
+            str: NORMAL_FINISH, TIME_OUT or NOT_RESPONDING
+        """
+        non_responded_time = 0  # first time the process was not responding
         while True:
             time.sleep(self.check_interval_s)
             t = time.time()
 
+            # check if the process finished
+            if p.poll() is not None:
+                print("NORMAL_FINISH: {0}".format(macro_filepath))
+                return "NORMAL_FINISH"
+
             # terminate if the program times out due to lack of convergence
-            if (t - self.start_time) > self.time_out:
-                p.terminate()
+            if (t - start_time) > self.time_out:
+                self.stop(p)
                 print("TIME_OUT: {0}".format(macro_filepath))
-                break
+                return "TIME_OUT"
 
             # continue if program is responding
             if self.check_pid_response(p.pid):
-                self.non_responded_time = 0
+                non_responded_time = 0
                 continue
 
-            # check if the process finished
-            if p.poll() != None:
-                print("NORMAL_FINISH: {0}".format(macro_filepath))
-                break
-
-            # process is not responding or finished already
-            if (
-                self.non_responded_time == 0
-            ):  # first time the process was not responding
-                self.non_responded_time = t
+            # first time the process was not responding
+            if non_responded_time == 0:
+                non_responded_time = t
                 continue
 
             # terminate if program stalls
-            if t - self.non_responded_time > self.maxnon_responded_time:
-                p.terminate()
+            if t - non_responded_time > self.maxnon_responded_time:
+                self.stop(p)
                 print("NOT_RESPONDING: {0}".format(macro_filepath))
-                break
+                return "NOT_RESPONDING"
+
+    def stop(self, p, grace_s: float = 10.0):
+        "Terminate a process, killing it if it does not exit in grace_s"
+        p.terminate()
+        try:
+            p.wait(grace_s)
+        except subprocess.TimeoutExpired:
+            p.kill()
+            p.wait()
 
     def check_pid_response(self, pid: int) -> bool:
         """Check if a program is responding based on its Process ID
@@ -76,6 +171,459 @@ class FracmanRunner:
         Returns:
             bool: True if responding
         """
+        if os.name != "nt":
+            return _check_posix_pid_response(pid)
         cmd = 'tasklist /FI "PID eq %d" /FI "STATUS eq running"' % pid
         status = subprocess.Popen(cmd, stdout=subprocess.PIPE).stdout.read()
         return str(pid) in str(status)
+
+
+def _check_posix_pid_response(pid: int) -> bool:
+    "A process responds unless it is stopped, a zombie or gone"
+    if os.path.isdir("/proc"):
+        try:
+            with open("/proc/{0}/stat".format(pid)) as f:
+                state = f.read().rsplit(")", 1)[1].split()[0]
+        except OSError:
+            return False
+        return state not in ("T", "t", "Z", "X")
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+class RunPool:
+    """Run several FracMan macros concurrently, each in its own working
+    directory, using a FracmanRunner for the command and monitoring.
+    Processes start in their run directory, so give the runner an absolute
+    fracman_exe_path if it is not on the PATH.
+    """
+
+    def __init__(
+        self, runner=None, max_workers=2, workdir_root="runs", input_files=None
+    ):
+        """
+        Args:
+            runner (FracmanRunner, optional): runner with the executable, time
+                out and check settings. Defaults to FracmanRunner().
+            max_workers (int, optional): concurrent processes. Defaults to 2.
+            workdir_root (optional): parent of the run directories.
+                Defaults to "runs".
+            input_files (list, optional): files copied into every run
+                directory, e.g. DFN inputs used by the macros. Defaults to None.
+        """
+        self.runner = FracmanRunner() if runner is None else runner
+        self.max_workers = max_workers
+        self.workdir_root = Path(workdir_root)
+        self.input_files = [Path(f) for f in input_files or []]
+
+    def prepare(self, index: int, macro_filepath) -> Path:
+        """Create an isolated run directory holding a copy of the macro and
+        the input files
+
+        Args:
+            index (int): position of the macro in the batch
+            macro_filepath: macro file path
+
+        Returns:
+            Path: macro copy inside the run directory
+        """
+        macro_filepath = Path(macro_filepath)
+        workdir = self.workdir_root / "run_{0:04d}_{1}".format(
+            index, macro_filepath.stem
+        )
+        if workdir.exists():
+            warnings.warn("Replacing existing run directory {0}".format(workdir))
+            shutil.rmtree(workdir)
+        workdir.mkdir(parents=True)
+        for f in self.input_files:
+            shutil.copy2(f, workdir / f.name)
+        return Path(shutil.copy2(macro_filepath, workdir / macro_filepath.name))
+
+    def _run_one(self, index: int, macro_filepath) -> RunResult:
+        try:
+            macro_copy = self.prepare(index, macro_filepath)
+        except OSError as err:
+            # fail this job only, the other jobs keep their results
+            print("FAILED: {0} ({1})".format(macro_filepath, err))
+            return RunResult(macro_filepath, None, "FAILED", None, 0.0)
+        print("RUNNING: {0}".format(macro_copy))
+        result = self.runner.run_process(
+            macro_copy.resolve(), cwd=macro_copy.parent, stdin=subprocess.DEVNULL
+        )
+        result.macro_filepath = str(macro_filepath)
+        return result
+
+    def run(self, macro_files: list) -> list:
+        """Run every macro, at most max_workers at a time
+
+        Args:
+            macro_files (list): macro file paths
+
+        Returns:
+            list: RunResult per macro, in the order given, FAILED where the
+            run directory could not be prepared or the process not started
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(self._run_one, range(len(macro_files)), macro_files))
+
+
+class PidStateProbe:
+    """Responsiveness probe from the process state, as in
+    FracmanRunner.check_pid_response
+    """
+
+    def __init__(self, pid: int, cwd=None):
+        self.pid = pid
+        self.check_pid_response = FracmanRunner().check_pid_response
+
+    def __call__(self) -> bool:
+        return self.check_pid_response(self.pid)
+
+
+class PsutilProbe:
+    """Responsiveness probe from psutil CPU and IO counters, the process is
+    responding while either counter keeps changing between checks
+    """
+
+    def __init__(self, pid: int, cwd=None):
+        try:
+            import psutil
+        except ImportError as err:
+            raise ImportError("PsutilProbe requires psutil") from err
+        self.psutil = psutil
+        self.process = psutil.Process(pid)
+        self.last = None
+
+    def _counters(self):
+        cpu = self.process.cpu_times()
+        try:
+            io = self.process.io_counters()
+        except (AttributeError, self.psutil.AccessDenied):
+            io = None
+        return (cpu.user + cpu.system, io)
+
+    def __call__(self) -> bool:
+        try:
+            counters = self._counters()
+        except self.psutil.Error:
+            return False
+        responding = counters != self.last
+        self.last = counters
+        return responding
+
+
+class LogHeartbeatProbe:
+    """Responsiveness probe from a log file in the run directory, the process
+    is responding while the log keeps growing or being touched
+    """
+
+    def __init__(self, pid: int, cwd=None, log_name: str = "FracMan.log"):
+        self.path = Path(cwd or ".") / log_name
+        self.last = None
+
+    def __call__(self) -> bool:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return False
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        responding = stamp != self.last
+        self.last = stamp
+        return responding
+
+
+class AsyncFracmanRunner:
+    """Supervise FracMan processes from one asyncio event loop. Exit is
+    awaited directly, so completion is seen immediately, and a probe checks
+    responsiveness every check_interval_s of the runner settings. The probe
+    runs in a worker thread, so blocking probes such as PidStateProbe do not
+    stall the other processes on the loop.
+    """
+
+    def __init__(self, runner=None, probe=PidStateProbe):
+        """
+        Args:
+            runner (FracmanRunner, optional): executable, time out and check
+                settings. Defaults to FracmanRunner().
+            probe (optional): called with (pid, cwd) when a process starts,
+                returning a callable that is True while the process responds,
+                e.g. PsutilProbe or functools.partial(LogHeartbeatProbe,
+                log_name=...). Defaults to PidStateProbe.
+        """
+        self.runner = FracmanRunner() if runner is None else runner
+        self.probe = probe
+
+    async def run(self, macro_filepath, cwd=None) -> RunResult:
+        """Run one macro and supervise it until it exits, times out or stops
+        responding
+
+        Args:
+            macro_filepath: macro file path
+            cwd (optional): working directory of the process. Defaults to None.
+
+        Returns:
+            RunResult: status, exit code and wall time
+        """
+        runner = self.runner
+        start_time = time.time()
+        try:
+            p = await asyncio.create_subprocess_exec(
+                *runner.command(macro_filepath),
+                stdin=subprocess.DEVNULL,
+                cwd=cwd,
+                startupinfo=runner._startupinfo(),
+            )
+        except OSError as err:
+            print("FAILED: {0} ({1})".format(macro_filepath, err))
+            return RunResult(macro_filepath, cwd, "FAILED", None, 0.0)
+
+        status = await self._monitor(p, self.probe(p.pid, cwd), start_time)
+        print("{0}: {1}".format(status, macro_filepath))
+        return RunResult(
+            macro_filepath, cwd, status, p.returncode, time.time() - start_time
+        )
+
+    async def _monitor(self, p, responding, start_time) -> str:
+        runner = self.runner
+        non_responded_time = 0  # first time the process was not responding
+        while True:
+            remaining = runner.time_out - (time.time() - start_time)
+            try:
+                await asyncio.wait_for(
+                    p.wait(), max(min(runner.check_interval_s, remaining), 0)
+                )
+                return "NORMAL_FINISH"
+            except asyncio.TimeoutError:
+                pass
+            t = time.time()
+
+            # terminate if the program times out due to lack of convergence
+            if (t - start_time) > runner.time_out:
+                await self._stop(p)
+                return "TIME_OUT"
+
+            # continue if program is responding, the probe may block
+            # (PidStateProbe runs tasklist) so keep it off the event loop
+            if await asyncio.to_thread(responding):
+                non_responded_time = 0
+                continue
+
+            # first time the process was not responding
+            if non_responded_time == 0:
+                non_responded_time = t
+                continue
+
+            # terminate if program stalls
+            if t - non_responded_time > runner.maxnon_responded_time:
+                await self._stop(p)
+                return "NOT_RESPONDING"
+
+    async def _stop(self, p, grace_s: float = 10.0):
+        "Terminate a process, killing it if it does not exit in grace_s"
+        if p.returncode is not None:
+            return
+        p.terminate()
+        try:
+            await asyncio.wait_for(p.wait(), grace_s)
+        except asyncio.TimeoutError:
+            p.kill()
+            await p.wait()
+
+    async def run_many(
+        self,
+        macro_files: list,
+        max_concurrent=None,
+        workdir_root=None,
+        input_files=None,
+    ) -> list:
+        """Run many macros from the current event loop
+
+        Args:
+            macro_files (list): macro file paths
+            max_concurrent (int, optional): processes at once. Defaults to
+                None, all at once.
+            workdir_root (optional): if given, each macro runs in its own
+                directory as with RunPool. Defaults to None.
+            input_files (list, optional): files copied into every run
+                directory. Defaults to None.
+
+        Returns:
+            list: RunResult per macro, in the order given
+        """
+        limit = asyncio.Semaphore(max_concurrent or max(len(macro_files), 1))
+        pool = None
+        if workdir_root is not None:
+            pool = RunPool(
+                self.runner, workdir_root=workdir_root, input_files=input_files
+            )
+
+        async def run_one(index, macro_filepath):
+            async with limit:
+                if pool is None:
+                    return await self.run(macro_filepath)
+                try:
+                    macro_copy = pool.prepare(index, macro_filepath)
+                except OSError as err:
+                    print("FAILED: {0} ({1})".format(macro_filepath, err))
+                    return RunResult(macro_filepath, None, "FAILED", None, 0.0)
+                result = await self.run(macro_copy.resolve(), cwd=macro_copy.parent)
+                result.macro_filepath = str(macro_filepath)
+                return result
+
+        return await asyncio.gather(
+            *(run_one(i, macro) for i, macro in enumerate(macro_files))
+        )
+
+    def run_all(self, macro_files: list, **kwargs) -> list:
+        "Blocking wrapper of run_many for scripts outside an event loop"
+        return asyncio.run(self.run_many(macro_files, **kwargs))
+
+
+def macro_input_files(macro_filepath) -> list:
+    """Existing files referenced by quoted paths in a macro, resolved
+    relative to the macro directory
+
+    Args:
+        macro_filepath: macro file path
+
+    Returns:
+        list: sorted input file paths
+    """
+    macro_filepath = Path(macro_filepath).resolve()
+    with open(macro_filepath, errors="replace") as f:
+        quoted = re.findall(r'"([^"\r\n]+\.[A-Za-z0-9]+)"', f.read())
+    found = set()
+    for name in quoted:
+        # relative paths are relative to the macro, not the current directory
+        path = macro_filepath.parent / name
+        if path.is_file():
+            found.add(path.resolve())
+    return sorted(found)
+
+
+class RunCache:
+    """Content addressed cache of FracMan run outputs, keyed by the macro,
+    its input files and the parameter values, so repeated parameter sets
+    restore stored outputs instead of launching FracMan again
+    """
+
+    def __init__(self, cache_dir, outputs: list, max_bytes: int = 20 * 1024**3):
+        """
+        Args:
+            cache_dir: cache directory
+            outputs (list): output files, relative to the run directory, that
+                are stored after a run and restored on a hit
+            max_bytes (int, optional): size limit, least recently used
+                entries are evicted first. Defaults to 20 GB.
+        """
+        self.cache = DiskCache(cache_dir, max_bytes)
+        self.outputs = [str(o) for o in outputs]
+
+    def key(self, macro_filepath, input_files=None, params=None) -> str:
+        """Hash of the macro, input files and parameters
+
+        Args:
+            macro_filepath: macro file path
+            input_files (list, optional): input files. Defaults to the files
+                referenced by the macro.
+            params (dict, optional): json serializable parameter values.
+                Defaults to None.
+
+        Returns:
+            str: sha256 hex digest
+        """
+        if input_files is None:
+            input_files = macro_input_files(macro_filepath)
+        digest = hashlib.sha256()
+        digest.update(hash_file(macro_filepath).encode())
+        for path in sorted(Path(f) for f in input_files):
+            digest.update(path.name.encode())
+            digest.update(hash_file(path).encode())
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        digest.update(json.dumps(self.outputs).encode())
+        return digest.hexdigest()
+
+    def restore(self, key: str, workdir) -> bool:
+        """Copy stored outputs into a run directory
+
+        Args:
+            key (str): cache key
+            workdir: run directory
+
+        Returns:
+            bool: True on a hit
+        """
+        entry, _ = self.cache.get(key)
+        if entry is None:
+            return False
+        for name in self.outputs:
+            dest = Path(workdir) / name
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(entry / "outputs" / name, dest)
+        return True
+
+    def store(self, key: str, workdir, meta: dict = None) -> bool:
+        """Store the outputs of a finished run
+
+        Args:
+            key (str): cache key
+            workdir: run directory
+            meta (dict, optional): json serializable metadata. Defaults to None.
+
+        Returns:
+            bool: False if nothing was stored, because an output is missing or
+            an older entry under the same key is still in use
+        """
+        sources = [Path(workdir) / name for name in self.outputs]
+        if not all(src.is_file() for src in sources):
+            return False
+
+        def writer(entry):
+            for name, src in zip(self.outputs, sources):
+                dest = entry / "outputs" / name
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src, dest)
+
+        return self.cache.put(key, writer, meta) is not None
+
+    def run(self, runner, macro_filepath, input_files=None, params=None, cwd=None):
+        """Restore the outputs of an identical earlier run, or run the macro
+        and store its outputs if it finished normally
+
+        Args:
+            runner (FracmanRunner): runner used on a miss
+            macro_filepath: macro file path
+            input_files (list, optional): input files. Defaults to the files
+                referenced by the macro.
+            params (dict, optional): parameter values. Defaults to None.
+            cwd (optional): run directory, relative macro and input file paths
+                are relative to it. Defaults to the current directory.
+
+        Returns:
+            RunResult: with status CACHED on a hit
+        """
+        workdir = Path(cwd or ".")
+        # FracMan is started in the run directory, so hash the files it reads
+        if input_files is not None:
+            input_files = [workdir / f for f in input_files]
+        key = self.key(workdir / macro_filepath, input_files, params)
+        if self.restore(key, workdir):
+            print("CACHED: {0}".format(macro_filepath))
+            return RunResult(macro_filepath, cwd, "CACHED", 0, 0.0)
+
+        result = runner.run_process(macro_filepath, cwd=cwd)
+        if result.status == "NORMAL_FINISH" and result.exit_code == 0:
+            meta = {"macro": str(macro_filepath), "params": params}
+            self.store(key, workdir, json.loads(json.dumps(meta, default=str)))
+        return result
+
+    def stats(self) -> dict:
+        "Hit, miss, entry count and size statistics"
+        return self.cache.stats()
+
+    def clear(self) -> None:
+        "Remove every stored run"
+        self.cache.clear()
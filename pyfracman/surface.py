@@ -0,0 +1,212 @@
+"""
+GOCAD TSurf horizons as triangle meshes, with a 2D triangle index for batch
+depth, above/below and formation queries of events or fracture centroids
+"""
+import numpy as np
+import pandas as pd
+
+
+def read_tsurf(filename: str) -> tuple:
+    """Parse the vertices and triangles of a GOCAD TSurf file. ATOM records
+    reuse the coordinates of the vertex they reference, and the triangles of
+    every TFACE are combined.
+
+    Args:
+        filename (str): .ts filename
+
+    Returns:
+        tuple: vertices (n x 3) and 0-based vertex rows of each triangle (m x 3)
+    """
+    ids, coords, atoms, triangles = [], [], [], []
+    with open(filename) as f:
+        for line in f:
+            key = line[:6].split(maxsplit=1)
+            if not key:
+                continue
+            if key[0] in ("VRTX", "PVRTX"):
+                tokens = line.split(maxsplit=5)
+                ids.append(tokens[1])
+                coords.append(tokens[2:5])
+            elif key[0] in ("ATOM", "PATOM"):
+                tokens = line.split(maxsplit=3)
+                atoms.append(tokens[1:3])
+            elif key[0] == "TRGL":
+                triangles.append(line.split(maxsplit=4)[1:4])
+
+    ids = np.array(ids, dtype=np.int64)
+    vertices = np.array(coords, dtype=float).reshape(-1, 3)
+    if atoms:
+        atoms = np.array(atoms, dtype=np.int64)
+        source = np.searchsorted(ids, atoms[:, 1], sorter=np.argsort(ids))
+        vertices = np.vstack([vertices, vertices[np.argsort(ids)[source]]])
+        ids = np.concatenate([ids, atoms[:, 0]])
+
+    order = np.argsort(ids)
+    triangles = np.array(triangles, dtype=np.int64).reshape(-1, 3)
+    rows = order[np.searchsorted(ids, triangles, sorter=order)]
+    return vertices, rows
+
+
+class Surface:
+    """Triangulated horizon with a regular grid of bins over x and y, each
+    bin listing the triangles whose bounding box overlaps it, so point
+    queries only test a few triangles each
+    """
+
+    def __init__(
+        self, vertices: np.ndarray, triangles: np.ndarray, tri_per_bin: float = 0.5
+    ) -> None:
+        self.vertices = np.asarray(vertices, dtype=float)
+        self.triangles = np.asarray(triangles, dtype=np.int64)
+        self._build_index(tri_per_bin)
+
+    @classmethod
+    def from_tsurf(cls, filename: str, **kwargs) -> "Surface":
+        "Build from a GOCAD TSurf file"
+        return cls(*read_tsurf(filename), **kwargs)
+
+    def _build_index(self, tri_per_bin: float) -> None:
+        # affine map of each triangle from xy to barycentric u, v and z
+        a, b, c = (self.vertices[self.triangles[:, i]] for i in range(3))
+        v0, v1 = b[:, :2] - a[:, :2], c[:, :2] - a[:, :2]
+        det = v0[:, 0] * v1[:, 1] - v1[:, 0] * v0[:, 1]
+        flat = det == 0
+        det = np.where(flat, 1.0, det)
+        self._tri_origin = a[:, :2]
+        self._tri_inverse = (
+            np.column_stack([v1[:, 1], -v1[:, 0], -v0[:, 1], v0[:, 0]]) / det[:, None]
+        )
+        # vertical triangles never contain a point
+        self._tri_inverse[flat] = np.nan
+        self._tri_z = np.column_stack([a[:, 2], b[:, 2] - a[:, 2], c[:, 2] - a[:, 2]])
+
+        corners = self.vertices[self.triangles, :2]
+        tri_lo, tri_hi = corners.min(axis=1), corners.max(axis=1)
+        self.origin = tri_lo.min(axis=0)
+        extent = np.maximum(tri_hi.max(axis=0) - self.origin, 1e-9)
+        n_bins = max(len(self.triangles) / tri_per_bin, 1.0)
+        self.bin_size = np.sqrt(extent.prod() / n_bins)
+        self.shape = np.maximum(np.ceil(extent / self.bin_size), 1).astype(np.int64)
+
+        # every bin overlapped by the bounding box of each triangle
+        lo = self._bin_xy(tri_lo)
+        hi = self._bin_xy(tri_hi)
+        span = hi - lo + 1
+        counts = span.prod(axis=1)
+        tri = np.repeat(np.arange(len(self.triangles)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        ix = lo[tri, 0] + local % span[tri, 0]
+        iy = lo[tri, 1] + local // span[tri, 0]
+        bins = ix * self.shape[1] + iy
+
+        order = np.argsort(bins, kind="stable")
+        self.bin_triangles = tri[order]
+        self.bin_offsets = np.searchsorted(
+            bins[order], np.arange(self.shape.prod() + 1)
+        )
+
+    def _bin_xy(self, xy: np.ndarray) -> np.ndarray:
+        "Integer bin of xy coordinates, clamped to the grid"
+        ij = np.floor((xy - self.origin) / self.bin_size).astype(np.int64)
+        return np.clip(ij, 0, self.shape - 1)
+
+    def _depth_chunk(self, xy: np.ndarray) -> np.ndarray:
+        "Surface z at a chunk of xy locations"
+        z = np.full(len(xy), np.nan)
+        ij = self._bin_xy(xy)
+        bins = ij[:, 0] * self.shape[1] + ij[:, 1]
+        start = self.bin_offsets[bins]
+        counts = self.bin_offsets[bins + 1] - start
+        point = np.repeat(np.arange(len(xy)), counts)
+        first = np.repeat(start - np.cumsum(counts) + counts, counts)
+        cand = self.bin_triangles[first + np.arange(counts.sum())]
+
+        rel = xy[point] - self._tri_origin[cand]
+        inv = self._tri_inverse[cand]
+        u = inv[:, 0] * rel[:, 0] + inv[:, 1] * rel[:, 1]
+        v = inv[:, 2] * rel[:, 0] + inv[:, 3] * rel[:, 1]
+        tol = 1e-12
+        inside = (u >= -tol) & (v >= -tol) & (u + v <= 1 + tol)
+        coef = self._tri_z[cand[inside]]
+        z[point[inside]] = coef[:, 0] + u[inside] * coef[:, 1] + v[inside] * coef[:, 2]
+        return z
+
+    def depth_at(self, x, y, chunk_size: int = 200_000) -> np.ndarray:
+        """Surface z at x, y locations by linear interpolation on the
+        containing triangle
+
+        Args:
+            x: x coordinates
+            y: y coordinates
+            chunk_size (int, optional): points per vectorized batch.
+                Defaults to 200,000.
+
+        Returns:
+            np.ndarray: z of the surface, NaN outside the triangulation
+        """
+        xy = np.column_stack([np.ravel(x), np.ravel(y)]).astype(float)
+        z = np.concatenate(
+            [np.full(0, np.nan)]
+            + [
+                self._depth_chunk(xy[start : start + chunk_size])
+                for start in range(0, len(xy), chunk_size)
+            ]
+        )
+        return z.reshape(np.shape(x))
+
+    def is_above(self, points: np.ndarray) -> np.ndarray:
+        """Whether points lie above the surface, z being elevation
+
+        Args:
+            points (np.ndarray): x, y, z coordinates (n x 3)
+
+        Returns:
+            np.ndarray: True above the surface, False below or outside it
+        """
+        points = np.asarray(points, dtype=float)
+        return points[:, 2] > self.depth_at(points[:, 0], points[:, 1])
+
+    def resample(self, cell_size: float) -> tuple:
+        """Resample the surface on a regular grid of cell centres
+
+        Args:
+            cell_size (float): grid spacing
+
+        Returns:
+            tuple: x centres, y centres, and z grid (ny x nx, NaN outside)
+        """
+        lo = self.vertices[:, :2].min(axis=0)
+        hi = self.vertices[:, :2].max(axis=0)
+        xs = np.arange(lo[0] + cell_size / 2, hi[0], cell_size)
+        ys = np.arange(lo[1] + cell_size / 2, hi[1], cell_size)
+        gx, gy = np.meshgrid(xs, ys)
+        return xs, ys, self.depth_at(gx, gy)
+
+    def to_df(self) -> pd.DataFrame:
+        "Vertices as a dataframe of x, y, z"
+        return pd.DataFrame(self.vertices, columns=["x", "y", "z"])
+
+
+def assign_formations(points: np.ndarray, tops: dict, base: Surface) -> pd.Categorical:
+    """Formation of each point from the surfaces of formation tops, the
+    formation being that of the deepest top above the point. Points below
+    the base of the deepest formation are left unassigned.
+
+    Args:
+        points (np.ndarray): x, y, z coordinates (n x 3), z being elevation
+        tops (dict): formation name to its top Surface, ordered shallow to deep
+        base (Surface): base of the deepest formation
+
+    Returns:
+        pd.Categorical: formation per point, NaN above the first top, below
+        the base or outside the surfaces
+    """
+    points = np.asarray(points, dtype=float)
+    codes = np.full(len(points), -1, dtype=np.int64)
+    for code, surface in enumerate(tops.values()):
+        top = surface.depth_at(points[:, 0], points[:, 1])
+        codes[points[:, 2] <= top] = code
+    # NaN outside the base also fails the comparison and is unassigned
+    below = ~(points[:, 2] >= base.depth_at(points[:, 0], points[:, 1]))
+    codes[below] = -1
+    return pd.Categorical.from_codes(codes, categories=list(tops))
@@ -1,9 +1,13 @@
 # Module with geospatial functions for wells, stages, etc. (i.e. not fractures)
 from pathlib import Path
+import numpy as np
 import pandas as pd
-from shapely.geometry import LineString
+import shapely
+from scipy.spatial import cKDTree
 import geopandas as gpd
 
+from .readers import read_fracman_table
+
 
 def load_survey_export(well_path: Path) -> pd.DataFrame:
     """Load Fracman survey exports into a clean csv file
@@ -14,13 +18,12 @@ def load_survey_export(well_path: Path) -> pd.DataFrame:
     Returns:
         pd.Dataframe: Cleaned survey with md, x, y, and z
     """
-    return pd.read_csv(
+    return read_fracman_table(
         well_path,
         skiprows=13,
-        sep="\s{2,}",
-        engine="python",
         header=None,
         names=["md", "x", "y", "z"],
+        dtype=float,
     ).assign(well=well_path.name.split("_")[0])
 
 
@@ -34,7 +37,7 @@ def load_stage_location(stg_loc_path: Path) -> pd.DataFrame:
         pd.DataFrame: cleaned stage locations
     """
     stage_loc = (
-        pd.read_csv(stg_loc_path, sep="\s{2,}", engine="python")
+        read_fracman_table(stg_loc_path, dtype={"Interval": str})
         .assign(well=stg_loc_path.name.split("_")[0])
         .drop(["Well", "IntervalSet", "Index", "ParentWell"], axis=1)
     )
@@ -42,14 +45,270 @@ def load_stage_location(stg_loc_path: Path) -> pd.DataFrame:
         stage_loc.Interval.str.replace('"', "", regex=True).replace("", 0).astype(int)
     )
     stage_loc.columns = (
-        stage_loc.columns.str.replace("[", "_", regex=True)
-        .str.replace("]", "", regex=True)
+        stage_loc.columns.str.replace("[", "_", regex=False)
+        .str.replace("]", "", regex=False)
         .str.lower()
     )
     stage_loc = stage_loc.rename(columns={"interval": "stage"}).query("stage > 0")
     return stage_loc
 
 
+def _slerp(t0: np.ndarray, t1: np.ndarray, frac: np.ndarray) -> np.ndarray:
+    "Spherical interpolation between unit vectors, row by row"
+    omega = np.arccos(np.clip((t0 * t1).sum(axis=1), -1.0, 1.0))
+    sin = np.sin(omega)
+    small = sin < 1e-9
+    sin = np.where(small, 1.0, sin)
+    w0 = np.where(small, 1 - frac, np.sin((1 - frac) * omega) / sin)
+    w1 = np.where(small, frac, np.sin(frac * omega) / sin)
+    return w0[:, None] * t0 + w1[:, None] * t1
+
+
+def _ratio_factor(dogleg: np.ndarray) -> np.ndarray:
+    "Minimum curvature ratio factor, 2 / dogleg * tan(dogleg / 2)"
+    safe = np.where(dogleg > 1e-9, dogleg, 1.0)
+    return np.where(dogleg > 1e-9, 2 / safe * np.tan(safe / 2), 1.0)
+
+
+class WellTrajectory:
+    """All well surveys in flat arrays sorted by well and measured depth,
+    for batched interpolation between measured depth and coordinates
+    Stations of well i are rows offsets[i]:offsets[i + 1] of md and xyz
+    """
+
+    def __init__(
+        self, wells: np.ndarray, md: np.ndarray, xyz: np.ndarray, offsets: np.ndarray
+    ) -> None:
+        self.wells = np.asarray(wells)
+        self.md = np.asarray(md, dtype=float)
+        self.xyz = np.asarray(xyz, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self._index = pd.Index(self.wells)
+        self._tangents = None
+        self._trees = {}
+
+    @classmethod
+    def from_surveys(cls, surveys: pd.DataFrame) -> "WellTrajectory":
+        """Build from surveys as loaded by load_survey_export
+
+        Args:
+            surveys (pd.DataFrame): Well surveys with md, x, y, z, and well
+
+        Returns:
+            WellTrajectory: sorted trajectory store
+        """
+        surveys = surveys.sort_values(["well", "md"], kind="stable")
+        wells, counts = np.unique(surveys["well"].to_numpy(), return_counts=True)
+        offsets = np.zeros(wells.size + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(
+            wells,
+            surveys["md"].to_numpy(float),
+            surveys[["x", "y", "z"]].to_numpy(float),
+            offsets,
+        )
+
+    def __len__(self) -> int:
+        return self.wells.size
+
+    def well_positions(self, wells) -> np.ndarray:
+        """Positions of well names in the store
+
+        Args:
+            wells: a well name or array-like of names
+
+        Returns:
+            np.ndarray: positions, raises KeyError for unknown wells
+        """
+        pos = self._index.get_indexer(np.atleast_1d(np.asarray(wells)))
+        if (pos < 0).any():
+            missing = np.atleast_1d(wells)[pos < 0]
+            raise KeyError(f"Unknown wells: {np.unique(missing)}")
+        return pos
+
+    @property
+    def tangents(self) -> np.ndarray:
+        """Unit tangent at every station, averaged from adjacent segments
+        and used for minimum curvature interpolation
+        """
+        if self._tangents is None:
+            seg = np.diff(self.xyz, axis=0)
+            length = np.linalg.norm(seg, axis=1, keepdims=True)
+            seg = seg / np.where(length > 0, length, 1.0)
+            last = np.zeros(self.md.size, dtype=bool)
+            last[self.offsets[1:] - 1] = True
+            first = np.zeros(self.md.size, dtype=bool)
+            first[self.offsets[:-1]] = True
+            # segment after and before each station, within the same well
+            after = np.vstack([seg, np.zeros((1, 3))])
+            after[last] = 0
+            before = np.vstack([np.zeros((1, 3)), seg])
+            before[first] = 0
+            tangents = after + before
+            norm = np.linalg.norm(tangents, axis=1, keepdims=True)
+            self._tangents = tangents / np.where(norm > 0, norm, 1.0)
+        return self._tangents
+
+    def _segments(self, pos: np.ndarray, md: np.ndarray) -> np.ndarray:
+        """First station of the survey segment holding each measured depth,
+        clamped to the first and last segment of the well
+        """
+        seg = np.empty(md.size, dtype=np.int64)
+        order = np.argsort(pos, kind="stable")
+        bounds = np.searchsorted(pos[order], np.arange(len(self) + 1))
+        for i in np.flatnonzero(np.diff(bounds)):
+            idx = order[bounds[i] : bounds[i + 1]]
+            lo, hi = self.offsets[i], self.offsets[i + 1]
+            found = np.searchsorted(self.md[lo:hi], md[idx], side="right") - 1
+            seg[idx] = lo + np.clip(found, 0, max(hi - lo - 2, 0))
+        return seg
+
+    def md_to_xyz(self, wells, md, method: str = "linear") -> np.ndarray:
+        """Coordinates at measured depths along wells
+
+        Args:
+            wells: well name, or array-like of names matching md
+            md: measured depths
+            method (str, optional): "linear" between stations, or
+                "min_curvature" arcs between station tangents, corrected to
+                pass through the stations. Straight segments, whose chord is
+                as long as their measured depth span, stay linear.
+                Defaults to "linear".
+
+        Returns:
+            np.ndarray: x, y, z for every md (n x 3), extrapolated linearly
+            outside the survey
+        """
+        md = np.atleast_1d(np.asarray(md, dtype=float))
+        pos = np.broadcast_to(self.well_positions(wells), md.shape)
+        seg = self._segments(pos, md)
+        nxt = np.minimum(seg + 1, self.offsets[pos + 1] - 1)
+        span = self.md[nxt] - self.md[seg]
+        frac = (md - self.md[seg]) / np.where(span > 0, span, 1.0)
+        chord = self.xyz[nxt] - self.xyz[seg]
+        linear = self.xyz[seg] + frac[:, None] * chord
+        if method == "linear":
+            return linear
+        if method != "min_curvature":
+            raise ValueError(f"Unknown interpolation method: {method}")
+
+        # a chord as long as the md span can only be followed in a straight
+        # line, whatever the tangents estimated from the adjacent segments
+        straight = np.linalg.norm(chord, axis=1) >= span * (1 - 1e-9)
+        inside = (frac >= 0) & (frac <= 1) & ~straight
+        t0, t1 = self.tangents[seg], self.tangents[nxt]
+        dogleg = np.arccos(np.clip((t0 * t1).sum(axis=1), -1.0, 1.0))
+        partial = np.clip(frac, 0, 1)
+        t_md = _slerp(t0, t1, partial)
+        arc = (partial * span / 2 * _ratio_factor(partial * dogleg))[:, None] * (
+            t0 + t_md
+        )
+        arc_end = (span / 2 * _ratio_factor(dogleg))[:, None] * (t0 + t1)
+        # spread the misclosure from estimated tangents along the segment
+        curved = self.xyz[seg] + arc + partial[:, None] * (chord - arc_end)
+        return np.where(inside[:, None], curved, linear)
+
+    def _tree(self, well: int) -> cKDTree:
+        "KD tree of the stations of one well"
+        if well not in self._trees:
+            lo, hi = self.offsets[well], self.offsets[well + 1]
+            self._trees[well] = cKDTree(self.xyz[lo:hi])
+        return self._trees[well]
+
+    def _project(self, points: np.ndarray, stations: np.ndarray) -> tuple:
+        """Project points onto the survey segments either side of candidate
+        stations (n x k), keeping the closest projection
+
+        Returns:
+            tuple: segment start station, measured depth and distance
+        """
+        well = np.searchsorted(self.offsets, stations, side="right") - 1
+        seg = np.concatenate([stations - 1, stations], axis=1)
+        well = np.concatenate([well, well], axis=1)
+        valid = (seg >= self.offsets[well]) & (seg + 1 < self.offsets[well + 1])
+        seg = np.clip(np.where(valid, seg, 0), 0, self.md.size - 2)
+
+        a, b = self.xyz[seg], self.xyz[seg + 1]
+        ab = b - a
+        length2 = (ab * ab).sum(axis=2)
+        t = ((points[:, None, :] - a) * ab).sum(axis=2)
+        t = np.clip(t / np.where(length2 > 0, length2, 1.0), 0, 1)
+        dist = np.linalg.norm(a + t[..., None] * ab - points[:, None, :], axis=2)
+        dist = np.where(valid, dist, np.inf)
+        best = np.argmin(dist, axis=1)[:, None]
+        seg = np.take_along_axis(seg, best, axis=1)[:, 0]
+        t = np.take_along_axis(t, best, axis=1)[:, 0]
+        md = self.md[seg] + t * (self.md[seg + 1] - self.md[seg])
+        return seg, md, np.take_along_axis(dist, best, axis=1)[:, 0]
+
+    def _project_well(self, well: int, points: np.ndarray, k: int) -> tuple:
+        "Project points onto the segments around their k nearest stations of a well"
+        kk = min(k, self.offsets[well + 1] - self.offsets[well])
+        _, stations = self._tree(well).query(points, k=kk)
+        stations = stations.reshape(len(points), kk) + self.offsets[well]
+        return self._project(points, stations)
+
+    def xyz_to_md(self, points, wells=None, k: int = 4) -> pd.DataFrame:
+        """Nearest measured depth of points (e.g. microseismic events) on the
+        wells. Candidate stations come from a KD tree of each well and the
+        points are projected onto the survey segments around them.
+
+        Args:
+            points: x, y, z coordinates (n x 3)
+            wells (optional): well name, or names matching points, to
+                project onto. Defaults to None, the well with the nearest
+                segment.
+            k (int, optional): candidate stations per point and well.
+                Defaults to 4.
+
+        Returns:
+            pd.DataFrame: well, md and distance to the well for each point
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        seg = np.zeros(len(points), dtype=np.int64)
+        md = np.zeros(len(points))
+        dist = np.full(len(points), np.inf)
+        if wells is None:
+            # the nearest stations of all wells can belong to the wrong well
+            # on sparse surveys, so keep the nearest segment over every well
+            for well in np.flatnonzero(np.diff(self.offsets) >= 2):
+                w_seg, w_md, w_dist = self._project_well(well, points, k)
+                closer = w_dist < dist
+                seg[closer], md[closer], dist[closer] = (
+                    w_seg[closer],
+                    w_md[closer],
+                    w_dist[closer],
+                )
+        else:
+            pos = np.broadcast_to(self.well_positions(wells), (len(points),))
+            for well in np.unique(pos):
+                idx = np.flatnonzero(pos == well)
+                seg[idx], md[idx], dist[idx] = self._project_well(well, points[idx], k)
+        well = np.searchsorted(self.offsets, seg, side="right") - 1
+        return pd.DataFrame({"well": self.wells[well], "md": md, "distance": dist})
+
+    def to_gdf(self, three_d: bool = True) -> gpd.GeoDataFrame:
+        """Linestrings of every well with two or more stations, built in one
+        vectorized call
+
+        Args:
+            three_d (bool, optional): keep z coordinates. Defaults to True.
+
+        Returns:
+            gpd.GeoDataFrame: linestring geometry indexed by well
+        """
+        lengths = np.diff(self.offsets)
+        keep = lengths >= 2
+        rows = np.repeat(keep, lengths)
+        well = np.repeat(np.arange(len(self)), lengths)[rows]
+        coords = self.xyz[rows] if three_d else self.xyz[rows, :2]
+        lines = shapely.linestrings(
+            coords, indices=np.unique(well, return_inverse=True)[1]
+        )
+        index = pd.Index(self.wells[keep], name="well")
+        return gpd.GeoDataFrame(geometry=gpd.GeoSeries(lines, index=index))
+
+
 # Make linestrings
 def well_surveys_to_linestrings(surveys: pd.DataFrame) -> gpd.GeoDataFrame:
     """Convert a DataFrame of well surveys into a flattened linestring
@@ -60,41 +319,40 @@ def well_surveys_to_linestrings(surveys: pd.DataFrame) -> gpd.GeoDataFrame:
     Returns:
         gpd.GeoDataFrame: Well and linestring in geodataframe
     """
-    gdf = gpd.GeoDataFrame(
-        surveys, geometry=gpd.points_from_xy(surveys["x"], surveys["y"])
-    )
+    return WellTrajectory.from_surveys(surveys).to_gdf(three_d=False)
 
-    line_gdf = (
-        gdf.sort_values(by=["well", "md"])
-        .groupby(["well"])["geometry"]
-        .apply(lambda x: LineString(x.tolist()))
-    )
-    return gpd.GeoDataFrame(line_gdf, geometry="geometry")
 
-
-def stage_locs_to_gdf(stage_locs: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+def stage_locs_to_gdf(
+    stage_locs: gpd.GeoDataFrame, three_d: bool = False
+) -> gpd.GeoDataFrame:
     """Convert the stage locations to a geodataframe with multiple geometries.
     Adds center (geometry), top, bottom, and linestring to stage dataframe.
+    All geometries are built from the coordinate arrays in vectorized calls.
 
     Args:
         stage_locs (gpd.GeoDataFrame): Geodataframe of the stage locations with
         well, stage, mid xyz, top xyz, and bottom xyz columns.
+        three_d (bool, optional): keep z from the z_center_m, z_top_m, and
+        z_bottom_m columns. Defaults to False.
 
     Returns:
         gpd.GeoDataFrame: Dataframe with well, stage, and linestring
     """
-    stage_gdf = gpd.GeoDataFrame(
-        stage_locs,
-        geometry=gpd.points_from_xy(stage_locs["x_center_m"], stage_locs["y_center_m"]),
-    )
+    axes = ["x", "y", "z"] if three_d else ["x", "y"]
 
-    stage_gdf["top_pt"] = gpd.points_from_xy(
-        stage_locs["x_top_m"], stage_locs["y_top_m"]
-    )
-    stage_gdf["bot_pt"] = gpd.points_from_xy(
-        stage_locs["x_bottom_m"], stage_locs["y_bottom_m"]
+    def coords(loc):
+        return stage_locs[[f"{ax}_{loc}_m" for ax in axes]].to_numpy(float)
+
+    def geoseries(geoms):
+        return gpd.GeoSeries(geoms, index=stage_locs.index)
+
+    top, bottom = coords("top"), coords("bottom")
+    stage_gdf = gpd.GeoDataFrame(
+        stage_locs, geometry=geoseries(shapely.points(coords("center")))
     )
-    stage_gdf["stg_line"] = stage_gdf.apply(
-        lambda row: LineString([row["bot_pt"], row["top_pt"]]), axis=1
+    stage_gdf["top_pt"] = geoseries(shapely.points(top))
+    stage_gdf["bot_pt"] = geoseries(shapely.points(bottom))
+    stage_gdf["stg_line"] = geoseries(
+        shapely.linestrings(np.stack([bottom, top], axis=1))
     )
     return stage_gdf
@@ -0,0 +1,16 @@
+GOCAD TSurf 1
+HEADER {
+name:small
+}
+PROPERTIES Porosity
+TFACE
+PVRTX 10 0 0 -100 0.1
+PVRTX 11 10 0 -90 0.2
+PVRTX 12 0 10 -100 0.3
+TRGL 10 11 12
+TFACE
+VRTX 20 10 10 -90
+ATOM 21 11
+ATOM 22 12
+TRGL 21 20 22
+END
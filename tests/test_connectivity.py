@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyfracman.connectivity import fracture_intersections, stage_connectivity
+from pyfracman.fab import parse_fab_file
+
+DATA = Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def collection():
+    return parse_fab_file(DATA / "small.fab", engine="bulk", as_collection=True)
+
+
+def test_fracture_intersections(collection):
+    # 1 and 2 meet along x = 0, 0 <= y <= 6; 2 and 3 along a short piece
+    # of the line z = y + 5 in the x = 0 plane
+    pairs = fracture_intersections(collection)
+    assert pairs[["fid_a", "fid_b"]].values.tolist() == [[1, 2], [2, 3]]
+    np.testing.assert_allclose(pairs["length"], [6.0, np.sqrt(0.5)])
+
+
+@pytest.mark.parametrize("tiles", [None, (3, 2), (8, 8)])
+def test_tiled_intersections_match_serial(collection, tiles):
+    serial = fracture_intersections(collection)
+    tiled = fracture_intersections(collection, workers=2, tiles=tiles)
+    pd.testing.assert_frame_equal(tiled, serial)
+
+
+def test_stage_connectivity(collection):
+    # the first stage crosses fracture 1, the second misses every fracture,
+    # the third is a single point on the face of tessellated fracture 4
+    stages = pd.DataFrame(
+        {
+            "well": "A",
+            "stage": [1, 2, 3],
+            "x_bottom_m": [5.0, 5.0, 25.0],
+            "y_bottom_m": [5.0, 5.0, 0.0],
+            "z_bottom_m": [-1.0, 3.0, 5.0],
+            "x_top_m": [5.0, 5.0, 25.0],
+            "y_top_m": [5.0, 5.0, 0.0],
+            "z_top_m": [1.0, 3.0, 5.0],
+        }
+    )
+    result = stage_connectivity(collection, stages)
+    assert result["stage_ids"].tolist() == [[1], [], [4]]
+    assert result["connected_ids"].tolist() == [[1, 2, 3], [], [4]]
+    assert result["connected_count"].tolist() == [3, 0, 1]
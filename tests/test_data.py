@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pyfracman.data import (
+    read_f2d,
+    read_f2d_trace_file,
+    trace_length_histogram,
+    trace_p21,
+    trace_summary,
+)
+
+DATA = Path(__file__).parent / "data"
+
+# small.f2d: trace 1 strikes 350 and 10 degrees, either side of north,
+# trace 2 has a zero length segment and trace 3 strikes both ways along
+# north-south, so its directions cancel
+
+
+def test_read_f2d():
+    segments = read_f2d(DATA / "small.f2d")
+    assert segments["TraceID"].tolist() == [1, 1, 2, 3, 3]
+    assert segments["TraceID"].dtype == np.int64
+    assert (segments.drop(columns="TraceID").dtypes == np.float64).all()
+    # the set names are text
+    assert segments["Set"].isna().all()
+
+
+def test_read_f2d_derives_strike_from_trend(tmp_path):
+    text = (DATA / "small.f2d").read_text().replace("Seg_Strike", "Seg_Trend")
+    (tmp_path / "trend.f2d").write_text(text)
+    segments = read_f2d(tmp_path / "trend.f2d")
+    np.testing.assert_allclose(
+        segments["Seg_Strike[deg]"], [260.0, -80.0, 0.0, -90.0, 90.0]
+    )
+
+
+def test_trace_summary():
+    summary = trace_summary(read_f2d(DATA / "small.f2d"))
+    assert summary.index.tolist() == [1, 2, 3]
+    np.testing.assert_allclose(summary["length"], [7.0, 5.0, 2.0])
+    assert summary["n_segments"].tolist() == [2, 1, 2]
+    # 350 and 10 average to 0, not 180, and never to 360
+    np.testing.assert_allclose(summary["strike"], [0.0, 90.0, np.nan])
+    np.testing.assert_allclose(summary["dip"], [85.0, 60.0, 60.0])
+
+
+def test_trace_summary_without_total_length():
+    segments = read_f2d(DATA / "small.f2d").drop(columns="totlen[m]")
+    summary = trace_summary(segments)
+    np.testing.assert_allclose(summary["length"], [7.0, 5.0, 2.0])
+
+
+def test_strike_mean_wraps_around_north():
+    segments = pd.DataFrame(
+        {
+            "TraceID": [1, 1, 2, 2],
+            "len[m]": 1.0,
+            "Seg_Strike[deg]": [355.0, 345.0, 5.0, -15.0],
+            "Seg_VerticalDev[deg]": 90.0,
+        }
+    )
+    np.testing.assert_allclose(trace_summary(segments)["strike"], [350.0, 355.0])
+
+
+def test_read_f2d_trace_file():
+    traces = read_f2d_trace_file(DATA / "small.f2d")
+    assert traces.columns.tolist() == ["length", "strike", "dip"]
+    assert traces.index.tolist() == [0, 1, 2]
+    np.testing.assert_allclose(traces["length"], [7.0, 5.0, 2.0])
+
+
+def test_trace_p21_and_length_histogram():
+    traces = trace_summary(read_f2d(DATA / "small.f2d"))
+    assert trace_p21(traces, 10.0) == 1.4
+    histogram = trace_length_histogram(traces, bins=[0, 3, 6, 9])
+    assert histogram.values.tolist() == [[0, 3, 1], [3, 6, 1], [6, 9, 1]]
+    histogram = trace_length_histogram(traces, bins=2, log=True)
+    np.testing.assert_allclose(histogram["lower"], [2.0, np.sqrt(14)])
+    np.testing.assert_allclose(histogram["upper"], [np.sqrt(14), 7.0])
+    assert histogram["count"].tolist() == [1, 2]
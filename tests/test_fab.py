@@ -0,0 +1,195 @@
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from pyfracman.cache import DiskCache
+from pyfracman.fab import (
+    FabFile,
+    FractureCollection,
+    fab_index_path,
+    iter_fab_fractures,
+    parse_fab_file,
+    write_fab_file,
+)
+from pyfracman.fab import (
+    _iter_sections,
+    _read_record_range,
+    _record_boundaries,
+    _section_layout,
+)
+
+DATA = Path(__file__).parent / "data"
+SMALL_FAB = DATA / "small.fab"
+
+
+def assert_collections_equal(a: FractureCollection, b: FractureCollection):
+    np.testing.assert_array_equal(a.fid, b.fid)
+    np.testing.assert_array_equal(a.sets, b.sets)
+    np.testing.assert_allclose(a.normals, b.normals)
+    np.testing.assert_allclose(a.properties, b.properties)
+    np.testing.assert_array_equal(a.t_fid, b.t_fid)
+    np.testing.assert_array_equal(a.t_sets, b.t_sets)
+    for name in ("vertices", "t_nodes", "t_faces", "t_properties"):
+        ragged_a, ragged_b = getattr(a, name), getattr(b, name)
+        np.testing.assert_array_equal(ragged_a.offsets, ragged_b.offsets)
+        np.testing.assert_allclose(ragged_a.values, ragged_b.values)
+    assert a.prop_dict == b.prop_dict
+    assert a.set_dict == b.set_dict
+
+
+@pytest.fixture
+def bulk():
+    return parse_fab_file(SMALL_FAB, engine="bulk", as_collection=True)
+
+
+@pytest.mark.parametrize("as_collection", [True, False])
+def test_write_keeps_set_names(bulk, tmp_path, as_collection):
+    output = parse_fab_file(SMALL_FAB, as_collection=as_collection)
+    write_fab_file(output, tmp_path / "out.fab")
+    written = parse_fab_file(tmp_path / "out.fab", engine="bulk", as_collection=True)
+    assert written.set_dict == {"Set1": "Set A", "Set2": "Set B"}
+    assert_collections_equal(written, bulk)
+
+
+@pytest.fixture
+def line():
+    return FractureCollection.from_dict(parse_fab_file(SMALL_FAB))
+
+
+def test_line_and_bulk_engines_agree(line, bulk):
+    assert_collections_equal(line, bulk)
+
+
+@pytest.mark.parametrize(
+    "pattern, repl",
+    [
+        # normals on the line of the last vertex
+        (r"\n\s+0 ", " 0 "),
+        # vertices 2 to 5 on the line of the one before
+        (r"\n(\s+[2-5] )", r"\1"),
+        # blank lines before the first vertices
+        (r"\n(\s+1 )", r"\n\n\1"),
+    ],
+)
+def test_bulk_engine_reads_wrapped_records(bulk, tmp_path, pattern, repl):
+    # record starts are guessed from the line layout, and checked against
+    # the counts in the headers
+    text = SMALL_FAB.read_text()
+    start = text.index("BEGIN FRACTURE\n") + 15
+    stop = text.index("END FRACTURE")
+    wrapped = tmp_path / "wrapped.fab"
+    wrapped.write_text(
+        text[:start] + re.sub(pattern, repl, text[start:stop]) + text[stop:]
+    )
+    assert_collections_equal(
+        parse_fab_file(wrapped, engine="bulk", as_collection=True), bulk
+    )
+
+
+@pytest.fixture
+def large_fab(tmp_path, bulk):
+    # repeat the fixture fractures under new ids, so a parallel parse has
+    # several record aligned ranges to split the sections into
+    n_copies = 200
+    copies = []
+    for i in range(n_copies):
+        copy = bulk.select()
+        copy.fid = bulk.fid + 10 * i
+        copy.t_fid = bulk.t_fid + 10 * i
+        copies.append(copy)
+    path = tmp_path / "large.fab"
+    write_fab_file(FractureCollection.concat(copies), path)
+    return path
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_parallel_parse_matches_serial(large_fab, workers):
+    serial = parse_fab_file(large_fab, engine="bulk", as_collection=True)
+    parallel = parse_fab_file(large_fab, as_collection=True, workers=workers)
+    assert len(serial.fid) == 600
+    assert_collections_equal(parallel, serial)
+    line = FractureCollection.from_dict(parse_fab_file(large_fab))
+    assert_collections_equal(line, serial)
+
+
+def test_cached_parse_matches(bulk, tmp_path):
+    cache_dir = tmp_path / "cache"
+    first = parse_fab_file(SMALL_FAB, as_collection=True, cache_dir=cache_dir)
+    second = parse_fab_file(SMALL_FAB, as_collection=True, cache_dir=cache_dir)
+    assert_collections_equal(first, bulk)
+    assert_collections_equal(second, bulk)
+
+
+def test_cache_skips_entries_in_use(tmp_path, monkeypatch):
+    # Windows refuses to move or delete memory mapped files
+    cache = DiskCache(tmp_path / "cache", max_bytes=0)
+    cache.put("old", lambda d: (d / "a.npy").write_bytes(b"x" * 64))
+    locked = cache.entry_path("old")
+    os_replace = os.replace
+
+    def replace(src, dst):
+        if Path(src) == locked:
+            raise PermissionError(src)
+        os_replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", replace)
+    assert not cache.invalidate("old")
+    assert cache.put("old", lambda d: None) is None
+    cache.put("new", lambda d: None)
+    assert {key for _, _, key in cache.entries()} == {"old", "new"}
+    assert (locked / "a.npy").read_bytes() == b"x" * 64
+
+
+def test_iter_fab_fractures_matches(large_fab):
+    serial = parse_fab_file(large_fab, engine="bulk", as_collection=True)
+    batches = list(iter_fab_fractures(large_fab, chunk_size=7, block_bytes=256))
+    assert all(len(batch.fid) == 7 for batch in batches[:-1])
+    streamed = FractureCollection.concat(batches)
+    np.testing.assert_array_equal(streamed.fid, serial.fid)
+    np.testing.assert_allclose(streamed.vertices.values, serial.vertices.values)
+    np.testing.assert_allclose(streamed.properties, serial.properties)
+
+
+def test_fab_file_random_access(large_fab, tmp_path):
+    serial = parse_fab_file(large_fab, engine="bulk", as_collection=True)
+    ids = [1193, 2, 5, 604, 33]
+    with FabFile(large_fab) as fab:
+        assert fab_index_path(large_fab).exists()
+        picked = fab.get(ids)
+        by_set = fab.get_sets([2])
+        with pytest.raises(KeyError):
+            fab.get([9999])
+    polygonal = [i for i in ids if i in serial.fid]
+    tessellated = [i for i in ids if i in serial.t_fid]
+    rows = [np.flatnonzero(serial.fid == i)[0] for i in polygonal]
+    t_rows = [np.flatnonzero(serial.t_fid == i)[0] for i in tessellated]
+    assert_collections_equal(picked, serial.select(rows, t_rows))
+    sel = serial.select(
+        np.flatnonzero(serial.sets == 2), np.flatnonzero(serial.t_sets == 2)
+    )
+    assert_collections_equal(by_set, sel)
+
+    # a reopened file reuses the saved index
+    with FabFile(large_fab, workers=2, rebuild=True) as rebuilt:
+        with FabFile(large_fab) as reopened:
+            for key in ("fid", "offset", "length", "section"):
+                np.testing.assert_array_equal(rebuilt.index[key], reopened.index[key])
+
+
+@pytest.mark.parametrize("section", ["FRACTURE", "TESSFRACTURE"])
+def test_record_boundaries_split_whole_records(large_fab, section):
+    buf = large_fab.read_bytes()
+    _, start, stop = next(s for s in _iter_sections(buf) if s[0] == section)
+    bounds = _record_boundaries(buf, start, stop, section, 3)
+    assert len(bounds) == 4
+    layout = _section_layout(buf[start:stop], section)
+    # raises if a range does not start and end on a record boundary
+    parts = [
+        _read_record_range(large_fab, section, a, b, layout)
+        for a, b in zip(bounds[:-1], bounds[1:])
+    ]
+    expected = 600 if section == "FRACTURE" else 400
+    assert sum(len(part[0]) for part in parts) == expected
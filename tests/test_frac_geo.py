@@ -0,0 +1,203 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from pyfracman.data import clean_columns
+from pyfracman.fab import RaggedArray, parse_fab_file
+from pyfracman.frac_geo import (
+    FractureIndex,
+    connection_set_stats,
+    connection_stats_dir,
+    flatten_fracs,
+    fracture_attributes,
+    get_fracture_set_stats,
+    read_connections,
+    tess_face_geometry,
+    tess_fracture_summary,
+)
+
+DATA = Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def collection():
+    return parse_fab_file(DATA / "small.fab", engine="bulk", as_collection=True)
+
+
+def test_tess_face_geometry(collection):
+    areas, centroids = tess_face_geometry(collection)
+    np.testing.assert_allclose(areas, [50.0, 50.0, 6.0])
+    np.testing.assert_allclose(
+        centroids,
+        [[80 / 3, 0.0, 10 / 3], [70 / 3, 0.0, 20 / 3], [4 / 3, 20.0, 1.0]],
+    )
+
+
+def test_tess_fracture_summary(collection):
+    summary = tess_fracture_summary(collection)
+    assert summary.index.tolist() == [4, 5]
+    np.testing.assert_allclose(summary["area"], [100.0, 6.0])
+    np.testing.assert_allclose(summary[["x", "y", "z"]].iloc[0], [25.0, 0.0, 5.0])
+    np.testing.assert_allclose(summary["Aperture_mean"], [0.02, 0.05])
+    np.testing.assert_allclose(summary["Aperture_min"], [0.01, 0.05])
+    np.testing.assert_allclose(summary["Aperture_max"], [0.03, 0.05])
+
+
+def test_tess_face_layout_is_checked(collection):
+    # FaceID NumNodes N1 N2 N3 would put a node number in the flag column
+    faces = collection.t_faces.values.copy()
+    faces[:, 1:5] = [[3, 1, 2, 3], [3, 1, 3, 4], [3, 1, 2, 3]]
+    collection.t_faces = RaggedArray(faces, collection.t_faces.offsets)
+    with pytest.raises(ValueError):
+        collection.tess_triangles()
+
+
+@pytest.mark.parametrize(
+    "z_val, traced",
+    [
+        # fracture 1 is flat, and at z 7 only fractures 3 and 4 span z_val
+        (None, [2, 3, 4, 5]),
+        (7.0, [3, 4]),
+    ],
+)
+def test_flatten_fracs_skips_untraced_fractures(collection, z_val, traced):
+    flat = flatten_fracs(collection, z_val=z_val)
+    assert flat.index.tolist() == [1, 2, 3, 4, 5]
+    assert flat.index[flat.geometry.notna()].tolist() == traced
+    if z_val is not None:
+        # fracture 3 lies on the plane z - y = 5
+        np.testing.assert_allclose(shapely.get_coordinates(flat.geometry[3])[:, 1], 2.0)
+
+
+@pytest.mark.parametrize(
+    "z_range, distance, expected",
+    [
+        # inside the footprint and z range of the dipping fracture 3, but
+        # below its plane
+        ((1.0, 6.0), 0.0, []),
+        ((1.0, 8.0), 0.0, [3]),
+        ((1.0, 6.0), 1.5, [1, 3]),
+    ],
+)
+def test_fracture_index_query_lines_is_exact(collection, z_range, distance, expected):
+    well = shapely.linestrings([[2.0, 2.0, z_range[0]], [2.0, 2.0, z_range[1]]])
+    hits = FractureIndex(collection).query_lines([well], distance)
+    assert hits["fid"].tolist() == expected
+
+
+def test_fracture_attributes(collection):
+    attrs = fracture_attributes(collection)
+    assert attrs.index.tolist() == [1, 2, 3, 4, 5]
+    assert attrs["set"].tolist() == [1, 2, 1, 2, 1]
+    area = [100.0, 18.0, 20 * np.sqrt(2), 100.0, 6.0]
+    np.testing.assert_allclose(attrs["area"], area)
+    np.testing.assert_allclose(attrs["radius"], np.sqrt(np.array(area) / np.pi))
+    # the pentagon centroid is that of its plan view outline, on z = y + 5
+    np.testing.assert_allclose(
+        attrs[["x", "y", "z"]],
+        [
+            [5.0, 5.0, 0.0],
+            [0.0, 2.0, 2.0],
+            [2.0, 38 / 15, 38 / 15 + 5],
+            [25.0, 0.0, 5.0],
+            [4 / 3, 20.0, 1.0],
+        ],
+    )
+    np.testing.assert_allclose(attrs["dip"], [0.0, 90.0, 45.0, 90.0, 90.0])
+    np.testing.assert_allclose(attrs.loc[[2, 3], "dip_direction"], [90.0, 180.0])
+    np.testing.assert_allclose(attrs.loc[[2, 3], "strike"], [0.0, 90.0])
+    # fractures carry one aperture, tessellated fractures one per face
+    np.testing.assert_allclose(
+        attrs["volume"],
+        [0.1, 0.036, 0.06 * np.sqrt(2), 50 * 0.01 + 50 * 0.03, 6 * 0.05],
+    )
+    assert "volume" not in fracture_attributes(collection, aperture="Width")
+
+
+CONNECTIONS = """Object  FracID  FractureRadius  Set_Name
+StageConnection_A6_Stage_1  7  -9999  Set_A
+StageConnection_A6_Stage_1  6  -9999  Set_B
+StageConnection_A6_Stage_1  5  -9999  Set_A
+StageConnection_A6_Stage_10  3  -9999  Set_A
+StageConnection_A6_Stage_2  4  -9999  Set_B
+StageConnection_B1_Stage_3  9  -9999  Set_A
+"""
+
+
+@pytest.fixture
+def connections(tmp_path):
+    path = tmp_path / "A6_Connections.txt"
+    path.write_text(CONNECTIONS)
+    return path
+
+
+def test_connection_set_stats(connections):
+    stats = connection_set_stats(read_connections(connections))
+    assert stats["object"].astype(str).tolist() == [
+        "StageConnection_A6_Stage_1",
+        "StageConnection_A6_Stage_1",
+        "StageConnection_A6_Stage_10",
+        "StageConnection_A6_Stage_2",
+        "StageConnection_B1_Stage_3",
+    ]
+    assert stats["well"].tolist() == ["A6", "A6", "A6", "A6", "B1"]
+    assert stats["stage_no"].tolist() == ["1", "1", "10", "2", "3"]
+    assert stats["fractureset"].astype(str).tolist() == [
+        "Set_A",
+        "Set_B",
+        "Set_A",
+        "Set_B",
+        "Set_A",
+    ]
+    assert stats["count"].tolist() == [2, 1, 1, 1, 1]
+    assert stats["ids"].tolist() == [[7, 5], [6], [3], [4], [9]]
+    only_b = connection_set_stats(read_connections(connections), ["Set_B"])
+    assert only_b["ids"].tolist() == [[6], [4]]
+
+
+def test_connection_stats_dir(connections, tmp_path):
+    (tmp_path / "run_2").mkdir()
+    (tmp_path / "run_2" / "B1_Connections.txt").write_text(
+        CONNECTIONS.splitlines()[0] + "\nStageConnection_B1_Stage_4  2  -9999  Set_B\n"
+    )
+    serial = connection_stats_dir(tmp_path, sets=["Set_B"])
+    assert serial["file"].astype(str).tolist() == [
+        str(connections),
+        str(connections),
+        str(tmp_path / "run_2" / "B1_Connections.txt"),
+    ]
+    assert serial["ids"].tolist() == [[6], [4], [2]]
+    parallel = connection_stats_dir(tmp_path, sets=["Set_B"], workers=2)
+    pd.testing.assert_frame_equal(parallel, serial)
+    assert connection_stats_dir(tmp_path / "run_2", pattern="*.csv").empty
+
+
+def baseline_set_stats(fpath, set_name, set_alias):
+    "get_fracture_set_stats as first written, before the grouped pass"
+    conn = pd.read_csv(fpath, sep=r"\s+").rename(columns={"Set_Name": "FractureSet"})
+    conn.columns = clean_columns(conn.columns)
+    set_ids = (
+        conn.query("fractureset == @set_name").groupby("object")["fracid"].apply(list)
+    )
+    set_ids.name = set_alias + "_ids"
+    set_ct = conn.query("fractureset == @set_name").groupby("object").count().iloc[:, 0]
+    set_ct.name = set_alias + "_count"
+    stages = conn.groupby("object").count().reset_index()
+    stages["stage_no"] = stages.object.str.split("_").str[-1]
+    stages["well"] = stages.object.str.split("_").str[-3]
+    return (
+        stages[["stage_no", "well", "object"]]
+        .merge(set_ids, left_on="object", right_index=True)
+        .merge(set_ct, left_on="object", right_index=True)
+    )
+
+
+@pytest.mark.parametrize("set_name", ["Set_A", "Set_B"])
+def test_get_fracture_set_stats_matches_baseline(connections, set_name):
+    pd.testing.assert_frame_equal(
+        get_fracture_set_stats(connections, set_name, "a"),
+        baseline_set_stats(connections, set_name, "a"),
+    )
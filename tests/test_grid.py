@@ -0,0 +1,52 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from pyfracman.fab import RaggedArray, parse_fab_file
+from pyfracman.grid import VoxelGrid, upscale_fractures
+
+DATA = Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def collection():
+    return parse_fab_file(DATA / "small.fab", engine="bulk", as_collection=True)
+
+
+@pytest.fixture
+def grid():
+    # cell faces clear of the fracture planes at x, y, z = 0
+    return VoxelGrid.from_bounds([-12.5, -12.5, -12.5], [40, 30, 20], 5)
+
+
+@pytest.mark.parametrize("method", ["exact", "sampled"])
+def test_upscale_keeps_total_area(collection, grid, method):
+    # 100 + 18 + 20 * sqrt(2) for the fractures, 100 + 6 for the tess faces
+    cubes = upscale_fractures(collection, grid, method=method, block_shape=4)
+    assert cubes["p32"].shape == grid.shape
+    np.testing.assert_allclose(
+        cubes["p32"].sum() * grid.cell_volume, 224 + 20 * np.sqrt(2)
+    )
+
+
+def test_exact_and_sampled_agree(collection, grid):
+    exact = upscale_fractures(collection, grid, ["Aperture"])
+    sampled = upscale_fractures(collection, grid, ["Aperture"], method="sampled")
+    np.testing.assert_allclose(sampled["p32"], exact["p32"], atol=0.02)
+    np.testing.assert_allclose(
+        sampled["Aperture"], exact["Aperture"], rtol=0.1, equal_nan=True
+    )
+
+
+def test_property_missing_from_tess_faces(collection):
+    # the faces carry only two numbered properties, so Aperture is known for
+    # the polygonal fractures alone; the first cell holds fractures 1 to 3
+    # and the face of fracture 5, the second cell the faces of fracture 4
+    t_props = collection.t_properties
+    collection.t_properties = RaggedArray(t_props.values[:, :2], t_props.offsets)
+    grid = VoxelGrid([-10, -10, -10], [25, 50, 50], [2, 1, 1])
+    cubes = upscale_fractures(collection, grid, ["Aperture"])
+    areas = np.array([100, 18, 20 * np.sqrt(2)])
+    mean = (areas * [0.001, 0.002, 0.003]).sum() / areas.sum()
+    np.testing.assert_allclose(cubes["Aperture"].ravel(), [mean, np.nan])
@@ -0,0 +1,138 @@
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyfracman.pest import (
+    EnsembleRunner,
+    PestGenerator,
+    fill_template,
+    read_instruction_file,
+)
+
+CONFIG = {
+    "control data": {
+        "restart": False,
+        "mode": "estimation",
+        "parameters": 3,
+        "observations": 1,
+        "parameter groups": 1,
+        "priors": 1,
+        "observation groups": 1,
+        "doaui": True,
+    },
+    "parameter groups": {"p32": {"derinc": 0.001}},
+    "parameter data": {
+        "p32_a": {"parval1": 0.01, "parlbnd": 0.001, "parubnd": 0.1, "pargp": "p32"},
+        "p32_b": {"parval1": 0.01, "parlbnd": 0.001, "parubnd": 0.1, "pargp": "p32"},
+        "p32_c": {
+            "parval1": 0.01,
+            "parlbnd": 0.001,
+            "parubnd": 0.1,
+            "pargp": "p32",
+            "partrans": "tied",
+            "partied": "p32_a",
+        },
+    },
+    "observation groups": {"lengths": {}},
+    "observation data": {"total_length": {"obsval": 100.0, "obgnme": "lengths"}},
+    "model command line": {"command": "python run_simulation.py model.fmf"},
+    "model input/output": {
+        "templates": [["model.ptf", "model.fmf"]],
+        "instructions": [["output.pin", "trace_length.sts"]],
+    },
+    "prior information": {
+        "pi1": {"equation": "1.0 * log(p32_a)", "pival": -2.0, "obgnme": "lengths"}
+    },
+}
+
+
+def write_config(tmp_path, config):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(config))
+    generator = PestGenerator(path)
+    generator.parse_config()
+    return generator
+
+
+def test_write_pst_file(tmp_path):
+    generator = write_config(tmp_path, CONFIG)
+    generator.write_pst_file("case.pst")
+    lines = (tmp_path / "case.pst").read_text().splitlines()
+    assert lines[:4] == [
+        "pcf",
+        "* control data",
+        "norestart  estimation",
+        "3  1  1  1  1",
+    ]
+    assert lines[7] == "0.1  aui"
+    start = lines.index("* parameter data")
+    assert lines[start + 3].split()[:2] == ["p32_c", "tied"]
+    assert lines[start + 4] == "p32_c  p32_a"
+    assert lines[start + 5] == "* observation groups"
+    assert lines[-2:] == [
+        "* prior information",
+        "pi1  1.0 * log(p32_a)  =  -2.0  1.0  lengths",
+    ]
+
+
+@pytest.mark.parametrize(
+    "section, name, update",
+    [
+        # tied without a parent, tied to a fixed parameter, prior count mismatch
+        ("parameter data", "p32_c", {"partied": None}),
+        ("parameter data", "p32_a", {"partrans": "fixed"}),
+        ("prior information", "pi2", {"equation": "1.0 * p32_b", "pival": 0.0}),
+    ],
+)
+def test_invalid_config_is_rejected(tmp_path, section, name, update):
+    config = json.loads(json.dumps(CONFIG))
+    config[section].setdefault(name, {"obgnme": "lengths"}).update(update)
+    with pytest.raises(AssertionError):
+        write_config(tmp_path, config)
+
+
+def test_fill_template(tmp_path):
+    (tmp_path / "model.ptf").write_text("ptf $\nP32 $  p32_a   $ end\n")
+    fill_template(tmp_path / "model.ptf", tmp_path / "model.fmf", {"P32_A": 0.0125})
+    assert (tmp_path / "model.fmf").read_text() == "P32       0.0125 end\n"
+
+
+def test_read_instruction_file(tmp_path):
+    (tmp_path / "output.pin").write_text(
+        "pif @\nl1 w w !b! w !c!\n@total@ !t!\nl1 [f]6:9\n"
+    )
+    (tmp_path / "trace_length.sts").write_text(
+        "vals 1 2 3\nheader\ntotal 12.5\nfix  3.25 x\n"
+    )
+    obs = read_instruction_file(tmp_path / "output.pin", tmp_path / "trace_length.sts")
+    assert obs == {"b": 2.0, "c": 3.0, "t": 12.5, "f": 3.25}
+
+
+def test_whitespace_instruction_needs_whitespace(tmp_path):
+    (tmp_path / "output.pin").write_text("pif @\nl1 w w !b!\n")
+    (tmp_path / "trace_length.sts").write_text("vals 1\n")
+    with pytest.raises(ValueError):
+        read_instruction_file(tmp_path / "output.pin", tmp_path / "trace_length.sts")
+
+
+def test_ensemble_records_failed_realizations(tmp_path):
+    config = json.loads(json.dumps(CONFIG))
+    config["model command line"]["command"] = f'"{sys.executable}" model.py'
+    generator = write_config(tmp_path, config)
+    (tmp_path / "model.ptf").write_text("ptf $\n$a$\n")
+    (tmp_path / "output.pin").write_text("pif @\nl1 !total_length!\n")
+    (tmp_path / "model.py").write_text(
+        "value = float(open('model.fmf').read())\n"
+        "open('trace_length.sts', 'w').write(str(value * 100))\n"
+    )
+    runner = EnsembleRunner(
+        generator, ["model.py"], workers=2, workdir_root=tmp_path / "ensemble"
+    )
+    # 12345 does not fit in the 3 character marker
+    ensemble = pd.DataFrame({"a": [0.5, 12345.0, 2.0]})
+    with pytest.warns(UserWarning, match="Realization 1 failed"):
+        obs = runner.run(ensemble)
+    np.testing.assert_allclose(obs["total_length"], [50.0, np.nan, 200.0])
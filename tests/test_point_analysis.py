@@ -0,0 +1,186 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.spatial.distance import pdist
+
+from pyfracman.fab import parse_fab_file
+from pyfracman.point_analysis import (
+    csr_envelope,
+    event_fracture_distances,
+    iter_events,
+    magnitude_histogram,
+    pair_correlation,
+    read_asc_file,
+    read_ors_file,
+    ripley_k,
+    ripley_l,
+    spatial_bin_counts,
+    stage_event_counts,
+)
+
+DATA = Path(__file__).parent / "data"
+
+ORS = """X  Y  Z  Magnitude  Stage  Well
+1  2  -3000  -1  1  Well A
+ 4.0  5  -3001  -2  2  Well B\t
+10.5  11.5  -2999.5  -0.75  2  Well B
+"""
+
+ASC = """Events
+Exported from FracMan
+4 columns
+X
+Y
+Z
+Magnitude
+1 2 -3000 -1
+4.0 5 -3001 -2
+10.5 11.5 -2999.5 -0.75
+"""
+
+
+@pytest.fixture
+def ors_file(tmp_path):
+    path = tmp_path / "events.ors"
+    path.write_text(ORS)
+    return path
+
+
+@pytest.fixture
+def asc_file(tmp_path):
+    path = tmp_path / "events.asc"
+    path.write_text(ASC)
+    return path
+
+
+def test_read_ors_file_matches_python_engine(ors_file):
+    events = read_ors_file(ors_file)
+    expected = pd.read_csv(
+        ors_file,
+        skiprows=1,
+        index_col=False,
+        sep=r"\s{2,}",
+        names=["X", "Y", "Z", "Magnitude", "Stage", "Well"],
+        engine="python",
+    )
+    pd.testing.assert_frame_equal(events, expected)
+    assert events["Well"].tolist() == ["Well A", "Well B", "Well B"]
+
+
+def test_event_columns_keep_their_dtypes(ors_file, asc_file):
+    # the first chunk only holds whole coordinates and magnitudes
+    chunk = next(iter_events(ors_file, chunksize=1))
+    assert (chunk.dtypes[["X", "Y", "Z", "Magnitude"]] == np.float64).all()
+    events = read_asc_file(asc_file)
+    pd.testing.assert_frame_equal(events, read_ors_file(ors_file).iloc[:, :4])
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 10])
+def test_iter_events(ors_file, chunksize):
+    chunks = list(iter_events(ors_file, chunksize=chunksize))
+    assert len(chunks) == -(-3 // chunksize)
+    events = pd.concat(chunks, ignore_index=True)
+    pd.testing.assert_frame_equal(events, read_ors_file(ors_file))
+    chunk = next(iter_events(ors_file, usecols=["Stage", "Well"]))
+    assert chunk.columns.tolist() == ["Stage", "Well"]
+
+
+@pytest.mark.parametrize("chunksize", [1, 10])
+def test_chunked_reducers(ors_file, asc_file, chunksize):
+    counts = stage_event_counts(ors_file, chunksize=chunksize)
+    assert counts.to_dict() == {1: 1, 2: 2}
+    counts = stage_event_counts(ors_file, by=["Well", "Stage"], chunksize=chunksize)
+    assert counts.to_dict() == {("Well A", 1): 1, ("Well B", 2): 2}
+
+    # -2 in the first bin, -1 and -0.75 in the second, nothing outside
+    counts, bins = magnitude_histogram(asc_file, [-2.5, -1.5, -0.5], chunksize=2)
+    np.testing.assert_array_equal(counts, [1, 2])
+
+    cells = spatial_bin_counts(ors_file, 5.0, chunksize=chunksize)
+    assert cells.to_dict() == {(0, 0): 1, (0, 1): 1, (2, 2): 1}
+    cells = spatial_bin_counts(
+        ors_file, 5.0, ("X", "Y", "Z"), origin=(0, 0, -3005), chunksize=chunksize
+    )
+    assert cells.to_dict() == {(0, 0, 1): 1, (0, 1, 0): 1, (2, 2, 1): 1}
+
+
+def brute_force_k(points, radii, lo, hi, border=False):
+    "Ripley's K from every pairwise distance"
+    dist = np.linalg.norm(points[:, None] - points[None], axis=2)
+    np.fill_diagonal(dist, np.inf)
+    edge = np.minimum(points - lo, hi - points).min(axis=1)
+    volume = np.prod(hi - lo)
+    k = []
+    for r in radii:
+        centres = edge >= r if border else np.ones(len(points), dtype=bool)
+        pairs = (dist[centres] <= r).sum()
+        k.append(volume * pairs / (centres.sum() * (len(points) - 1)))
+    return np.array(k)
+
+
+@pytest.mark.parametrize("dim", [2, 3])
+def test_ripley_k_counts_pairs(dim):
+    points = np.random.default_rng(0).uniform(0, 10, (200, dim))
+    bounds = np.array([np.zeros(dim), np.full(dim, 10.0)])
+    radii = np.linspace(0, 3, 7)
+    np.testing.assert_allclose(
+        ripley_k(points, radii, bounds), brute_force_k(points, radii, *bounds)
+    )
+    np.testing.assert_allclose(
+        ripley_k(points, radii, bounds, edge_correction="border"),
+        brute_force_k(points, radii, *bounds, border=True),
+    )
+    with pytest.raises(ValueError):
+        ripley_k(points, radii, bounds, edge_correction="torus")
+
+
+def test_ripley_l_and_pair_correlation():
+    # the corners of a unit square: 8 ordered pairs 1 apart, 4 at sqrt(2)
+    square = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+    radii = np.array([0.5, 1.0, 1.5])
+    k = ripley_k(square, radii)
+    np.testing.assert_allclose(k, [0.0, 8 / 12, 1.0])
+    np.testing.assert_allclose(ripley_l(square, radii), np.sqrt(k / np.pi))
+
+    points = np.random.default_rng(1).uniform(0, 10, (300, 3))
+    radii = np.array([0.5, 1.0, 2.0])
+    r, g = pair_correlation(points, radii)
+    np.testing.assert_allclose(r, [0.75, 1.5])
+    volume = np.prod(np.ptp(points, axis=0))
+    dist = pdist(points)
+    shells = np.histogram(dist, radii)[0] * 2
+    expected = volume * shells / (300 * 299) / np.diff(4 / 3 * np.pi * radii**3)
+    np.testing.assert_allclose(g, expected)
+
+
+@pytest.mark.parametrize("stat", ["K", "L", "G", "F"])
+def test_csr_envelope(stat):
+    bounds = [[0, 0], [10, 10]]
+    radii = np.linspace(0.5, 2, 4)
+    serial = csr_envelope(50, bounds, radii, stat, n_sims=9, seed=2)
+    assert serial.columns.tolist() == ["r", "mean", "lower", "upper"]
+    assert (serial["lower"] <= serial["mean"]).all()
+    assert (serial["mean"] <= serial["upper"]).all()
+    parallel = csr_envelope(50, bounds, radii, stat, n_sims=9, workers=2, seed=2)
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+def test_csr_envelope_rejects_unknown_statistics():
+    with pytest.raises(ValueError):
+        csr_envelope(10, [[0, 0], [1, 1]], [0.5], stat="J")
+
+
+def test_event_fracture_distances():
+    collection = parse_fab_file(DATA / "small.fab", engine="bulk", as_collection=True)
+    # 2 below fracture 1, 3 off the faces of tessellated fracture 4
+    found = event_fracture_distances([[5.0, 5.0, -2.0], [25.0, 3.0, 5.0]], collection)
+    np.testing.assert_allclose(found["distance"], [2.0, 3.0])
+    assert found["fid"].tolist() == [1, 4]
+
+    # one candidate in the first pass, the second pass must find the rest
+    points = np.random.default_rng(3).uniform(-10, 40, (200, 3))
+    found = event_fracture_distances(points, collection, k=1)
+    everything = event_fracture_distances(points, collection, k=6)
+    pd.testing.assert_frame_equal(found, everything)
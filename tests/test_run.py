@@ -0,0 +1,114 @@
+import asyncio
+import sys
+
+import pytest
+
+from pyfracman.run import AsyncFracmanRunner, FracmanRunner, RunCache, RunPool
+
+# stands in for FracMan: sleeps for the seconds given in the macro, then
+# writes the macro text to out.txt in its working directory
+STUB = """
+import sys, time
+text = open(sys.argv[1]).read()
+time.sleep(float(text.split()[0]))
+open("out.txt", "w").write(text)
+"""
+
+
+@pytest.fixture
+def runner(tmp_path):
+    stub = tmp_path / "stub.py"
+    stub.write_text(STUB)
+    runner = FracmanRunner()
+    runner.fracman_exe_path = [sys.executable, stub]
+    runner.check_interval_s = 0.05
+    runner.time_out = 2.0
+    return runner
+
+
+def write_macro(path, seconds):
+    path.write_text("{0}\n".format(seconds))
+    return path
+
+
+def test_run_pool(runner, tmp_path):
+    macros = [
+        write_macro(tmp_path / "fast.fmf", 0.1),
+        write_macro(tmp_path / "slow.fmf", 30),
+        tmp_path / "missing.fmf",
+    ]
+    pool = RunPool(runner, max_workers=3, workdir_root=tmp_path / "runs")
+    results = pool.run(macros)
+    assert [r.status for r in results] == ["NORMAL_FINISH", "TIME_OUT", "FAILED"]
+    assert [r.macro_filepath for r in results] == [str(m) for m in macros]
+    assert results[0].exit_code == 0
+    assert results[1].wall_time_s < 15
+    workdir = tmp_path / "runs" / "run_0000_fast"
+    assert (workdir / "out.txt").read_text() == "0.1\n"
+
+    # rerunning replaces the earlier run directories
+    with pytest.warns(UserWarning, match="Replacing existing run directory"):
+        results = pool.run(macros[:1])
+    assert results[0].status == "NORMAL_FINISH"
+
+
+def never_responding(pid, cwd):
+    return lambda: False
+
+
+@pytest.mark.parametrize(
+    "seconds, probe, status",
+    [
+        (0.1, None, "NORMAL_FINISH"),
+        (30, None, "TIME_OUT"),
+        (30, never_responding, "NOT_RESPONDING"),
+    ],
+)
+def test_async_runner(runner, tmp_path, seconds, probe, status):
+    runner.maxnon_responded_time = 0.2
+    macro = write_macro(tmp_path / "macro.fmf", seconds)
+    kwargs = {} if probe is None else {"probe": probe}
+    result = asyncio.run(AsyncFracmanRunner(runner, **kwargs).run(macro, tmp_path))
+    assert result.status == status
+    assert result.wall_time_s < 15
+    assert (tmp_path / "out.txt").exists() == (status == "NORMAL_FINISH")
+
+
+def test_async_run_many(runner, tmp_path):
+    macros = [write_macro(tmp_path / "m{0}.fmf".format(i), 0.1) for i in range(3)]
+    macros.append(tmp_path / "missing.fmf")
+    results = AsyncFracmanRunner(runner).run_all(
+        macros, max_concurrent=2, workdir_root=tmp_path / "runs"
+    )
+    assert [r.status for r in results] == ["NORMAL_FINISH"] * 3 + ["FAILED"]
+    assert [r.macro_filepath for r in results] == [str(m) for m in macros]
+
+
+def test_run_cache(runner, tmp_path, monkeypatch):
+    workdir = tmp_path / "run"
+    (workdir / "data").mkdir(parents=True)
+    (workdir / "data" / "in.dat").write_text("1\n")
+    macro = workdir / "macro.fmf"
+    macro.write_text('0.1\nload "data/in.dat"\n')
+    cache = RunCache(tmp_path / "cache", outputs=["out.txt"])
+    # run from another directory, paths are relative to the run directory
+    monkeypatch.chdir(tmp_path)
+
+    def run():
+        return cache.run(runner, "macro.fmf", cwd=workdir).status
+
+    assert run() == "NORMAL_FINISH"
+    (workdir / "out.txt").unlink()
+    assert run() == "CACHED"
+    assert (workdir / "out.txt").read_text() == macro.read_text()
+
+    (workdir / "data" / "in.dat").write_text("2\n")
+    assert run() == "NORMAL_FINISH"
+    macro.write_text('0.2\nload "data/in.dat"\n')
+    assert run() == "NORMAL_FINISH"
+    assert run() == "CACHED"
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 3, 3)
+    cache.clear()
+    assert cache.stats()["entries"] == 0
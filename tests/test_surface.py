@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from pyfracman.surface import Surface, assign_formations, read_tsurf
+
+DATA = Path(__file__).parent / "data"
+
+# small.ts: the plane z = x - 100 over 0 <= x, y <= 10, in two TFACEs, the
+# second built from ATOM references to vertices of the first
+SQUARE = np.array([[0.0, 0.0], [10.0, 0.0], [0.0, 10.0], [10.0, 10.0]])
+
+
+def flat(z: float) -> Surface:
+    "Horizontal surface at z over the same square"
+    vertices = np.column_stack([SQUARE, np.full(4, z)])
+    return Surface(vertices, [[0, 1, 2], [1, 3, 2]])
+
+
+@pytest.fixture
+def tilted():
+    return Surface.from_tsurf(DATA / "small.ts")
+
+
+def test_read_tsurf():
+    vertices, triangles = read_tsurf(DATA / "small.ts")
+    np.testing.assert_array_equal(
+        vertices,
+        [
+            [0, 0, -100],
+            [10, 0, -90],
+            [0, 10, -100],
+            [10, 10, -90],
+            [10, 0, -90],
+            [0, 10, -100],
+        ],
+    )
+    np.testing.assert_array_equal(triangles, [[0, 1, 2], [4, 3, 5]])
+
+
+def test_depth_at(tilted):
+    z = tilted.depth_at([2.0, 7.5, 10.0, 20.0], [3.0, 9.0, 10.0, 3.0])
+    np.testing.assert_allclose(z, [-98.0, -92.5, -90.0, np.nan])
+    above = tilted.is_above([[2.0, 3.0, -97.0], [2.0, 3.0, -99.0], [20, 3, 0]])
+    assert above.tolist() == [True, False, False]
+
+
+def test_assign_formations(tilted):
+    # above the first top, in A, in B, below the base and outside the surfaces
+    points = [
+        [5.0, 5.0, 10.0],
+        [5.0, 5.0, -50.0],
+        [5.0, 5.0, -150.0],
+        [5.0, 5.0, -250.0],
+        [50.0, 5.0, -50.0],
+    ]
+    formations = assign_formations(points, {"A": flat(0.0), "B": tilted}, flat(-200))
+    assert list(formations.categories) == ["A", "B"]
+    assert formations.codes.tolist() == [-1, 0, 1, -1, -1]
+
+    # on the tilted top at x = 8 the boundary between A and B is z = -92
+    points = [[8.0, 5.0, -91.0], [8.0, 5.0, -92.0], [8.0, 5.0, -93.0]]
+    formations = assign_formations(points, {"A": flat(0.0), "B": tilted}, flat(-200))
+    assert list(formations) == ["A", "B", "B"]
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyfracman.well_geo import WellTrajectory
+
+
+@pytest.fixture
+def trajectory():
+    # A: vertical to md 200, then building towards x; B: a quarter circle of
+    # radius 200 from vertical to horizontal, md being the arc length
+    angle = np.linspace(0, np.pi / 2, 7)
+    arc = pd.DataFrame(
+        {
+            "well": "B",
+            "md": 200 * angle,
+            "x": 1000 + 200 * (1 - np.cos(angle)),
+            "y": 0.0,
+            "z": -200 * np.sin(angle),
+        }
+    )
+    bent = pd.DataFrame(
+        {
+            "well": "A",
+            "md": [0.0, 100.0, 200.0, 300.0],
+            "x": [0.0, 0.0, 0.0, 50.0],
+            "y": 0.0,
+            "z": [0.0, -100.0, -200.0, -280.0],
+        }
+    )
+    return WellTrajectory.from_surveys(pd.concat([arc, bent]))
+
+
+def test_md_to_xyz_linear(trajectory):
+    xyz = trajectory.md_to_xyz("A", [50.0, 250.0, 400.0])
+    np.testing.assert_allclose(xyz, [[0, 0, -50], [25, 0, -240], [100, 0, -360]])
+
+
+@pytest.mark.parametrize("md", [100.0, 150.0, 200.0])
+def test_min_curvature_keeps_straight_legs(trajectory, md):
+    xyz = trajectory.md_to_xyz("A", md, method="min_curvature")
+    np.testing.assert_allclose(xyz, [[0.0, 0.0, -md]], atol=1e-9)
+
+
+def test_min_curvature_follows_arcs(trajectory):
+    md = np.linspace(0, 100 * np.pi, 61)
+    angle = md / 200
+    exact = np.column_stack(
+        [1000 + 200 * (1 - np.cos(angle)), np.zeros_like(md), -200 * np.sin(angle)]
+    )
+    curved = np.linalg.norm(
+        trajectory.md_to_xyz("B", md, method="min_curvature") - exact, axis=1
+    )
+    linear = np.linalg.norm(trajectory.md_to_xyz("B", md) - exact, axis=1)
+    # exact where both station tangents are averaged from two segments, and
+    # still closer than the chords on the first and last segment
+    interior = (md >= md[10]) & (md <= md[50])
+    np.testing.assert_allclose(curved[interior], 0.0, atol=1e-6)
+    assert curved.max() < linear.max() / 1.9
+
+
+def test_xyz_to_md_round_trip(trajectory):
+    md = np.array([10.0, 150.0, 260.0])
+    found = trajectory.xyz_to_md(trajectory.md_to_xyz("A", md), wells="A")
+    np.testing.assert_allclose(found["md"], md)
+    np.testing.assert_allclose(found["distance"], 0.0, atol=1e-9)
+
+
+def test_xyz_to_md_picks_the_nearest_segment():
+    # the sparse well C passes 10 m from the point, the dense well D 50 m,
+    # so every station near the point belongs to D
+    surveys = pd.DataFrame(
+        {
+            "well": ["C", "C"] + ["D"] * 10,
+            "md": [0.0, 1000.0] + list(np.arange(10.0)),
+            "x": [0.0, 1000.0] + list(495.0 + np.arange(10.0)),
+            "y": [0.0, 0.0] + [60.0] * 10,
+            "z": 0.0,
+        }
+    )
+    trajectory = WellTrajectory.from_surveys(surveys)
+    found = trajectory.xyz_to_md([[500.0, 10.0, 0.0]])
+    assert found["well"].tolist() == ["C"]
+    np.testing.assert_allclose(found[["md", "distance"]], [[500.0, 10.0]])
+    found = trajectory.xyz_to_md([[500.0, 10.0, 0.0]], wells="D")
+    np.testing.assert_allclose(found[["md", "distance"]], [[5.0, 50.0]])